@@ -37,9 +37,35 @@ km_api_client.py
   key               切换到 PS/2 键盘模式
   move dx dy [opts] PS/2 鼠标：dx,dy,left,right,middle[,wheel]
   type TEXT         PS/2 键盘：发送 TEXT 或 组合键
+  combo COMBO [--layout us|uk|de]
+                    PS/2 键盘：按 km_layout 扫描码表发送组合键（如 CTRL+ALT+DEL），
+                    支持 E0 扩展键（方向键、DEL、右 Ctrl/Alt 等）
   exit              退出当前 PS/2 模式
   reboot            软件复位 MCU
 
+================ 脚本 (usb / ps2 均支持) =================
+  batch FILE [--interval S] [--stop-on-error] [--coalesce WINDOW] [--reconnect]
+                    逐行执行脚本中的命令（FILE 为 - 时读 stdin），
+                    所有命令共用一个控制器实例与串口连接，见 km_batch.py
+
+================ 常驻进程 (daemon) =================
+  daemon [--listen ADDR]
+                    独占串口，经 Unix socket 或 localhost TCP 接收命令行；
+                    多个客户端共用一个有序写队列
+  --connect ADDR    客户端：把 usb/ps2 命令转发给 daemon 而不直接打开串口
+                    （daemon 实现在 km_daemon.py）
+
+================ 快速路径 =================
+  --compile         不打开串口，把 usb/ps2 命令编译为 raw 命令行并输出
+  raw [-p PORT] [--settle S] [--wait S] [--] PACKET...
+                    直接写出预编译数据包：不构建 argparse 解析器，
+                    默认不做打开串口后的等待，适合脚本中高频调用；
+                    --wait 为包间等待（usb 命令经 --compile 编译时带上 WAIT）
+
+自动匹配的串口记录在 ~/.cache/km_api_client/ports.json（KM_PORT_CACHE 可改路径），
+下次启动先以 stat 与 VID/PID/序列号校验缓存，失效时才重新枚举；
+KM_NO_PORT_CACHE=1 关闭缓存。
+
 依赖：pyserial
 
 用法示例：
@@ -56,13 +82,311 @@ km_api_client.py
   python km_api_client.py ps2 mouse
   python km_api_client.py ps2 move 5 5 --right
   python km_api_client.py ps2 type "CTRL+ALT+DEL"
+  python km_api_client.py ps2 combo CTRL+ALT+DEL
   python km_api_client.py ps2 exit
+
+  # 一个进程、一条连接执行整份脚本
+  python km_api_client.py ps2 --port COM25 batch scenario.txt --interval 0.02
+
+  # daemon：一个进程持有串口，其余进程经 socket 共享
+  python km_api_client.py daemon -p COM25 --listen tcp:127.0.0.1:7707
+  python km_api_client.py --connect tcp:127.0.0.1:7707 ps2 move 5 5
+
+  # 预编译一次，之后用 raw 快速发送
+  python km_api_client.py --compile ps2 move 5 5     # -> raw -- 5,5,0,0,0
+  python km_api_client.py raw -p COM25 -- 5,5,0,0,0
 """
 
-import serial
-import serial.tools.list_ports
 import time
-import argparse
+import os
+import sys
+from contextlib import contextmanager
+
+# 为缩短单次调用的启动时间，pyserial、argparse、json 以及 daemon 相关模块
+# 均在首次使用时才导入
+
+
+KM_PORT_KEYWORDS = ("USB-SERIAL CH340", "WCH")
+
+
+def list_km_ports():
+    """枚举所有描述中含 CH340/WCH 的串口（ListPortInfo 列表）。"""
+    import serial.tools.list_ports
+    return [p for p in serial.tools.list_ports.comports()
+            if any(k in p.description for k in KM_PORT_KEYWORDS)]
+
+
+# 端口发现缓存：记录上次自动匹配到的端口，避免每次调用都枚举全部串口
+PORT_CACHE = os.environ.get("KM_PORT_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "km_api_client", "ports.json")
+
+
+def _port_key(info):
+    return f"{info.vid or 0:04X}:{info.pid or 0:04X}:{info.serial_number or ''}"
+
+
+def _current_port_key(device):
+    """
+    device 当前的 VID:PID:序列号，只在能廉价取得时返回：Linux 只读该设备的 sysfs 条目。
+    其他系统需要 comports() 全量枚举，返回 None（不校验，打开失败时再重新匹配）。
+    """
+    if sys.platform.startswith("linux"):
+        from serial.tools.list_ports_linux import SysFS
+        return _port_key(SysFS(device))
+    return None
+
+
+def _port_stamp(device):
+    """设备节点的 (st_rdev, st_ino)；热插拔重建节点后会变化。Windows 无法 stat COM 口，返回 None。"""
+    if os.name == "nt":
+        return None
+    try:
+        st = os.stat(device)
+    except OSError:
+        return False
+    return [st.st_rdev, st.st_ino]
+
+
+def _load_port_cache():
+    import json
+    try:
+        with open(PORT_CACHE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_port_cache(info):
+    import json
+    entry = {"key": _port_key(info), "device": info.device,
+             "stamp": _port_stamp(info.device)}
+    try:
+        os.makedirs(os.path.dirname(PORT_CACHE), exist_ok=True)
+        tmp = PORT_CACHE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, PORT_CACHE)
+    except OSError:
+        pass
+
+
+def invalidate_port_cache():
+    try:
+        os.remove(PORT_CACHE)
+    except OSError:
+        pass
+
+
+def _forget_cached_device():
+    """缓存的设备打不开：丢弃设备名，保留 VID/PID/序列号供重新匹配时选回同一适配器。"""
+    import json
+    entry = _load_port_cache()
+    if not entry.get("key"):
+        invalidate_port_cache()
+        return
+    try:
+        with open(PORT_CACHE, "w", encoding="utf-8") as f:
+            json.dump({"key": entry["key"]}, f)
+    except OSError:
+        pass
+
+
+def find_km_port(use_cache=None):
+    """
+    返回首个 CH340/WCH 串口设备名，找不到时返回 None。
+
+    先读磁盘缓存，以 stat 校验设备节点未被热插拔重建；能廉价取得当前
+    VID/PID/序列号时（Linux sysfs）再核对它与缓存一致。Windows 上命中缓存
+    直接返回设备名，不枚举，由 _open_serial 在打开失败时重新匹配。
+    缓存缺失或失效时才调用 comports() 枚举，优先选回缓存中的同一适配器并写回缓存。
+    环境变量 KM_NO_PORT_CACHE=1 可关闭缓存。
+    """
+    if use_cache is None:
+        use_cache = not os.environ.get("KM_NO_PORT_CACHE")
+    entry = _load_port_cache() if use_cache else {}
+    device = entry.get("device")
+    if device:
+        stamp = _port_stamp(device)
+        if stamp is not False and stamp == entry.get("stamp"):
+            key = _current_port_key(device)
+            if key is None or key == entry.get("key"):
+                return device
+    ports = list_km_ports()
+    if not ports:
+        if use_cache:
+            invalidate_port_cache()
+        return None
+    port = next((p for p in ports if _port_key(p) == entry.get("key")), ports[0])
+    if use_cache:
+        _save_port_cache(port)
+    return port.device
+
+
+def _open_serial(find_port, port, baudrate, timeout):
+    """
+    打开串口；serial_for_url 兼容普通串口名，同时支持 loop:// socket:// 等 URL。
+    自动匹配的端口打开失败时（缓存已过期，如 Windows 上 COM 号变化），
+    丢弃缓存的设备名后枚举重新匹配一次（优先同一 VID/PID/序列号）。
+    """
+    import serial
+    device = find_port(port)
+    try:
+        return serial.serial_for_url(device, baudrate, timeout=timeout)
+    except serial.SerialException:
+        if port:
+            raise
+        _forget_cached_device()
+        return serial.serial_for_url(find_port(port), baudrate, timeout=timeout)
+
+
+def encode_packet(cmd=None, param=None, kind=None):
+    """
+    组合 cmd:param、单独 cmd 或单独 param 为以 \\r\\n 结尾的字节串；都为空时返回 None。
+    kind（"mouse" / "key"）由发送方给出数据类型，文本格式下不使用，见 km_binary.encode_packet。
+    """
+    if cmd and param:
+        return f"{cmd}:{param}\r\n".encode()
+    if cmd:
+        return f"{cmd}\r\n".encode()
+    if param:
+        return f"{param}\r\n".encode()
+    return None
+
+
+def mouse_payload(dx, dy, left=False, right=False, middle=False, wheel=None):
+    """鼠标数据 dx,dy,left,right,middle[,wheel]；wheel 为 None 时省略。"""
+    flags = (1 if left else 0, 1 if right else 0, 1 if middle else 0)
+    if wheel is None:
+        return f"{dx},{dy},{flags[0]},{flags[1]},{flags[2]}"
+    return f"{dx},{dy},{flags[0]},{flags[1]},{flags[2]},{wheel}"
+
+
+class PacketBuilder:
+    """
+    发送路径上的数据包构建：鼠标包用一次 bytes % 格式化直接得到以 \\r\\n
+    结尾的 bytes，省去 flags 元组、两次 f-string 与 encode 的中间对象。
+
+      mouse(dx, dy, ...)  鼠标数据 dx,dy,l,r,m[,w]\\r\\n（与 mouse_payload 字节相同）
+      packet(payload)     命令 / 扫描码等数据
+
+    不保存状态，多个线程共用同一实例也安全。
+    """
+
+    def mouse(self, dx, dy, left=False, right=False, middle=False, wheel=None):
+        if type(dx) is not int or type(dy) is not int or not (
+                wheel is None or type(wheel) is int):
+            # 浮点等非整数照原样格式化
+            return encode_packet(param=mouse_payload(dx, dy, left, right, middle, wheel))
+        if wheel is None:
+            return b"%d,%d,%d,%d,%d\r\n" % (
+                dx, dy, 1 if left else 0, 1 if right else 0, 1 if middle else 0)
+        return b"%d,%d,%d,%d,%d,%d\r\n" % (
+            dx, dy, 1 if left else 0, 1 if right else 0, 1 if middle else 0, wheel)
+
+    def packet(self, payload):
+        return f"{payload}\r\n".encode()
+
+
+class PacketBatch:
+    """
+    批量写缓冲：多个数据包拼接进同一个 bytearray，一次 write 发出。
+
+    节奏控制（三选一，均不指定时不做限速）：
+      packet_rate  每秒最多发送的包数
+      byte_rate    每秒最多发送的字节数
+      ack          固件确认行（如 b"OK"），每次 flush 后等待与包数相同的确认
+    max_packets 个包攒满时自动 flush。
+    metrics 不为 None 时记录每个包的入队与写出时刻。
+    reader 不为 None 时 ACK 由 km_reader.ResponseReader 收取，而不是直接 readline。
+    """
+
+    def __init__(self, ser, packet_rate=None, byte_rate=None, ack=None,
+                 max_packets=64, ack_timeout=1.0, metrics=None, reader=None):
+        self.ser = ser
+        self.metrics = metrics
+        self.reader = reader
+        self._enqueued = []
+        self.packet_rate = packet_rate
+        self.byte_rate = byte_rate
+        self.ack = ack
+        self.ack_timeout = ack_timeout
+        self.max_packets = max_packets
+        self.buf = bytearray()
+        self.pending = 0
+        self.packets = 0
+        self.bytes = 0
+        self.writes = 0
+        self._next = self._opened = self._flushed = time.perf_counter()
+
+    def add(self, pkt):
+        if not self.pending and (self.packet_rate or self.byte_rate):
+            self._opened = time.perf_counter()     # 本批时隙最早从第一个包入队算起
+        if self.metrics is not None:
+            self._enqueued.append((time.perf_counter(), pkt))
+        self.buf += pkt
+        self.pending += 1
+        if self.pending >= self.max_packets:
+            self.flush()
+
+    def flush(self):
+        if not self.buf:
+            return
+        n, size = self.pending, len(self.buf)
+        self._pace(n, size)
+        acks = None
+        if self.ack and self.reader is not None:
+            acks = [self.reader.expect("ack") for _ in range(n)]
+        self.ser.write(self.buf)
+        if self.packet_rate or self.byte_rate:
+            self._flushed = time.perf_counter()
+        if self.metrics is not None:
+            done = time.perf_counter()
+            for t0, pkt in self._enqueued:
+                self.metrics.record(t0, done, pkt)
+            self._enqueued.clear()
+        self.writes += 1
+        self.packets += n
+        self.bytes += size
+        self.buf.clear()
+        self.pending = 0
+        if acks:
+            from concurrent.futures import TimeoutError as FutureTimeout
+            try:
+                acks[-1].result(timeout=self.ack_timeout)
+            except FutureTimeout:
+                # 未收到的 ACK 不能留在 reader 中，否则会领走下一批的 ACK
+                missing = self.reader.discard("ack", acks)
+                raise TimeoutError(f"等待固件确认超时，缺少 {missing} 个 ACK") from None
+        elif self.ack:
+            self._wait_ack(n)
+
+    def _pace(self, n, size):
+        """
+        按 packet_rate / byte_rate 为本批预留时隙，等到时隙结束再写出：
+        连续发送时时隙首尾相接；上次写出后空闲超过一个时隙时，时隙从本批
+        第一个包入队时开始。第一批与空闲之后的一批同样受限，不会突发。
+        """
+        if self.packet_rate:
+            period = n / self.packet_rate
+        elif self.byte_rate:
+            period = size / self.byte_rate
+        else:
+            return
+        if self._opened - self._flushed > period and self._opened > self._next:
+            self._next = self._opened
+        self._next += period
+        delay = self._next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _wait_ack(self, n):
+        deadline = time.perf_counter() + self.ack_timeout
+        while n and time.perf_counter() < deadline:
+            line = self.ser.readline()
+            if self.ack in line:
+                n -= 1
+        if n:
+            raise TimeoutError(f"等待固件确认超时，缺少 {n} 个 ACK")
 
 
 class CompositeKMController:
@@ -76,17 +400,24 @@ class CompositeKMController:
       return_idle()        ->  #0xZ26@CMD
       enable_local()       ->  #0xC3@USBcmd01
       enable_remote()      ->  #0xC3@USBcmd10
-      set_resolution(w,h)  ->  #0xD5@USBcmd:<w>x<h>
-      get_firmware_info()  ->  #0xW23@FH
-      get_status()         ->  #0xX24@GET
+      set_resolution(w,h)  ->  #0xD5@USBcmd:<w>x<h>  （同时建立主机侧 screen 模型）
+      get_firmware_info()  ->  #0xW23@FH   （挂有 reader 时返回 Future）
+      get_status()         ->  #0xX24@GET  （挂有 reader 时返回 Future）
       enable_debug()       ->  #0xY25@DEG1
       disable_debug()      ->  #0xY25@DEG0
       reboot()             ->  #0xZ26@RET
 
       move_rel(dx,dy,...)  -> REL 模式数据包
       move_abs(x,y,...)    -> ABS 模式数据包
+      move_rel_batch(dx,dy,...) / move_abs_batch(x,y,...)
+                           -> 整批编码（可用 numpy 数组），一次写出
+      move_to(x,y,...) / move_to_batch(xs,ys,...)
+                           -> 像素 / 归一化 / 多显示器坐标，跳过冗余包
       send_text(text)      -> KEY 模式发送文本
       send_combo(combo)    -> KEY 模式发送组合键
+
+      batch(...)           -> 批量模式上下文，合并写入并按速率/ACK 节奏发送
+      paced(rate)          -> 节奏模式上下文，逐包按单调时钟时隙发送
     """
     DEFAULT_BAUDRATE = 115200
     WAIT = 0.05
@@ -104,35 +435,110 @@ class CompositeKMController:
     CMD_IDLE       = "#0xZ26@CMD"
     CMD_REBOOT     = "#0xZ26@RET"
 
-    def __init__(self, port=None, baudrate=None, timeout=0.5):
-        self.ser = serial.Serial(
-            self._find_port(port),
-            baudrate or self.DEFAULT_BAUDRATE,
-            timeout=timeout
-        )
+    ACK_TIMEOUT = 1.0
+
+    _batch = None
+    _encode = staticmethod(encode_packet)   # km_binary.negotiate() 成功后换为二进制编码
+    metrics = None      # 设置为 km_metrics.SendMetrics() 以记录发送耗时
+    reader = None       # km_reader.attach(km) 后用于查询回复与 ACK 流控
+    pacer = None        # km_pacer.Pacer，设置后按其时隙发送并取代固定 WAIT
+    screen = None       # km_screen.ScreenModel，由 set_resolution / set_screen 建立
+
+    def __init__(self, port=None, baudrate=None, timeout=0.5, ser=None):
+        self._builder = PacketBuilder()
+        if ser is not None:
+            # 复用已打开的串口（如 daemon 中 USB/PS2 共用一条链路）
+            self.ser = ser
+            return
+        self.ser = _open_serial(self._find_port, port,
+                                baudrate or self.DEFAULT_BAUDRATE, timeout)
         time.sleep(0.1)
 
     def _find_port(self, port):
         """自动匹配 CH340/WCH 串口，或使用手动指定端口。"""
         if port:
             return port
-        for p in serial.tools.list_ports.comports():
-            if "USB-SERIAL CH340" in p.description or "WCH" in p.description:
-                return p.device
+        device = find_km_port()
+        if device:
+            return device
         raise RuntimeError("未找到 USB Composite KM 串口设备，请使用 --port 指定")
 
-    def _send(self, cmd=None, param=None):
-        """底层组合并发送 cmd:param、单独 cmd 或单独 param。"""
-        if cmd and param:
-            pkt = f"{cmd}:{param}\r\n"
-        elif cmd:
-            pkt = f"{cmd}\r\n"
-        elif param:
-            pkt = f"{param}\r\n"
-        else:
+    def _send(self, cmd=None, param=None, kind=None):
+        """
+        底层组合并发送 cmd:param、单独 cmd 或单独 param；批量模式下仅入队。
+        kind 为 "mouse" / "key" 时该数据可按二进制帧编码（km_binary），其余始终为文本。
+        """
+        t0 = time.perf_counter() if self.metrics is not None else None
+        pkt = self._encode(cmd, param, kind)
+        if pkt is None:
             return
-        self.ser.write(pkt.encode())
-        time.sleep(self.WAIT)
+        self._write_packet(pkt, t0)
+
+    def _fast(self):
+        """可以绕过 _send 直接用 PacketBuilder：文本编码且 _send 未被挂钩（合并 / 录制）。"""
+        return self._encode is encode_packet and "_send" not in self.__dict__
+
+    def _write_packet(self, pkt, t0=None):
+        """写出一个已编码的包（批量模式下仅入队），处理 ACK 流控、节奏、统计与 WAIT。"""
+        metrics = self.metrics
+        if metrics is not None and t0 is None:
+            t0 = time.perf_counter()
+        if self._batch is not None:
+            self._batch.add(pkt)
+            return
+        reader = self.reader
+        flow = reader is not None and reader.window
+        if flow and not reader.acquire(self.ACK_TIMEOUT):
+            raise TimeoutError("等待固件 ACK 超时")
+        pacer = self.pacer
+        if pacer is not None:
+            pacer.wait()
+            if metrics is not None:
+                t0 = time.perf_counter()
+        self.ser.write(pkt)
+        if metrics is not None:
+            metrics.record(t0, time.perf_counter(), pkt)
+        if not flow and pacer is None:
+            time.sleep(self.WAIT)
+
+    @contextmanager
+    def batch(self, packet_rate=None, byte_rate=None, ack=None, max_packets=64):
+        """
+        批量模式：with 块内的 move_rel/move_abs/send_text 等只入队，
+        攒满 max_packets 或退出时一次写出，按速率或 ACK 节奏代替固定 WAIT。
+
+          with km.batch(packet_rate=500):
+              for _ in range(100):
+                  km.move_rel(1, 0)
+        """
+        self._batch = PacketBatch(self.ser, packet_rate=packet_rate,
+                                  byte_rate=byte_rate, ack=ack,
+                                  max_packets=max_packets,
+                                  metrics=self.metrics, reader=self.reader)
+        try:
+            yield self._batch
+        finally:
+            batch, self._batch = self._batch, None
+            batch.flush()
+
+    @contextmanager
+    def paced(self, rate=None, **kwargs):
+        """
+        节奏模式：with 块内每个包按 km_pacer.Pacer 的时隙发送（取代固定 WAIT），
+        写入耗时与睡眠误差不累积；退出后可从 yield 的 pacer 取 stats()。
+        """
+        from km_pacer import Pacer
+        prev, self.pacer = self.pacer, Pacer(rate, **kwargs)
+        try:
+            yield self.pacer
+        finally:
+            self.pacer = prev
+
+    def _query(self, kind, cmd):
+        """发送查询；挂有 reader 时返回解析后回复的 Future，否则返回 None。"""
+        fut = self.reader.expect(kind) if self.reader is not None else None
+        self._send(cmd=cmd)
+        return fut
 
     # —————— 模式与控制 ——————
     def set_mode_rel(self):      self._send(cmd=self.CMD_REL_MODE)
@@ -141,9 +547,18 @@ class CompositeKMController:
     def return_idle(self):       self._send(cmd=self.CMD_IDLE)
     def enable_local(self):      self._send(cmd=self.CMD_LOCAL_ON)
     def enable_remote(self):     self._send(cmd=self.CMD_REMOTE_ON)
-    def set_resolution(self, w, h): self._send(cmd=self.CMD_RESOLUTION, param=f"{w}x{h}")
-    def get_firmware_info(self): self._send(cmd=self.CMD_FW_INFO)
-    def get_status(self):        self._send(cmd=self.CMD_GET_STATUS)
+    def set_resolution(self, w, h):
+        """通知固件屏幕尺寸，并在主机侧建立 ScreenModel 供 move_to 使用。"""
+        from km_screen import ScreenModel
+        self.set_screen(ScreenModel(w, h))
+
+    def set_screen(self, screen):
+        """使用给定的 ScreenModel（如多显示器桌面），并把桌面尺寸发给固件。"""
+        self._send(cmd=self.CMD_RESOLUTION, param=f"{screen.width}x{screen.height}")
+        self.screen = screen
+
+    def get_firmware_info(self): return self._query("fwinfo", self.CMD_FW_INFO)
+    def get_status(self):        return self._query("status", self.CMD_GET_STATUS)
     def enable_debug(self):      self._send(cmd=self.CMD_DEBUG_ON)
     def disable_debug(self):     self._send(cmd=self.CMD_DEBUG_OFF)
     def reboot(self):            self._send(cmd=self.CMD_REBOOT)
@@ -152,16 +567,100 @@ class CompositeKMController:
     def move_rel(self, dx, dy,
                  left=False, right=False,
                  middle=False, wheel=0):
-        flags = (1 if left else 0, 1 if right else 0, 1 if middle else 0)
-        payload = f"{dx},{dy},{flags[0]},{flags[1]},{flags[2]},{wheel}"
-        self._send(param=payload)
+        if self._fast():
+            self._write_packet(self._builder.mouse(dx, dy, left, right, middle, wheel))
+        else:
+            self._send(param=mouse_payload(dx, dy, left, right, middle, wheel), kind="mouse")
 
     def move_abs(self, x, y,
                  left=False, right=False,
                  middle=False, wheel=0):
-        flags = (1 if left else 0, 1 if right else 0, 1 if middle else 0)
-        payload = f"{x},{y},{flags[0]},{flags[1]},{flags[2]},{wheel}"
-        self._send(param=payload)
+        if self._fast():
+            self._write_packet(self._builder.mouse(x, y, left, right, middle, wheel))
+        else:
+            self._send(param=mouse_payload(x, y, left, right, middle, wheel), kind="mouse")
+
+    def move_to(self, x, y, left=False, right=False, middle=False, wheel=0,
+                normalized=False, monitor=None):
+        """
+        经 screen 模型定位：x/y 为像素，normalized=True 时为 0..1，
+        monitor 为显示器序号时相对该显示器。与上一次逻辑位置和按键都相同
+        （且无滚轮）的包被跳过。返回是否实际发送。
+        """
+        screen = self._require_screen()
+        px, py = screen.resolve(x, y, normalized, monitor)
+        buttons = (1 if left else 0) | (2 if right else 0) | (4 if middle else 0)
+        if screen.redundant(px, py, buttons) and not wheel:
+            return False
+        self.move_abs(px, py, left, right, middle, wheel)
+        return True
+
+    def move_to_batch(self, x, y, buttons=0, normalized=False, monitor=None,
+                      chunk=None):
+        """move_to 的批量版本：换算、去冗余后整批编码写出，返回实际发送数。"""
+        from km_bulk import encode
+        screen = self._require_screen()
+        px, py = screen.resolve_batch(x, y, normalized, monitor)
+        px, py, buttons = screen.dedupe_batch(px, py, buttons)
+        data, ends = encode(px, py, buttons, 0,
+                            binary=self._encode is not encode_packet)
+        return self._write_bulk(data, ends, chunk)
+
+    def _require_screen(self):
+        if self.screen is None:
+            raise RuntimeError("请先调用 set_resolution() 或 set_screen()")
+        return self.screen
+
+    def move_rel_batch(self, dx, dy, buttons=0, wheel=0, clamp=False, chunk=None):
+        """
+        批量相对移动：dx/dy 为等长序列或 numpy 数组，buttons 为 1 左 | 2 右 | 4 中
+        的位组合。超出 ±127 的位移拆分为多个报告（clamp=True 时截断），
+        整批编码后一次写出（chunk 指定每次写出的报告数）。返回报告数。
+        """
+        from km_bulk import encode
+        from km_trajectory import USB_LIMIT
+        data, ends = encode(dx, dy, buttons, wheel, USB_LIMIT, clamp,
+                            binary=self._encode is not encode_packet)
+        return self._write_bulk(data, ends, chunk)
+
+    def move_abs_batch(self, x, y, buttons=0, wheel=0, chunk=None):
+        """批量绝对定位，参数同 move_rel_batch（坐标不拆分）。"""
+        from km_bulk import encode
+        data, ends = encode(x, y, buttons, wheel,
+                            binary=self._encode is not encode_packet)
+        return self._write_bulk(data, ends, chunk)
+
+    def _write_bulk(self, data, ends, chunk=None):
+        """
+        按 chunk 个报告为一块写出 data（ends 为各报告的结束偏移，默认一次写完）；
+        设置了 pacer 时每块前等待一个时隙。批量写不经过 WAIT 与 ACK 窗口。
+        """
+        n = len(ends)
+        if not n:
+            return 0
+        if self._batch is not None:
+            self._batch.flush()
+        metrics = self.metrics
+        if chunk or metrics is not None:
+            ends = ends.tolist() if hasattr(ends, "tolist") else list(ends)
+        bounds = ends[chunk - 1::chunk] if chunk else []
+        if not bounds or bounds[-1] != len(data):
+            bounds.append(len(data))
+        view = memoryview(data)
+        start = j = 0
+        for end in bounds:
+            if self.pacer is not None:
+                self.pacer.wait()
+            t0 = time.perf_counter()
+            self.ser.write(view[start:end])
+            if metrics is not None:
+                done, prev = time.perf_counter(), start
+                while j < n and ends[j] <= end:
+                    metrics.record(t0, done, data[prev:ends[j]])
+                    prev = ends[j]
+                    j += 1
+            start = end
+        return n
 
     def send_text(self, text):   self._send(param=text)
     def send_combo(self, combo): self.send_text(combo)
@@ -176,7 +675,9 @@ class PS2Controller:
     PS/2 模拟控制器封装，方法与底层命令对应：
       enter_sim_mode(), exit_sim_mode(),
       set_mode_mouse(), set_mode_keyboard(),
-      send_mouse(), send_keys(), exit_mode(), reboot()
+      send_mouse(), send_mouse_batch(), send_keys(), send_combo(),
+      exit_mode(), reboot()
+    paced(rate) 与 CompositeKMController 相同，按时隙发送一批包。
     """
     DEFAULT_BAUDRATE = 115200
     WAIT = 0.05
@@ -188,24 +689,48 @@ class PS2Controller:
     CMD_EXIT       = "#0xZ26@CMD"
     CMD_REBOOT     = "#0xZ26@RET"
 
-    def __init__(self, port=None, baudrate=None, timeout=0.5):
-        self.ser = serial.Serial(
-            self._find_port(port),
-            baudrate or self.DEFAULT_BAUDRATE,
-            timeout=timeout
-        )
+    _encode = staticmethod(encode_packet)   # km_binary.negotiate() 成功后换为二进制编码
+    metrics = None      # 设置为 km_metrics.SendMetrics() 以记录发送耗时
+    pacer = None        # km_pacer.Pacer，设置后每个包按其时隙发送
+
+    def __init__(self, port=None, baudrate=None, timeout=0.5, ser=None):
+        self._builder = PacketBuilder()
+        if ser is not None:
+            # 复用已打开的串口（如 daemon 中 USB/PS2 共用一条链路）
+            self.ser = ser
+            return
+        self.ser = _open_serial(self._find_port, port,
+                                baudrate or self.DEFAULT_BAUDRATE, timeout)
         time.sleep(0.1)
 
     def _find_port(self, port):
         if port:
             return port
-        for p in serial.tools.list_ports.comports():
-            if "USB-SERIAL CH340" in p.description or "WCH" in p.description:
-                return p.device
+        device = find_km_port()
+        if device:
+            return device
         raise RuntimeError("未找到 PS/2 串口设备，请使用 --port 指定")
 
-    def _send(self, cmd):
-        self.ser.write((cmd + "\r\n").encode())
+    def _send(self, cmd, kind=None):
+        t0 = time.perf_counter() if self.metrics is not None else None
+        pkt = self._encode(cmd, None, kind)
+        if pkt is None:
+            return
+        self._write_packet(pkt, t0)
+
+    _fast = CompositeKMController._fast
+
+    def _write_packet(self, pkt, t0=None):
+        metrics = self.metrics
+        if metrics is not None and t0 is None:
+            t0 = time.perf_counter()
+        if self.pacer is not None:
+            self.pacer.wait()
+            if metrics is not None:
+                t0 = time.perf_counter()
+        self.ser.write(pkt)
+        if metrics is not None:
+            metrics.record(t0, time.perf_counter(), pkt)
         #time.sleep(self.WAIT)
         #self.WAIT = 0.05  # Define a wait time in seconds
 
@@ -223,29 +748,112 @@ class PS2Controller:
     def send_mouse(self, dx, dy,
                    left=False, right=False,
                    middle=False, wheel=None):
-        flags = (1 if left else 0, 1 if right else 0, 1 if middle else 0)
-        if wheel is None:
-            payload = f"{dx},{dy},{flags[0]},{flags[1]},{flags[2]}"
+        if self._fast():
+            self._write_packet(self._builder.mouse(dx, dy, left, right, middle, wheel))
+        else:
+            self._send(mouse_payload(dx, dy, left, right, middle, wheel), kind="mouse")
+
+    def send_mouse_batch(self, dx, dy, buttons=0, wheel=None, clamp=False,
+                         chunk=None):
+        """
+        批量发送鼠标报告：dx/dy 为等长序列或 numpy 数组，buttons 为 1 左 | 2 右 | 4 中
+        的位组合（标量或序列）。超出 ±255 的位移拆分为多个报告（clamp=True 时截断），
+        整批编码后一次写出（chunk 指定每次写出的报告数）。返回报告数。
+        """
+        from km_bulk import encode
+        from km_trajectory import PS2_LIMIT
+        data, ends = encode(dx, dy, buttons, wheel, PS2_LIMIT, clamp,
+                            binary=self._encode is not encode_packet)
+        return self._write_bulk(data, ends, chunk)
+
+    def send_keys(self, data):
+        if not data:
+            return          # 与 encode_packet 一致：空数据不发送
+        if self._fast():
+            self._write_packet(self._builder.packet(data))
         else:
-            payload = f"{dx},{dy},{flags[0]},{flags[1]},{flags[2]},{wheel}"
-        self._send(payload)
+            self._send(data, kind="key")
+
+    def send_combo(self, combo, layout=None):
+        """按 km_layout 的扫描码表发送组合键，如 "CTRL+ALT+DEL"、"ALTGR+Q"、"F5"。"""
+        from km_layout import get_layout
+        for ev in get_layout(layout).combo(combo):
+            self._send(ev, kind="key")
 
-    def send_keys(self, data):   self._send(data)
+    paced = CompositeKMController.paced
+    _write_bulk = CompositeKMController._write_bulk
+    _batch = None
 
     def close(self):
         if self.ser.is_open:
             self.ser.close()
 
 
-def main():
-    parser = argparse.ArgumentParser(
+DEFAULT_DAEMON_ADDR = ("tcp:127.0.0.1:7707" if os.name == "nt"
+                       else "unix:/tmp/km_api_client.sock")
+
+
+USB_COMMANDS = ("rel", "abs", "key", "idle", "local", "remote",
+                "fwinfo", "status", "debug-on", "debug-off", "reboot",
+                "move", "abs-move", "res", "text", "combo", "batch")
+PS2_COMMANDS = ("sim-on", "sim-off", "mouse", "key", "exit", "reboot",
+                "move", "type", "combo", "batch")
+_VALUE_OPTIONS = ("-p", "--port", "--connect", "--listen", "--wheel",
+                  "--interval", "--coalesce")
+
+
+def _peek(argv):
+    """从 argv 中取出前两个位置参数（接口、子命令），用于只构建需要的子解析器。"""
+    pos, skip = [], False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a in _VALUE_OPTIONS:
+            skip = True
+        elif not a.startswith("-"):
+            pos.append(a)
+            if len(pos) == 2:
+                break
+    return (pos + [None, None])[:2]
+
+
+def build_parser(parser_class=None, argv=None):
+    """
+    构建命令行解析器。给出 argv 时只构建其选中的接口与子命令，
+    其余子解析器跳过（-h 或无法识别时仍构建全部，以便给出完整提示）。
+    """
+    if parser_class is None:
+        import argparse
+        parser_class = argparse.ArgumentParser
+    iface, action = _peek(argv) if argv is not None else (None, None)
+    if iface not in ("usb", "ps2", "daemon"):
+        iface = action = None
+
+    parser = parser_class(
         description="KM 上位机控制工具 (USB & PS/2 模式)"
     )
+    parser.add_argument(
+        "--connect", metavar="ADDR",
+        help="将命令转发给已运行的 daemon（unix:/path 或 tcp:host:port）"
+    )
+    parser.add_argument(
+        "--compile", action="store_true",
+        help="不 打开 串口，输出 对应 的 raw 预编译 命令 行"
+    )
     sub_if = parser.add_subparsers(
         dest="interface", required=True,
-        help="选择要使用的接口类型：usb 或 ps2"
+        help="选择要使用的接口类型：usb、ps2 或 daemon"
     )
+    if iface in (None, "usb"):
+        _add_usb_parsers(sub_if, action if action in USB_COMMANDS else None)
+    if iface in (None, "ps2"):
+        _add_ps2_parsers(sub_if, action if action in PS2_COMMANDS else None)
+    if iface in (None, "daemon"):
+        _add_daemon_parser(sub_if)
+    return parser
+
 
+def _add_usb_parsers(sub_if, only=None):
     # USB 子命令
     usb = sub_if.add_parser("usb", help="USB Composite KM 操作")
     usb.add_argument(
@@ -256,34 +864,45 @@ def main():
 
     for name in ("rel", "abs", "key", "idle", "local", "remote",
                  "fwinfo", "status", "debug-on", "debug-off", "reboot"):
-        usbc.add_parser(name, help=name)
-
-    m1 = usbc.add_parser("move", help="REL 模式 下 相对 移动")
-    m1.add_argument("dx", type=int, help="X 轴 相对 位移（正右，负左）")
-    m1.add_argument("dy", type=int, help="Y 轴 相对 位移（正下，负上）")
-    m1.add_argument("--left",   action="store_true", help="按下 左键")
-    m1.add_argument("--right",  action="store_true", help="按下 右键")
-    m1.add_argument("--middle", action="store_true", help="按下 中键")
-    m1.add_argument("--wheel",  type=int, default=0, help="滚轮 位移")
-
-    m2 = usbc.add_parser("abs-move", help="ABS 模式 下 绝对 定位")
-    m2.add_argument("x", type=int, help="X 轴 绝对 坐标")
-    m2.add_argument("y", type=int, help="Y 轴 绝对 坐标")
-    m2.add_argument("--left",   action="store_true", help="按下 左键")
-    m2.add_argument("--right",  action="store_true", help="按下 右键")
-    m2.add_argument("--middle", action="store_true", help="按下 中键")
-    m2.add_argument("--wheel",  type=int, default=0, help="滚轮 位移")
-
-    r = usbc.add_parser("res", help="设置 屏幕 分辨率")
-    r.add_argument("width", type=int, help="屏幕 宽度")
-    r.add_argument("height", type=int, help="屏幕 高度")
-
-    t1 = usbc.add_parser("text", help="KEY 模式 下 发送 文本")
-    t1.add_argument("content", help="要 发送 的 文本")
-
-    t2 = usbc.add_parser("combo", help="KEY 模式 下 发送 组合键")
-    t2.add_argument("combo", help="例如 CTRL+ALT+DEL")
+        if only in (None, name):
+            usbc.add_parser(name, help=name)
+
+    if only in (None, "move"):
+        m1 = usbc.add_parser("move", help="REL 模式 下 相对 移动")
+        m1.add_argument("dx", type=int, help="X 轴 相对 位移（正右，负左）")
+        m1.add_argument("dy", type=int, help="Y 轴 相对 位移（正下，负上）")
+        m1.add_argument("--left",   action="store_true", help="按下 左键")
+        m1.add_argument("--right",  action="store_true", help="按下 右键")
+        m1.add_argument("--middle", action="store_true", help="按下 中键")
+        m1.add_argument("--wheel",  type=int, default=0, help="滚轮 位移")
+
+    if only in (None, "abs-move"):
+        m2 = usbc.add_parser("abs-move", help="ABS 模式 下 绝对 定位")
+        m2.add_argument("x", type=int, help="X 轴 绝对 坐标")
+        m2.add_argument("y", type=int, help="Y 轴 绝对 坐标")
+        m2.add_argument("--left",   action="store_true", help="按下 左键")
+        m2.add_argument("--right",  action="store_true", help="按下 右键")
+        m2.add_argument("--middle", action="store_true", help="按下 中键")
+        m2.add_argument("--wheel",  type=int, default=0, help="滚轮 位移")
+
+    if only in (None, "res"):
+        r = usbc.add_parser("res", help="设置 屏幕 分辨率")
+        r.add_argument("width", type=int, help="屏幕 宽度")
+        r.add_argument("height", type=int, help="屏幕 高度")
+
+    if only in (None, "text"):
+        t1 = usbc.add_parser("text", help="KEY 模式 下 发送 文本")
+        t1.add_argument("content", help="要 发送 的 文本")
+
+    if only in (None, "combo"):
+        t2 = usbc.add_parser("combo", help="KEY 模式 下 发送 组合键")
+        t2.add_argument("combo", help="例如 CTRL+ALT+DEL")
+
+    if only in (None, "batch"):
+        _add_batch_parser(usbc)
+
 
+def _add_ps2_parsers(sub_if, only=None):
     # PS/2 子命令
     ps2 = sub_if.add_parser("ps2", help="PS/2 模拟 操作")
     ps2.add_argument(
@@ -292,99 +911,317 @@ def main():
     ps2c = ps2.add_subparsers(dest="action", required=True, help="PS/2 功能")
 
     for name in ("sim-on", "sim-off", "mouse", "key", "exit", "reboot"):
-        ps2c.add_parser(name, help=name)
+        if only in (None, name):
+            ps2c.add_parser(name, help=name)
 
-    pm = ps2c.add_parser("move", help="PS/2 鼠标 模式 下 发送 移动")
-    pm.add_argument("dx", type=int, help="X 轴 位移")
-    pm.add_argument("dy", type=int, help="Y 轴 位移")
-    pm.add_argument("--left",   action="store_true", help="按下 左键")
-    pm.add_argument("--right",  action="store_true", help="按下 右键")
-    pm.add_argument("--middle", action="store_true", help="按下 中键")
-    pm.add_argument("--wheel",  type=int, default=None, help="滚轮 位移")
+    if only in (None, "move"):
+        pm = ps2c.add_parser("move", help="PS/2 鼠标 模式 下 发送 移动")
+        pm.add_argument("dx", type=int, help="X 轴 位移")
+        pm.add_argument("dy", type=int, help="Y 轴 位移")
+        pm.add_argument("--left",   action="store_true", help="按下 左键")
+        pm.add_argument("--right",  action="store_true", help="按下 右键")
+        pm.add_argument("--middle", action="store_true", help="按下 中键")
+        pm.add_argument("--wheel",  type=int, default=None, help="滚轮 位移")
 
-    pt = ps2c.add_parser("type", help="PS/2 键盘 模式 下 发送 文本/组合键")
-    pt.add_argument("text", help="要 发送 的 文本 或 组合键")
+    if only in (None, "type"):
+        pt = ps2c.add_parser("type", help="PS/2 键盘 模式 下 发送 文本/组合键")
+        pt.add_argument("text", help="要 发送 的 文本 或 组合键")
 
-    args = parser.parse_args()
+    if only in (None, "combo"):
+        pc = ps2c.add_parser("combo", help="PS/2 键盘 模式 下 按 扫描码 表 发送 组合键")
+        pc.add_argument("combo", help="例如 CTRL+ALT+DEL、ALTGR+Q、F5")
+        pc.add_argument("--layout", default="us", choices=("us", "uk", "de"),
+                        help="键盘 布局（默认 us）")
 
+    if only in (None, "batch"):
+        _add_batch_parser(ps2c)
+
+
+def _add_batch_parser(sub):
+    b = sub.add_parser("batch", help="逐行 执行 脚本 文件 中 的 命令（共用 一个 连接）")
+    b.add_argument("file", help="脚本 文件，- 表示 stdin；每行 语法 同 子命令，如 move 0 -40")
+    b.add_argument("--interval", type=float, default=0.0,
+                   help="相邻 命令 的 间隔 秒数（默认 0）")
+    b.add_argument("--stop-on-error", action="store_true",
+                   help="遇到 第一个 错误 即 停止")
+    b.add_argument("--coalesce", type=float, metavar="WINDOW",
+                   help="合并 冗余 包（重复 模式 切换、重复 按键 状态、WINDOW 秒 内 的 同向 位移）")
+    b.add_argument("--reconnect", action="store_true",
+                   help="断线（USB 重新 枚举、写 超时、reboot）后 自动 重连 并 恢复 模式")
+
+
+def _add_daemon_parser(sub_if):
+    # 常驻进程
+    dm = sub_if.add_parser("daemon", help="常驻 进程：独占 串口，经 本地 socket 接收 命令")
+    dm.add_argument(
+        "-p", "--port", help="串口号，不指定时自动匹配 CH340/WCH"
+    )
+    dm.add_argument(
+        "--listen", default=DEFAULT_DAEMON_ADDR,
+        help=f"监听 地址（unix:/path 或 tcp:host:port，默认 {DEFAULT_DAEMON_ADDR}）"
+    )
+
+
+def run_usb(km, args):
+    """执行一条 USB 命令；查询类命令在挂有 reader 时返回回复的 Future。"""
+    cmd = args.cmd
+    if cmd == "rel":
+        km.set_mode_rel()
+    elif cmd == "abs":
+        km.set_mode_abs()
+    elif cmd == "key":
+        km.set_mode_key()
+    elif cmd == "idle":
+        km.return_idle()
+    elif cmd == "local":
+        km.enable_local()
+    elif cmd == "remote":
+        km.enable_remote()
+    elif cmd == "fwinfo":
+        return km.get_firmware_info()
+    elif cmd == "status":
+        return km.get_status()
+    elif cmd == "debug-on":
+        km.enable_debug()
+    elif cmd == "debug-off":
+        km.disable_debug()
+    elif cmd == "reboot":
+        km.reboot()
+    elif cmd == "move":
+        km.move_rel(
+            args.dx, args.dy,
+            left=args.left,
+            right=args.right,
+            middle=args.middle,
+            wheel=args.wheel
+        )
+    elif cmd == "abs-move":
+        km.move_abs(
+            args.x, args.y,
+            left=args.left,
+            right=args.right,
+            middle=args.middle,
+            wheel=args.wheel
+        )
+    elif cmd == "res":
+        km.set_resolution(args.width, args.height)
+    elif cmd == "text":
+        km.set_mode_key()
+        km.send_text(args.content)
+    elif cmd == "combo":
+        km.set_mode_key()
+        km.send_combo(args.combo)
+
+
+def run_ps2(api, args):
+    act = args.action
+    if act == "sim-on":
+        api.enter_sim_mode()
+    elif act == "sim-off":
+        api.exit_sim_mode()
+    elif act == "mouse":
+        api.set_mode_mouse()
+    elif act == "key":
+        api.set_mode_keyboard()
+    elif act == "exit":
+        api.exit_mode()
+    elif act == "reboot":
+        api.reboot()
+    elif act == "move":
+        api.send_mouse(
+            args.dx, args.dy,
+            left=args.left,
+            right=args.right,
+            middle=args.middle,
+            wheel=args.wheel
+        )
+    elif act == "type":
+        api.send_keys(args.text)
+    elif act == "combo":
+        api.send_combo(args.combo, args.layout)
+
+
+def _strip_connect(argv):
+    """去掉 argv 中的 --connect ADDR，剩余部分原样转发给 daemon。"""
+    out, skip = [], False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a == "--connect":
+            skip = True
+        elif not a.startswith("--connect="):
+            out.append(a)
+    return out
+
+
+class _PacketSink:
+    """--compile 用的假串口：只收集写入的数据包。"""
+    is_open = False
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def compile_command(args):
+    """把解析后的命令转换为数据包列表（不含 \\r\\n），供 raw 快速路径使用。"""
+    sink = _PacketSink()
     if args.interface == "usb":
+        km = CompositeKMController(ser=sink)
+        km.WAIT = 0
+        run_usb(km, args)
+    else:
+        run_ps2(PS2Controller(ser=sink), args)
+    return sink.data.decode().split("\r\n")[:-1]
+
+
+def run_raw(argv):
+    """
+    快速路径：add07.py raw [-p PORT] [--settle S] [--wait S] [--] PACKET...
+
+    PACKET 为预编译好的数据包（可由 --compile 生成）；不导入 argparse、
+    不构建解析器，默认也不做打开后的 0.1 s 等待。
+    wait 为 0 时拼接后一次写出，否则每包写出后等待 wait 秒
+    （与 CompositeKMController 每包后的 WAIT 相同，--compile 编译 usb 命令时自动带上）。
+    """
+    port, settle, wait, packets = None, 0.0, 0.0, []
+    it = iter(argv)
+    for a in it:
+        if a in ("-p", "--port"):
+            port = next(it)
+        elif a == "--settle":
+            settle = float(next(it))
+        elif a == "--wait":
+            wait = float(next(it))
+        elif a == "--":
+            packets.extend(it)
+        else:
+            packets.append(a)
+
+    def find(p):
+        device = p or find_km_port()
+        if not device:
+            raise RuntimeError("未找到 KM 串口设备，请使用 --port 指定")
+        return device
+
+    ser = _open_serial(find, port, PS2Controller.DEFAULT_BAUDRATE, 0.5)
+    try:
+        if settle:
+            time.sleep(settle)
+        data = [pkt for pkt in map(encode_packet, packets) if pkt]
+        if wait:
+            for pkt in data:
+                ser.write(pkt)
+                time.sleep(wait)
+        else:
+            ser.write(b"".join(data))
+        ser.flush()
+    finally:
+        ser.close()
+
+
+def run_batch(ctrl, args):
+    """执行 batch 子命令；有失败的行时以状态码 1 退出。"""
+    from km_batch import run_file
+    link = None
+    if args.reconnect:
+        from km_resilient import protect
+        link = protect(ctrl, port=args.port)
+    coalescer = None
+    if args.coalesce is not None:
+        from km_coalesce import Coalescer
+        coalescer = Coalescer(ctrl, args.coalesce)
+    try:
+        ok, failed = run_file(ctrl, args.interface, args.file,
+                              interval=args.interval,
+                              stop_on_error=args.stop_on_error)
+    finally:
+        if coalescer is not None:
+            coalescer.close()
+    print(f"[batch] 成功 {ok} 条，失败 {failed} 条", file=sys.stderr)
+    if coalescer is not None:
+        print(f"[batch] 合并 节省 {coalescer.stats()['saved']} 个 包", file=sys.stderr)
+    if link is not None and link.faults:
+        st = link.stats()
+        print(f"[batch] 重连 {st['reconnects']} 次，最长 {st['reconnect_max_s'] * 1e3:.0f} ms，"
+              f"重放 {st['replayed_packets']} 个 包", file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["raw"]:
+        return run_raw(argv[1:])
+    args = build_parser(argv=argv).parse_args(argv)
+
+    if args.compile:
+        if "batch" in (getattr(args, "cmd", None), getattr(args, "action", None)):
+            raise SystemExit("--compile 不支持 batch")
+        import shlex
+        # USB 固件要求包间 WAIT，编译结果保留该等待；PS/2 一次写出
+        wait = ["--wait", str(CompositeKMController.WAIT)] if args.interface == "usb" else []
+        print(shlex.join(["raw"] + wait + ["--"] + compile_command(args)))
+        return
+
+    if args.connect:
+        if args.interface == "daemon":
+            raise SystemExit("--connect 不能 与 daemon 同时 使用")
+        import shlex
+        from km_daemon import KMClient
+        with KMClient(args.connect) as client:
+            reply = client.send(shlex.join(_strip_connect(argv)))
+        if reply != "OK" and not reply.startswith("OK "):
+            raise SystemExit(reply)
+        if reply[3:]:
+            print("[MCU]", reply[3:])
+        elif getattr(args, "cmd", None) in ("status", "fwinfo"):
+            print("[MCU] 无 回复")
+        return
+
+    if args.interface == "daemon":
+        from km_daemon import KMDaemon
+        d = KMDaemon(port=args.port)
+        print(f"[daemon] 串口 {d.ps2.ser.port}，监听 {args.listen}")
+        try:
+            d.serve(args.listen)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            d.shutdown()
+    elif args.interface == "usb":
         km = CompositeKMController(port=args.port)
+        if args.cmd == "batch":
+            try:
+                return run_batch(km, args)
+            finally:
+                km.close()
+        reader = None
+        if args.cmd in ("status", "fwinfo"):
+            from km_reader import attach
+            reader = attach(km)
         try:
-            cmd = args.cmd
-            if cmd == "rel":
-                km.set_mode_rel()
-            elif cmd == "abs":
-                km.set_mode_abs()
-            elif cmd == "key":
-                km.set_mode_key()
-            elif cmd == "idle":
-                km.return_idle()
-            elif cmd == "local":
-                km.enable_local()
-            elif cmd == "remote":
-                km.enable_remote()
-            elif cmd == "fwinfo":
-                km.get_firmware_info()
-            elif cmd == "status":
-                km.get_status()
-            elif cmd == "debug-on":
-                km.enable_debug()
-            elif cmd == "debug-off":
-                km.disable_debug()
-            elif cmd == "reboot":
-                km.reboot()
-            elif cmd == "move":
-                km.move_rel(
-                    args.dx, args.dy,
-                    left=args.left,
-                    right=args.right,
-                    middle=args.middle,
-                    wheel=args.wheel
-                )
-            elif cmd == "abs-move":
-                km.move_abs(
-                    args.x, args.y,
-                    left=args.left,
-                    right=args.right,
-                    middle=args.middle,
-                    wheel=args.wheel
-                )
-            elif cmd == "res":
-                km.set_resolution(args.width, args.height)
-            elif cmd == "text":
-                km.set_mode_key()
-                km.send_text(args.content)
-            elif cmd == "combo":
-                km.set_mode_key()
-                km.send_combo(args.combo)
+            fut = run_usb(km, args)
+            if fut is not None:
+                from concurrent.futures import TimeoutError as FutureTimeout
+                try:
+                    print("[MCU]", fut.result(timeout=1.0).raw)
+                except FutureTimeout:
+                    print("[MCU] 无 回复")
         finally:
+            if reader is not None:
+                reader.stop()
             km.close()
     else:
         api = PS2Controller(port=args.port)
         try:
-            act = args.action
-            if act == "sim-on":
-                api.enter_sim_mode()
-            elif act == "sim-off":
-                api.exit_sim_mode()
-            elif act == "mouse":
-                api.set_mode_mouse()
-            elif act == "key":
-                api.set_mode_keyboard()
-            elif act == "exit":
-                api.exit_mode()
-            elif act == "reboot":
-                api.reboot()
-            elif act == "move":
-                api.send_mouse(
-                    args.dx, args.dy,
-                    left=args.left,
-                    right=args.right,
-                    middle=args.middle,
-                    wheel=args.wheel
-                )
-            elif act == "type":
-                api.send_keys(args.text)
+            if args.action == "batch":
+                run_batch(api, args)
+            else:
+                run_ps2(api, args)
         finally:
             api.close()
 
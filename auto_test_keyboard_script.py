@@ -1,21 +1,6 @@
-import subprocess
-import time
-import sys
+from km_capture import EchoCapture
+from km_session import PS2Session
 
-scan_codes = {
-    'a': '1C', 'b': '32', 'c': '21', 'd': '23', 'e': '24', 'f': '2B', 'g': '34',
-    'h': '33', 'i': '43', 'j': '3B', 'k': '42', 'l': '4B', 'm': '3A', 'n': '31',
-    'o': '44', 'p': '4D', 'q': '15', 'r': '2D', 's': '1B', 't': '2C', 'u': '3C',
-    'v': '2A', 'w': '1D', 'x': '22', 'y': '35', 'z': '1A',
-    '0': '45', '1': '16', '2': '1E', '3': '26', '4': '25', '5': '2E', '6': '36',
-    '7': '3D', '8': '3E', '9': '46', ':': '4C', '`': '0E', '~': '0E',
-    ' ': '29', '\\': '5D', '[':'54', ']': '5B', '{': '54', '}': '5B', 
-    '+': '55', '!': '16', '#': '26', '|': '5D',
-    '@': '1E', '$': '25', '%': '2E', '^': '36',
-    '&': '3D', '*': '3E', '(': '46', ')': '45',
-    ',': '41', '.': '49', '/': '4A', ';': '4C', "'": '52', '"' : '52',
-    '=': '55', '-': '4E', '_': '4E', '<': '41', '>': '49', '?': '4A',
-}
 lines_kunlun = ["+hello",
     "HELLO",
     "Hello",
@@ -58,45 +43,36 @@ lines = [
 ]
 
 COM_PORT = "COM25"
+KEY_RATE = 100        # scan code events per second
+LAYOUT = "us"         # km_layout table: "us", "uk" or "de"
+CAPTURE_PORT = None   # port the host echoes typed text to; None = controller link
+ECHO_TIMEOUT = 5.0    # seconds to wait for the last echo after typing
 
-def run(cmd):
-    print(">>", cmd)
-    subprocess.run(cmd, shell=True, check=True)
+def main(port=COM_PORT, capture_port=CAPTURE_PORT):
+    with PS2Session(port=port, layout=LAYOUT, verbose=True,
+                    rate=KEY_RATE) as s:
+        # echo is checked line by line as it streams back, no settle delay needed
+        if capture_port:
+            s.capture = EchoCapture.open(capture_port, layout=LAYOUT)
+        else:
+            s.capture = EchoCapture.attach(s.api, layout=LAYOUT)
+        s.sim_on()
 
-def run_ps2_type(keycode):
-    subprocess.run([sys.executable, "add07.py", "ps2", "type", keycode], check=True)
+        s.key_mode()
 
-def send_string(text):
-    for char in text:
-        code = scan_codes.get(char.lower())
-        if code is None:
-            print(f"[WARN] No mapping for '{char}'")
-            continue
+        print("Now testng for Keyboard Functionality!")
 
-        # handle shiftup for uppercase / special
-        if char.isupper() or char in '+!#@$%|^&*():"~<>?{}?':
-            run("python add07.py ps2 -p COM25 type 12,0")    
-            #time.sleep(0.05)  # inter-key delay
+        for line in lines:
+            s.type_string(line)
+            s.type_combo("ENTER")
 
-        run_ps2_type(code)
+        s.capture.wait(ECHO_TIMEOUT)
+        s.sim_off()
 
-        # handle shiftdown for uppercase / special
-        if char.isupper() or char in '+!#@$%|^&*():~<>"{}?':
-            run("python add07.py ps2 -p COM25 type 12,1")
-            #time.sleep(0.05)  # inter-key delay
+    s.capture.close()
+    print(s.capture.report())
+    print("Finish testing")
+    return s.capture.stats()["failed"] == 0
 
-run("python add07.py ps2 -p COM25 sim-on")
-
-run("python add07.py ps2 -p COM25 key")
-time.sleep(2)         # delay to allow us to capture echo sent by host
-
-print("Now testng for Keyboard Functionality!")
-
-for line in lines:
-    send_string(line)
-    run("python add07.py ps2 -p COM25 type 5A")      #space
-    #time.sleep(0.1)  # inter-line delay
-
-run("python add07.py ps2 -p COM25 sim-off")
-
-print("Finish testing")
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
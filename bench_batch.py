@@ -0,0 +1,62 @@
+"""
+Packets/s and bytes/s of CompositeKMController with and without batching,
+over pyserial's loop:// URL (no hardware needed).
+
+    python bench_batch.py
+    python bench_batch.py -n 20000 --rate 2000
+"""
+import argparse
+import threading
+import time
+
+from add07 import CompositeKMController
+
+
+def run(km, n, label, batched=True, **batch_opts):
+    pkt_bytes = 0
+    t0 = time.perf_counter()
+    if not batched:
+        for i in range(n):
+            km.move_rel(i % 7 - 3, -(i % 5), left=bool(i & 1))
+    else:
+        with km.batch(**batch_opts) as b:
+            for i in range(n):
+                km.move_rel(i % 7 - 3, -(i % 5), left=bool(i & 1))
+        pkt_bytes = b.bytes
+    dt = time.perf_counter() - t0
+    rate = f"{pkt_bytes / dt:12.0f} bytes/s" if pkt_bytes else ""
+    print(f"{label:>24}: {n:6d} pkts in {dt:7.3f} s -> {n / dt:10.0f} pkts/s {rate}")
+
+
+def drain(ser):
+    while ser.is_open:
+        try:
+            ser.read(ser.in_waiting or 1)
+        except Exception:
+            break
+
+
+def main():
+    ap = argparse.ArgumentParser(description="batched write path benchmark")
+    ap.add_argument("-p", "--port", default="loop://")
+    ap.add_argument("-n", "--packets", type=int, default=10000)
+    ap.add_argument("--rate", type=int, default=5000,
+                    help="packet_rate for the paced run")
+    args = ap.parse_args()
+
+    km = CompositeKMController(port=args.port)
+    if args.port.startswith("loop://"):
+        # loop:// has a bounded buffer; drain it like a device would
+        threading.Thread(target=drain, args=(km.ser,), daemon=True).start()
+    try:
+        run(km, 40, "unbatched (WAIT=0.05)", batched=False)
+        run(km, args.packets, "batched, unpaced")
+        run(km, args.packets, "batched, max_packets=1024", max_packets=1024)
+        run(km, args.packets, f"batched, {args.rate} pkt/s", packet_rate=args.rate)
+        run(km, args.packets // 10, "batched, 11520 B/s (UART)", byte_rate=11520)
+    finally:
+        km.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Text vs binary framing: UART bytes per report, device-side events/s against
+the throttled fake device, and host-side encode cost (per report and batched).
+
+    python bench_binary.py -n 5000
+    python bench_binary.py --baud 921600 --latency 0.0001
+"""
+import argparse
+import time
+
+import km_binary
+from add07 import PS2Controller, encode_packet, mouse_payload
+from km_fakedev import FakeKMDevice
+
+
+def workload(api, n):
+    for i in range(n):
+        api.send_mouse(i % 81 - 40, -(i % 5), left=i % 2 == 0)
+
+
+def encode_cost(n):
+    dx = [i % 81 - 40 for i in range(n)]
+    dy = [-(i % 5) for i in range(n)]
+    btn = [i % 2 for i in range(n)]
+    rows = []
+
+    t0 = time.perf_counter()
+    text = b"".join(encode_packet(mouse_payload(x, y, b)) for x, y, b in zip(dx, dy, btn))
+    rows.append(("text, per report", time.perf_counter() - t0, len(text)))
+
+    t0 = time.perf_counter()
+    blob = b"".join(km_binary.encode_mouse(x, y, b) for x, y, b in zip(dx, dy, btn))
+    rows.append(("binary, per report", time.perf_counter() - t0, len(blob)))
+
+    t0 = time.perf_counter()
+    batch = km_binary.encode_mouse_batch(dx, dy, btn)
+    label = "numpy" if km_binary.np is not None else "no numpy"
+    rows.append((f"binary, batch ({label})", time.perf_counter() - t0, len(batch)))
+    assert batch == blob
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="text vs binary framing")
+    ap.add_argument("-n", "--events", type=int, default=5000)
+    ap.add_argument("--baud", type=int, default=115200)
+    ap.add_argument("--latency", type=float, default=0.0,
+                    help="modelled firmware time per packet (s)")
+    args = ap.parse_args()
+
+    for binary in (False, True):
+        with FakeKMDevice(baudrate=args.baud, latency=args.latency,
+                          throttle=True) as dev:
+            api = PS2Controller(port=dev.port)
+            if binary and not km_binary.negotiate(api):
+                raise SystemExit("fake device did not accept binary mode")
+            dev.wait_idle()
+            dev.reset()
+            t0 = time.perf_counter()
+            workload(api, args.events)
+            dev.wait_idle()
+            wall = time.perf_counter() - t0
+            api.close()
+            s = dev.stats()
+        name = "binary" if binary else "text"
+        print(f"{name:>6}: {s['bytes'] / s['packets']:5.1f} B/report, device "
+              f"{s['events_per_s']:8.0f} ev/s (UART cap {args.baud / 10 / (s['bytes'] / s['packets']):7.0f}), "
+              f"wall {wall:6.3f} s, errors {s['errors']}")
+
+    print()
+    for name, secs, size in encode_cost(args.events * 20):
+        n = args.events * 20
+        print(f"{name:>26}: {secs / n * 1e9:7.0f} ns/report, {size / n:4.1f} B/report")
+
+
+if __name__ == "__main__":
+    main()
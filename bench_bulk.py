@@ -0,0 +1,82 @@
+"""
+Encode cost per 100k mouse reports: per-call send_mouse vs the bulk
+encoder (km_bulk), text and binary, with and without numpy, plus the
+number of write() calls each path makes.
+
+    python bench_bulk.py
+    python bench_bulk.py -n 100000 --range 600    # deltas that need splitting
+"""
+import argparse
+import random
+import time
+
+import km_binary
+import km_bulk
+from add07 import PS2Controller
+
+
+class NullSerial:
+    """Stands in for the port so only host-side work is measured."""
+    is_open = False
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes += len(data)
+        return len(data)
+
+
+def timed(label, n, fn):
+    ser = NullSerial()
+    api = PS2Controller(ser=ser)
+    t0 = time.perf_counter()
+    reports = fn(api)
+    dt = time.perf_counter() - t0
+    print(f"{label:>34}: {dt * 1e3 * 100_000 / n:8.1f} ms/100k  "
+          f"{dt * 1e9 / n:7.0f} ns/input  {reports:7d} reports  "
+          f"{ser.writes:7d} writes  {ser.bytes / reports:5.1f} B/report")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="bulk mouse encode benchmark")
+    ap.add_argument("-n", "--reports", type=int, default=100_000)
+    ap.add_argument("--range", type=int, default=100,
+                    help="deltas drawn from -RANGE..RANGE (over 255 forces splitting)")
+    args = ap.parse_args()
+
+    rnd = random.Random(0)
+    dx = [rnd.randint(-args.range, args.range) for _ in range(args.reports)]
+    dy = [rnd.randint(-args.range, args.range) for _ in range(args.reports)]
+    btn = [rnd.randint(0, 7) for _ in range(args.reports)]
+    n = args.reports
+
+    def per_call(api):
+        if args.range > 255:
+            raise SystemExit("per-call send_mouse cannot split; use --range <= 255")
+        for x, y, b in zip(dx, dy, btn):
+            api.send_mouse(x, y, b & 1, b & 2, b & 4)
+        return n
+
+    def bulk(binary):
+        def run(api):
+            if binary:
+                api._encode = km_binary.encode_packet
+            return api.send_mouse_batch(dx, dy, btn)
+        return run
+
+    if args.range <= 255:
+        timed("send_mouse per call (text)", n, per_call)
+    have_numpy = km_bulk.np is not None
+    for use_numpy in ((True, False) if have_numpy else (False,)):
+        if not use_numpy:
+            km_bulk.np = km_binary.np = None
+        tag = "numpy" if use_numpy else "no numpy"
+        timed(f"send_mouse_batch text ({tag})", n, bulk(False))
+        timed(f"send_mouse_batch binary ({tag})", n, bulk(True))
+
+
+if __name__ == "__main__":
+    main()
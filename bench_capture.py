@@ -0,0 +1,49 @@
+"""
+Echo verification throughput: how many echoed lines per second km_capture
+can decode and diff, against what a 115200 baud link can carry.
+
+    python bench_capture.py -n 50000 --chunk 64
+"""
+import argparse
+import random
+import string
+import time
+
+from km_capture import EchoCapture
+
+
+def main():
+    ap = argparse.ArgumentParser(description="echo capture throughput")
+    ap.add_argument("-n", "--lines", type=int, default=50000)
+    ap.add_argument("--chunk", type=int, default=64,
+                    help="bytes per feed() call, like one serial read")
+    ap.add_argument("--error-rate", type=float, default=0.001,
+                    help="fraction of echoed characters replaced by 'X'")
+    args = ap.parse_args()
+
+    rnd = random.Random(0)
+    alphabet = string.ascii_letters + string.digits + string.punctuation + " "
+    lines = ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(5, 60)))
+             for _ in range(args.lines)]
+    echoed = "".join("".join("X" if rnd.random() < args.error_rate else c for c in line)
+                     + "\r\n" for line in lines).encode()
+
+    cap = EchoCapture(size=len(echoed) + 1)
+    t0 = time.perf_counter()
+    cap.expect("\n".join(lines) + "\n")
+    for i in range(0, len(echoed), args.chunk):
+        cap.feed(echoed[i:i + args.chunk])
+    cap.wait(60)
+    dt = time.perf_counter() - t0
+    cap.close()
+    st = cap.stats()
+    uart = 115200 / 10
+    print(f"{st['lines']} lines, {len(echoed)} bytes verified in {dt * 1e3:.1f} ms "
+          f"({len(echoed) / dt / 1e6:.2f} MB/s, {st['lines'] / dt:,.0f} lines/s)")
+    print(f"115200 baud link carries {uart / 1e3:.1f} kB/s -> "
+          f"{len(echoed) / dt / uart:,.0f}x headroom")
+    print(f"failed lines {st['failed']}, char errors {st['char_errors']}")
+
+
+if __name__ == "__main__":
+    main()
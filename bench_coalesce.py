@@ -0,0 +1,48 @@
+"""
+Packets on the wire for the mouse test script's click/drag patterns with
+and without the coalescing layer (km_coalesce), at several merge windows.
+
+    python bench_coalesce.py --repeat 50
+"""
+import argparse
+import time
+
+import auto_test_mouse_script as script
+from add07 import PS2Controller
+from bench_bulk import NullSerial
+from km_coalesce import Coalescer
+from km_session import PS2Session
+
+
+def run(window, repeat):
+    ser = NullSerial()
+    s = PS2Session(controller=PS2Controller(ser=ser))
+    s.api.WAIT = 0
+    co = Coalescer(s.api, window) if window is not None else None
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        s.mouse_mode()
+        script.double_left_click(s)
+        script.example(s)
+        script.movement_square(s)
+    if co is not None:
+        co.close()
+    return ser.writes, time.perf_counter() - t0, co.stats() if co else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="coalescing benchmark")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    base, dt, _ = run(None, args.repeat)
+    print(f"{'no coalescing':>20}: {base:6d} packets  host {dt * 1e3:7.1f} ms")
+    for window in (0.001, 0.005, 0.02):
+        sent, dt, st = run(window, args.repeat)
+        print(f"{f'window {window * 1e3:g} ms':>20}: {sent:6d} packets  host {dt * 1e3:7.1f} ms"
+              f"  merged {st['merged']}  dropped {st['dropped_buttons'] + st['dropped_modes']}"
+              f"  ({100 * (base - sent) / base:.0f}% fewer)")
+
+
+if __name__ == "__main__":
+    main()
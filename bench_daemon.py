@@ -0,0 +1,80 @@
+"""
+Throughput of the KM daemon with many concurrent clients, against a
+pty-backed fake device (POSIX only, no hardware needed).
+
+    python bench_daemon.py -c 8 -n 500
+"""
+import argparse
+import os
+import threading
+import time
+
+from km_daemon import KMClient, KMDaemon
+
+
+def open_pty():
+    """Return (master_fd, slave_path); a thread drains the master side."""
+    master, slave = os.openpty()
+    received = [0]
+
+    def drain():
+        while True:
+            try:
+                data = os.read(master, 65536)
+            except OSError:
+                break
+            if not data:
+                break
+            received[0] += data.count(b"\n")
+
+    threading.Thread(target=drain, daemon=True).start()
+    return master, os.ttyname(slave), received
+
+
+def main():
+    ap = argparse.ArgumentParser(description="KM daemon multi-client throughput")
+    ap.add_argument("-c", "--clients", type=int, default=4)
+    ap.add_argument("-n", "--commands", type=int, default=500,
+                    help="commands per client")
+    ap.add_argument("--listen", default="tcp:127.0.0.1:0")
+    args = ap.parse_args()
+
+    master, slave, received = open_pty()
+    daemon = KMDaemon(port=slave)
+    server = threading.Thread(target=daemon.serve, args=(args.listen,), daemon=True)
+    server.start()
+    while daemon.server is None:
+        time.sleep(0.01)
+    addr = args.listen
+    if addr.startswith("tcp:"):
+        host, port = daemon.server.server_address[:2]
+        addr = f"tcp:{host}:{port}"
+
+    errors = []
+
+    def client():
+        with KMClient(addr) as c:
+            for _ in range(args.commands):
+                reply = c.send("ps2 move 1 0")
+                if reply != "OK":
+                    errors.append(reply)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    dt = time.perf_counter() - t0
+
+    total = args.clients * args.commands
+    time.sleep(0.1)
+    daemon.shutdown()
+    os.close(master)
+    print(f"{args.clients} clients x {args.commands} cmds = {total} in {dt:.3f} s "
+          f"-> {total / dt:.1f} cmds/s, device saw {received[0]} packets, "
+          f"{len(errors)} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Realistic events/s and latency for common workloads against the
+simulated KM device (no hardware needed).
+
+    python bench_fakedev.py
+    python bench_fakedev.py --baud 115200 --latency 0.0003 --transport socket
+"""
+import argparse
+import time
+
+from add07 import CompositeKMController, PS2Controller
+from km_fakedev import FakeKMDevice
+from km_keycompiler import KeyCompiler
+
+TEXT = "Hello Everest! Good Afternoon@Every One"
+
+
+def ps2_mouse(api, n):
+    for i in range(n):
+        api.send_mouse(i % 7 - 3, -(i % 5))
+
+
+def ps2_keys(api, n):
+    kc = KeyCompiler()
+    sent = 0
+    while sent < n:
+        sent += kc.send(api, TEXT)
+
+
+def usb_batched(km, n):
+    with km.batch():
+        for i in range(n):
+            km.move_rel(i % 7 - 3, -(i % 5))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="fake device benchmark")
+    ap.add_argument("-n", "--events", type=int, default=5000)
+    ap.add_argument("--baud", type=int, default=115200)
+    ap.add_argument("--latency", type=float, default=0.0002,
+                    help="modelled firmware time per packet (s)")
+    ap.add_argument("--transport", choices=("pty", "socket"), default="pty")
+    ap.add_argument("--no-throttle", action="store_true",
+                    help="do not slow reads down to the modelled UART rate")
+    args = ap.parse_args()
+
+    for name, cls, workload in (("ps2 mouse", PS2Controller, ps2_mouse),
+                                ("ps2 keys", PS2Controller, ps2_keys),
+                                ("usb batched", CompositeKMController, usb_batched)):
+        with FakeKMDevice(args.transport, args.baud, args.latency,
+                          throttle=not args.no_throttle) as dev:
+            ctrl = cls(port=dev.port)
+            t0 = time.perf_counter()
+            workload(ctrl, args.events)
+            host = time.perf_counter() - t0
+            dev.wait_idle()
+            ctrl.close()
+            s = dev.stats()
+        print(f"{name:>12}: host {s['packets'] / host:9.0f} ev/s | device "
+              f"{s['events_per_s']:8.0f} ev/s, {s['bytes'] / max(s['span_s'], 1e-9):8.0f} B/s, "
+              f"latency p50 {s['latency_p50_s'] * 1e3:7.3f} ms "
+              f"p99 {s['latency_p99_s'] * 1e3:7.3f} ms, errors {s['errors']}")
+
+
+if __name__ == "__main__":
+    main()
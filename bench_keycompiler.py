@@ -0,0 +1,100 @@
+"""
+Events and wall time saved by km_keycompiler on the keyboard test corpora.
+
+    python bench_keycompiler.py
+    python bench_keycompiler.py -p COM25     # also time real sends
+"""
+import argparse
+import threading
+import time
+
+from add07 import PS2Controller
+from auto_test_keyboard_script import lines, lines_kunlun
+from km_keycompiler import SHIFT, SHIFTED_CHARS, SCAN_CODES_US, KeyCompiler
+
+BAUD = 115200
+
+
+def naive_events(text):
+    """Per-character shift make/break, as the old send_string did."""
+    events = []
+    for ch in text:
+        code = SCAN_CODES_US.get(ch.lower())
+        if code is None:
+            continue
+        if ch.isupper() or ch in SHIFTED_CHARS:
+            events += [f"{SHIFT},0", code, f"{SHIFT},1"]
+        else:
+            events.append(code)
+    return events
+
+
+def wire_bytes(events):
+    return sum(len(e) + 2 for e in events)
+
+
+def send_all(api, batches):
+    t0 = time.perf_counter()
+    for events in batches:
+        for ev in events:
+            api.send_keys(ev)
+    return time.perf_counter() - t0
+
+
+def drain(ser):
+    while ser.is_open:
+        try:
+            ser.read(ser.in_waiting or 1)
+        except Exception:
+            break
+
+
+def main():
+    ap = argparse.ArgumentParser(description="keyboard compiler savings")
+    ap.add_argument("-p", "--port", default="loop://")
+    ap.add_argument("-r", "--repeat", type=int, default=200,
+                    help="repetitions for host-side timing")
+    args = ap.parse_args()
+
+    api = PS2Controller(port=args.port)
+    if args.port.startswith("loop://"):
+        threading.Thread(target=drain, args=(api.ser,), daemon=True).start()
+
+    for name, corpus in (("lines", lines), ("lines_kunlun", lines_kunlun)):
+        kc = KeyCompiler()
+        naive = [naive_events(t) for t in corpus]
+        compiled = [kc.compile(t) for t in corpus]
+        n_naive = sum(map(len, naive))
+        n_comp = sum(map(len, compiled))
+        b_naive = sum(map(wire_bytes, naive))
+        b_comp = sum(map(wire_bytes, compiled))
+
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for t in corpus:
+                naive_events(t)
+        t_naive = (time.perf_counter() - t0) / args.repeat
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for t in corpus:
+                kc.compile(t)
+        t_comp = (time.perf_counter() - t0) / args.repeat
+
+        s_naive = send_all(api, naive)
+        s_comp = send_all(api, compiled)
+
+        print(f"[{name}] {len(corpus)} strings")
+        print(f"  events : {n_naive:5d} -> {n_comp:5d}  "
+              f"({n_naive - n_comp} saved, {100 * (1 - n_comp / n_naive):.1f}%)")
+        print(f"  bytes  : {b_naive:5d} -> {b_comp:5d}  "
+              f"(UART @ {BAUD}: {b_naive * 10 / BAUD * 1e3:.2f} -> "
+              f"{b_comp * 10 / BAUD * 1e3:.2f} ms)")
+        print(f"  encode : {t_naive * 1e6:8.1f} -> {t_comp * 1e6:8.1f} us per corpus "
+              f"(cache hits {kc.hits})")
+        print(f"  send   : {s_naive * 1e3:8.2f} -> {s_comp * 1e3:8.2f} ms on {args.port}")
+
+    api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Pacing accuracy: naive time.sleep(1/rate) after each write vs km_pacer.Pacer
+(absolute deadlines, hybrid sleep/spin), against the fake device.
+
+    python bench_pacer.py --rates 100 1000 5000 -d 1.0
+"""
+import argparse
+import time
+
+from add07 import PS2Controller
+from km_fakedev import FakeKMDevice
+
+
+def naive(api, rate, n):
+    period = 1.0 / rate
+    stamps = []
+    for i in range(n):
+        stamps.append(time.perf_counter())
+        api.send_mouse(i % 3 - 1, 0)
+        time.sleep(period)
+    return stamps
+
+
+def paced(api, rate, n):
+    stamps = []
+    with api.paced(rate) as pacer:
+        for i in range(n):
+            api.send_mouse(i % 3 - 1, 0)
+            stamps.append(time.perf_counter())
+    return stamps, pacer.stats()
+
+
+def describe(stamps, rate):
+    gaps = sorted(b - a for a, b in zip(stamps, stamps[1:]))
+    period = 1.0 / rate
+    achieved = (len(stamps) - 1) / (stamps[-1] - stamps[0])
+    jitter = [abs(g - period) for g in gaps]
+    jitter.sort()
+    return (f"{achieved:9.1f} ev/s ({achieved * 100 / rate - 100:+6.2f}%), "
+            f"|gap-period| p50 {jitter[len(jitter) // 2] * 1e6:7.1f} us "
+            f"p99 {jitter[int(len(jitter) * 0.99)] * 1e6:7.1f} us")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="pacing accuracy")
+    ap.add_argument("--rates", type=int, nargs="+", default=[100, 1000, 5000])
+    ap.add_argument("-d", "--duration", type=float, default=1.0,
+                    help="seconds per run")
+    args = ap.parse_args()
+
+    with FakeKMDevice(baudrate=10_000_000, keep=False) as dev:
+        api = PS2Controller(port=dev.port)
+        for rate in args.rates:
+            n = max(10, int(rate * args.duration))
+            print(f"{rate} ev/s target, {n} events")
+            print(f"  naive sleep : {describe(naive(api, rate, n), rate)}")
+            stamps, s = paced(api, rate, n)
+            print(f"  Pacer       : {describe(stamps, rate)}, "
+                  f"late p99 {s['late_p99_s'] * 1e6:.1f} us, resyncs {s['resyncs']}")
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
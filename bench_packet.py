@@ -0,0 +1,91 @@
+"""
+Mouse packet construction: mouse_payload + encode_packet (flags tuple,
+f-strings and a fresh bytes object per packet) against PacketBuilder
+(one bytes %-format), per packet and through the controllers'
+move_rel / send_mouse on a null port. "script" traffic repeats a few
+deltas like the test scripts do; "random" draws every delta from +-127.
+
+    python bench_packet.py -n 200000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from add07 import (CompositeKMController, PacketBuilder, PS2Controller,
+                   encode_packet, mouse_payload)
+from bench_bulk import NullSerial
+
+
+def per_packet(label, n, moves, fn):
+    t0 = time.perf_counter()
+    for dx, dy, left in moves:
+        fn(dx, dy, left)
+    dt = time.perf_counter() - t0
+    # transient allocation of a single call, after the caches are warm
+    tracemalloc.start()
+    peak = 0
+    for dx, dy, left in moves[:1000]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(dx, dy, left)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    print(f"{label:>34}: {dt / n * 1e9:7.0f} ns/packet  peak {peak:4d} B/call")
+    return dt
+
+
+def controller(cls, fast):
+    ctrl = cls(ser=NullSerial())
+    ctrl.WAIT = 0
+    if not fast:
+        # an instance-level _send disables the builder path, as a hook would
+        ctrl._send = ctrl._send
+    return ctrl
+
+
+def main():
+    ap = argparse.ArgumentParser(description="packet builder benchmark")
+    ap.add_argument("-n", "--packets", type=int, default=200000)
+    args = ap.parse_args()
+    rnd = random.Random(0)
+    steps = (-10, -5, -1, 0, 1, 5, 10)
+    traffic = {
+        "script": [(rnd.choice(steps), rnd.choice(steps), rnd.random() < 0.1)
+                   for _ in range(args.packets)],
+        "random": [(rnd.randint(-127, 127), rnd.randint(-127, 127), rnd.random() < 0.1)
+                   for _ in range(args.packets)],
+    }
+
+    for kind, moves in traffic.items():
+        print(f"--- {kind} traffic")
+        b = PacketBuilder()
+        for dx, dy, left in moves[:1000]:
+            assert b.mouse(dx, dy, left) == encode_packet(param=mouse_payload(dx, dy, left))
+
+        base = per_packet("mouse_payload + encode_packet", args.packets, moves,
+                          lambda dx, dy, l: encode_packet(param=mouse_payload(dx, dy, l)))
+        fast = per_packet("PacketBuilder.mouse", args.packets, moves,
+                          lambda dx, dy, l: b.mouse(dx, dy, l))
+        print(f"{'':>34}  {base / fast:.2f}x")
+
+        for name, cls, meth in (("USB move_rel", CompositeKMController, "move_rel"),
+                                ("PS2 send_mouse", PS2Controller, "send_mouse")):
+            slow = per_packet(f"{name} (encode)", args.packets, moves,
+                              getattr(controller(cls, False), meth))
+            fast = per_packet(f"{name} (builder)", args.packets, moves,
+                              getattr(controller(cls, True), meth))
+            print(f"{'':>34}  {slow / fast:.2f}x")
+
+        # batch mode: no per-packet sleep, packets are appended to one buffer
+        times = []
+        for fast in (False, True):
+            ctrl = controller(CompositeKMController, fast)
+            with ctrl.batch():
+                times.append(per_packet(f"USB batch move_rel ({'builder' if fast else 'encode'})",
+                                        args.packets, moves, ctrl.move_rel))
+        print(f"{'':>34}  {times[0] / times[1]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Scaling of DevicePool across many fake pty devices (no hardware needed).
+
+    python bench_pool.py --devices 1 4 16 32 -n 500
+"""
+import argparse
+from contextlib import ExitStack
+
+from km_fakedev import FakeKMDevice
+from km_pool import DevicePool
+
+
+def main():
+    ap = argparse.ArgumentParser(description="device pool scaling")
+    ap.add_argument("--devices", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("-n", "--events", type=int, default=500,
+                    help="mouse reports per device")
+    ap.add_argument("--baud", type=int, default=115200)
+    args = ap.parse_args()
+
+    def scenario(ctrl, device):
+        for i in range(args.events):
+            ctrl.send_mouse(i % 7 - 3, 1)
+        return args.events
+
+    for n in args.devices:
+        with ExitStack() as stack:
+            devs = [stack.enter_context(FakeKMDevice(baudrate=args.baud, throttle=True,
+                                                     keep=False))
+                    for _ in range(n)]
+            report = DevicePool([d.port for d in devs]).run(scenario)
+            for d in devs:
+                d.wait_idle()
+            s = report.summary()
+            received = sum(d.stats()["packets"] for d in devs)
+        total = n * args.events
+        print(f"{n:3d} devices: {s['passed']}/{n} passed, wall {s['wall_s']:.3f} s, "
+              f"{total / s['wall_s']:9.0f} events/s aggregate, "
+              f"devices received {received}/{total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Mouse stream through link drops: numbered packets go to a throttled
+FakeKMDevice over a socket, paced at --load of the UART rate (a real
+serial write blocks; a socket would just buffer), while the link is cut
+every --every packets (the second cut is a reboot) and km_resilient
+reconnects. A key tap goes out with every 10th packet. Reports reconnect
+time, packets lost / duplicated and host throughput against the same run
+without faults. Without ACKs only idempotent packets may be replayed, so
+the run fails if any relative move or key tap arrives twice.
+
+    python bench_reconnect.py -n 3000 --every 1000 --down 0.2
+"""
+import argparse
+import time
+
+from add07 import PS2Controller
+from km_fakedev import FakeKMDevice
+from km_pacer import Pacer
+from km_resilient import protect
+from km_scenario import KIND_KEY, KIND_MOUSE
+
+KEY_EVERY = 10
+
+
+def run(n, every, down, baud, load):
+    with FakeKMDevice(transport="socket", throttle=True, baudrate=baud,
+                      drop_on_reboot=down if every else None) as dev:
+        api = PS2Controller(port=dev.port)
+        link = protect(api, port=dev.port)
+        api.pacer = Pacer(load * baud / 10 / len(f"{n},0,0,0,0\r\n"))
+        api.enter_sim_mode()
+        api.set_mode_mouse()
+        t0 = time.perf_counter()
+        for seq in range(n):
+            if every and seq and seq % every == 0:
+                if seq // every == 2:
+                    api.reboot()
+                else:
+                    dev.disconnect(down)
+            api.send_mouse(seq, 0)
+            if seq % KEY_EVERY == 0:
+                api.send_keys("1C")
+        host = time.perf_counter() - t0
+        dev.wait_idle(quiet=0.2, timeout=60)
+        seen = [int(p.payload.split(",")[0]) for p in dev.packets if p.kind == KIND_MOUSE]
+        keys = sum(1 for p in dev.packets if p.kind == KIND_KEY)
+        state = dict(dev.state)
+        api.close()
+    return host, seen, keys, link.stats(), state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="reconnect benchmark")
+    ap.add_argument("-n", "--packets", type=int, default=3000)
+    ap.add_argument("--every", type=int, default=1000,
+                    help="drop the link every N packets (the 2nd drop is a reboot)")
+    ap.add_argument("--down", type=float, default=0.2,
+                    help="seconds the device refuses connections after a drop")
+    ap.add_argument("--baud", type=int, default=115200)
+    ap.add_argument("--load", type=float, default=0.9,
+                    help="send rate as a fraction of what the UART carries")
+    args = ap.parse_args()
+
+    base, _, _, _, _ = run(args.packets, 0, 0, args.baud, args.load)
+    host, seen, keys, st, state = run(args.packets, args.every, args.down, args.baud, args.load)
+    unique = set(seen)
+    taps = -(-args.packets // KEY_EVERY)
+    print(f"no faults : {args.packets / base:9,.0f} packets/s host")
+    print(f"with {st['faults']} faults: {args.packets / host:9,.0f} packets/s host "
+          f"({host - base:.2f} s spent recovering)")
+    print(f"reconnects {st['reconnects']}, last {st['reconnect_last_s'] * 1e3:.1f} ms, "
+          f"max {st['reconnect_max_s'] * 1e3:.1f} ms, total {st['reconnect_total_s'] * 1e3:.1f} ms")
+    print(f"delivered {len(unique)}/{args.packets}, lost {args.packets - len(unique)}, "
+          f"duplicated {len(seen) - len(unique)} (replayed {st['replayed_packets']})")
+    print(f"key taps delivered {keys}/{taps}")
+    print(f"mode restores {st['restores']}, device state sim={state['sim']} "
+          f"ps2_mode={state['ps2_mode']}")
+    assert len(seen) == len(unique), "relative moves were replayed twice"
+    assert keys <= taps, "key taps were replayed twice"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+ABS traffic for a dense drag: move_abs_batch on every sample vs
+move_to_batch, which maps normalized coordinates through the screen model
+and drops redundant reports.
+
+    python bench_screen.py -n 20000 --res 1920 1080
+"""
+import argparse
+import math
+import time
+
+from add07 import CompositeKMController
+from bench_bulk import NullSerial
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ABS drag traffic")
+    ap.add_argument("-n", "--samples", type=int, default=20000)
+    ap.add_argument("--res", type=int, nargs=2, default=[1920, 1080])
+    args = ap.parse_args()
+    w, h = args.res
+
+    # slow circular drag sampled far above the pixel rate, left button held
+    u = [0.5 + 0.2 * math.cos(2 * math.pi * i / args.samples) for i in range(args.samples)]
+    v = [0.5 + 0.2 * math.sin(2 * math.pi * i / args.samples) for i in range(args.samples)]
+
+    for label, dedupe in (("move_abs_batch, every sample", False),
+                          ("move_to_batch, deduplicated", True)):
+        ser = NullSerial()
+        km = CompositeKMController(ser=ser)
+        km.WAIT = 0
+        km.set_resolution(w, h)
+        ser.writes = ser.bytes = 0
+        t0 = time.perf_counter()
+        if dedupe:
+            sent = km.move_to_batch(u, v, buttons=1, normalized=True)
+        else:
+            sent = km.move_abs_batch([round(x * (w - 1)) for x in u],
+                                     [round(y * (h - 1)) for y in v], buttons=1)
+        dt = time.perf_counter() - t0
+        print(f"{label:>30}: {sent:6d} reports, {ser.bytes:8d} bytes, "
+              f"host {dt * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
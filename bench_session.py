@@ -0,0 +1,47 @@
+"""
+Compare events/s of the old one-process-per-event approach against a
+persistent PS2Session.
+
+    python bench_session.py                 # pyserial loop://, no hardware
+    python bench_session.py -p COM25 -n 200
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from km_session import PS2Session
+
+
+def bench_subprocess(port, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        subprocess.run([sys.executable, "add07.py", "ps2", "-p", port,
+                        "move", "1", "0"], check=True)
+    return time.perf_counter() - t0
+
+
+def bench_session(port, n):
+    t0 = time.perf_counter()
+    with PS2Session(port=port) as s:
+        for _ in range(n):
+            s.move(1, 0)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="subprocess vs session throughput")
+    ap.add_argument("-p", "--port", default="loop://")
+    ap.add_argument("-n", "--events", type=int, default=50,
+                    help="events per method (subprocess is slow, keep it small)")
+    args = ap.parse_args()
+
+    for name, fn in (("subprocess", bench_subprocess), ("session", bench_session)):
+        dt = fn(args.port, args.events)
+        print(f"{name:>10}: {args.events} events in {dt:.3f} s "
+              f"-> {args.events / dt:10.1f} events/s "
+              f"({dt / args.events * 1e3:.3f} ms/event)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+CLI startup time of add07.py, and port discovery with and without the
+on-disk port cache.
+
+    python bench_startup.py -r 10
+
+Discovery is measured against a fake pty device that is written into a
+temporary cache file, so the cached path works on any host. The
+`raw` fast path is timed with packets precompiled by `--compile`, and
+`-X importtime` is summarised to show which modules the CLI still pulls in.
+The same commands are also timed with add07.py as of --baseline (taken
+with `git show`, default: the baseline commit), next to the current numbers.
+"""
+import argparse
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import serial.tools.list_ports
+
+import add07
+from km_fakedev import FakeKMDevice
+
+
+def wall(cmd, env, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def import_costs(cmd, env, top=8):
+    """Cumulative import time (us) of the heaviest top-level modules."""
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + cmd, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          text=True)
+    costs = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            if not name.startswith("  "):
+                costs.append((int(parts[1]), name.strip()))
+    return sorted(costs, reverse=True)[:top]
+
+
+def baseline_script(rev, tmp):
+    """add07.py at git revision rev, written into tmp; None if git cannot provide it."""
+    try:
+        src = subprocess.run(["git", "show", f"{rev}:add07.py"], capture_output=True,
+                             check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    path = os.path.join(tmp, "add07_baseline.py")
+    with open(path, "wb") as f:
+        f.write(src)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="add07.py startup benchmark")
+    ap.add_argument("-r", "--repeat", type=int, default=10)
+    ap.add_argument("--baseline", default="52ac60d",
+                    help="git revision whose add07.py is timed for comparison")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        serial.tools.list_ports.comports()
+    scan = (time.perf_counter() - t0) / args.repeat
+    print(f"comports() scan in-process      : {scan * 1e3:8.2f} ms")
+
+    with FakeKMDevice() as dev, tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "ports.json")
+        env = dict(os.environ, KM_PORT_CACHE=cache)
+        add07.PORT_CACHE = cache
+        with open(cache, "w") as f:
+            json.dump({"key": add07._current_port_key(dev.port), "device": dev.port,
+                       "stamp": add07._port_stamp(dev.port)}, f)
+
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            assert add07.find_km_port() == dev.port
+        hit = (time.perf_counter() - t0) / args.repeat
+        print(f"find_km_port() cache hit        : {hit * 1e3:8.2f} ms")
+
+        base = [sys.executable, "add07.py", "ps2"]
+        py = wall([sys.executable, "-c", "pass"], env, args.repeat)
+        imp = wall([sys.executable, "-c", "import add07"], env, args.repeat)
+        explicit = wall(base + ["-p", dev.port, "type", "1C"], env, args.repeat)
+        cached = wall(base + ["type", "1C"], env, args.repeat)
+        nocache = wall(base + ["type", "1C"], dict(env, KM_NO_PORT_CACHE="1"),
+                       args.repeat)
+        print(f"python -c pass                  : {py * 1e3:8.2f} ms")
+        print(f"python -c 'import add07'        : {imp * 1e3:8.2f} ms")
+        print(f"add07.py ps2 -p PORT type 1C    : {explicit * 1e3:8.2f} ms")
+        print(f"add07.py ps2 type 1C (cached)   : {cached * 1e3:8.2f} ms")
+        print(f"add07.py ps2 type 1C (no cache) : {nocache * 1e3:8.2f} ms "
+              f"(scan only; fails without a real CH340)")
+
+        old = baseline_script(args.baseline, tmp)
+        if old is None:
+            print(f"baseline {args.baseline}: not available (git show failed)")
+        else:
+            old_env = dict(env, PYTHONPATH=tmp)
+            old_imp = wall([sys.executable, "-c", "import add07_baseline"], old_env, args.repeat)
+            old_explicit = wall([sys.executable, old, "ps2", "-p", dev.port, "type", "1C"],
+                                old_env, args.repeat)
+            old_scan = wall([sys.executable, old, "ps2", "type", "1C"], old_env, args.repeat)
+            print(f"baseline {args.baseline}:")
+            print(f"  import add07                  : {old_imp * 1e3:8.2f} ms "
+                  f"(now {imp * 1e3:.2f})")
+            print(f"  add07.py ps2 -p PORT type 1C  : {old_explicit * 1e3:8.2f} ms "
+                  f"(now {explicit * 1e3:.2f})")
+            print(f"  add07.py ps2 type 1C (scan)   : {old_scan * 1e3:8.2f} ms "
+                  f"(now {nocache * 1e3:.2f} without cache)")
+
+        compiled = shlex.split(subprocess.run(base[:2] + ["--compile", "ps2", "type", "1C"],
+                                              env=env, capture_output=True, text=True,
+                                              check=True).stdout)
+        raw = [sys.executable, "add07.py", compiled[0], "-p", dev.port] + compiled[1:]
+        fast = wall(raw, env, args.repeat)
+        print(f"add07.py raw -p PORT -- 1C      : {fast * 1e3:8.2f} ms")
+
+        runs = [("ps2 type", base[1:] + ["-p", dev.port, "type", "1C"], env),
+                ("raw", raw[1:], env)]
+        if old is not None:
+            runs.append((f"baseline {args.baseline} ps2 type",
+                         [old, "ps2", "-p", dev.port, "type", "1C"], old_env))
+        for label, cmd, run_env in runs:
+            print(f"\n-X importtime, {label} (cumulative us, top level):")
+            for us, name in import_costs(cmd, run_env):
+                print(f"  {us:8d}  {name}")
+
+
+if __name__ == "__main__":
+    main()
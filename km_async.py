@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_async.py
+
+PS2Controller / CompositeKMController 的 asyncio 版本。
+
+同步版本的 ser.write 与 time.sleep 会阻塞事件循环；这里所有发送方法都是
+协程，数据包先进入有界 asyncio.Queue（队列满时 await 即为背压），
+由后台写任务在串口 fd 上以非阻塞方式写出，连续排队的包合并为一次 write。
+数据包经同步控制器的 _encode 编码（km_binary.negotiate(ctrl.sync) 协商的
+二进制帧同样生效），与同步版本行为一致。
+写出失败时写任务停止并丢弃排队的包，之后的 put / drain / aclose 抛出该异常。
+
+不支持 fileno() 的端口（Windows、loop:// 等）退化为线程池中执行 ser.write。
+get_status / get_firmware_info 与同步版本相同：km_reader.attach(ctrl.sync) 后
+返回可 await 的回复（asyncio Future），未挂 reader 时返回 None。
+
+用法示例：
+  async def main():
+      ps2 = await AsyncPS2Controller.open(port="/dev/ttyUSB0")
+      await ps2.enter_sim_mode()
+      await ps2.set_mode_mouse()
+      for _ in range(100):
+          await ps2.send_mouse(1, 0)
+      await ps2.close()
+"""
+
+import asyncio
+import functools
+import os
+
+from add07 import CompositeKMController, PS2Controller, mouse_payload
+
+
+class AsyncSerialWriter:
+    """有界队列 + 单写任务，把 bytes 非阻塞地写入串口。"""
+
+    MAX_COALESCE = 4096
+
+    def __init__(self, ser, maxsize=256):
+        self.ser = ser
+        self.queue = asyncio.Queue(maxsize)
+        self.task = None
+        self.bytes = 0
+        self.writes = 0
+        self.error = None       # 写任务因异常停止时的异常
+        try:
+            self.fd = ser.fileno() if os.name != "nt" else None
+        except (AttributeError, NotImplementedError, OSError):
+            self.fd = None
+        if self.fd is not None:
+            os.set_blocking(self.fd, False)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, data):
+        if self.error is not None:
+            raise self.error
+        self.start()
+        await self.queue.put(data)
+        if self.error is not None:     # 等待期间写任务已停止，没有人会取走这个包
+            self._discard()
+            raise self.error
+
+    def _discard(self):
+        """丢弃排队的包，使 queue.join() 与阻塞在 put 上的协程返回。"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
+    async def _run(self):
+        while True:
+            data = await self.queue.get()
+            n = 1
+            # 合并已排队的包，减少系统调用
+            if not self.queue.empty():
+                buf = bytearray(data)
+                while not self.queue.empty() and len(buf) < self.MAX_COALESCE:
+                    buf += self.queue.get_nowait()
+                    n += 1
+                data = buf
+            try:
+                await self._write(data)
+            except Exception as exc:
+                self.error = exc
+                return
+            finally:
+                for _ in range(n):
+                    self.queue.task_done()
+                if self.error is not None:
+                    self._discard()
+
+    async def _write(self, data):
+        self.writes += 1
+        self.bytes += len(data)
+        if self.fd is None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.ser.write, bytes(data))
+            return
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(self.fd, view)
+            except BlockingIOError:
+                await self._writable()
+                continue
+            view = view[n:]
+
+    async def _writable(self):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        loop.add_writer(self.fd, lambda: fut.done() or fut.set_result(None))
+        try:
+            await fut
+        finally:
+            loop.remove_writer(self.fd)
+
+    async def drain(self):
+        """等待队列中已有数据全部写出；写任务出错时抛出其异常。"""
+        if self.task is not None:
+            await self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    async def aclose(self):
+        try:
+            await self.drain()
+        finally:
+            await self._stop()
+
+    async def _stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+class _AsyncBase:
+    SYNC_CLASS = None
+
+    def __init__(self, port=None, baudrate=None, timeout=0.5, ser=None,
+                 maxsize=256):
+        # 端口匹配、打开与同步版本一致
+        self.sync = self.SYNC_CLASS(port=port, baudrate=baudrate,
+                                    timeout=timeout, ser=ser)
+        self.ser = self.sync.ser
+        self.writer = AsyncSerialWriter(self.ser, maxsize)
+
+    @classmethod
+    async def open(cls, *args, **kwargs):
+        """在线程池中完成端口匹配与打开（含 0.1 s 稳定等待），不阻塞事件循环。"""
+        loop = asyncio.get_running_loop()
+        obj = await loop.run_in_executor(None, functools.partial(cls, *args, **kwargs))
+        obj.writer.start()
+        return obj
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def close(self):
+        await self.writer.aclose()
+        self.sync.close()
+
+    async def __aenter__(self):
+        self.writer.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class AsyncPS2Controller(_AsyncBase):
+    """PS2Controller 的异步版本，方法与同步版本一一对应。"""
+    SYNC_CLASS = PS2Controller
+
+    async def _send(self, cmd, kind=None):
+        pkt = self.sync._encode(cmd, None, kind)
+        if pkt is not None:
+            await self.writer.put(pkt)
+
+    async def enter_sim_mode(self):    await self._send(PS2Controller.CMD_SIM_ON)
+    async def exit_sim_mode(self):     await self._send(PS2Controller.CMD_SIM_OFF)
+    async def set_mode_mouse(self):    await self._send(PS2Controller.CMD_MOUSE_MODE)
+    async def set_mode_keyboard(self): await self._send(PS2Controller.CMD_KEY_MODE)
+    async def exit_mode(self):         await self._send(PS2Controller.CMD_EXIT)
+    async def reboot(self):            await self._send(PS2Controller.CMD_REBOOT)
+
+    async def send_mouse(self, dx, dy,
+                         left=False, right=False,
+                         middle=False, wheel=None):
+        await self._send(mouse_payload(dx, dy, left, right, middle, wheel), kind="mouse")
+
+    async def send_keys(self, data):   await self._send(data, kind="key")
+
+    async def send_combo(self, combo, layout=None):
+        """按 km_layout 的扫描码表发送组合键，同 PS2Controller.send_combo。"""
+        from km_layout import get_layout
+        for ev in get_layout(layout).combo(combo):
+            await self._send(ev, kind="key")
+
+
+class AsyncCompositeKMController(_AsyncBase):
+    """
+    CompositeKMController 的异步版本。
+
+    同步版本每包后固定 sleep(WAIT)；这里改为 await asyncio.sleep(wait)，
+    wait 默认为 WAIT，设为 0 时仅受队列背压限制。
+    """
+    SYNC_CLASS = CompositeKMController
+
+    def __init__(self, *args, wait=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait = CompositeKMController.WAIT if wait is None else wait
+
+    async def _send(self, cmd=None, param=None, kind=None):
+        pkt = self.sync._encode(cmd, param, kind)
+        if pkt is None:
+            return
+        await self.writer.put(pkt)
+        if self.wait:
+            await asyncio.sleep(self.wait)
+
+    async def _query(self, kind, cmd):
+        """发送查询；同步控制器挂有 reader 时返回回复的 asyncio Future，否则返回 None。"""
+        reader = self.sync.reader
+        fut = reader.expect(kind) if reader is not None else None
+        await self._send(cmd=cmd)
+        return asyncio.wrap_future(fut) if fut is not None else None
+
+    async def set_mode_rel(self):      await self._send(cmd=CompositeKMController.CMD_REL_MODE)
+    async def set_mode_abs(self):      await self._send(cmd=CompositeKMController.CMD_ABS_MODE)
+    async def set_mode_key(self):      await self._send(cmd=CompositeKMController.CMD_KEY_MODE)
+    async def return_idle(self):       await self._send(cmd=CompositeKMController.CMD_IDLE)
+    async def enable_local(self):      await self._send(cmd=CompositeKMController.CMD_LOCAL_ON)
+    async def enable_remote(self):     await self._send(cmd=CompositeKMController.CMD_REMOTE_ON)
+    async def set_resolution(self, w, h):
+        await self._send(cmd=CompositeKMController.CMD_RESOLUTION, param=f"{w}x{h}")
+    async def get_firmware_info(self): return await self._query("fwinfo", CompositeKMController.CMD_FW_INFO)
+    async def get_status(self):        return await self._query("status", CompositeKMController.CMD_GET_STATUS)
+    async def enable_debug(self):      await self._send(cmd=CompositeKMController.CMD_DEBUG_ON)
+    async def disable_debug(self):     await self._send(cmd=CompositeKMController.CMD_DEBUG_OFF)
+    async def reboot(self):            await self._send(cmd=CompositeKMController.CMD_REBOOT)
+
+    async def move_rel(self, dx, dy,
+                       left=False, right=False,
+                       middle=False, wheel=0):
+        await self._send(param=mouse_payload(dx, dy, left, right, middle, wheel), kind="mouse")
+
+    async def move_abs(self, x, y,
+                       left=False, right=False,
+                       middle=False, wheel=0):
+        await self._send(param=mouse_payload(x, y, left, right, middle, wheel), kind="mouse")
+
+    async def send_text(self, text):   await self._send(param=text)
+    async def send_combo(self, combo): await self.send_text(combo)
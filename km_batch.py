@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_batch.py
+
+逐行执行命令脚本：一个进程、一个控制器实例、一条串口连接。
+
+每行使用与 CLI 子命令相同的语法（不含接口名与 -p），例如 ps2 脚本：
+  sim-on
+  mouse
+  move 0 -40
+  key
+  type 12,0
+空行与以 # 开头的行被忽略。脚本按行流式读取，不会整体载入内存。
+
+由 add07.py 的 batch 子命令调用：
+  python add07.py ps2 --port COM25 batch scenario.txt --interval 0.02
+  cat scenario.txt | python add07.py ps2 batch - --stop-on-error
+
+LineParser 同时供 km_daemon 解析客户端发来的命令行。
+"""
+
+import argparse
+import shlex
+import sys
+import time
+
+from add07 import build_parser, run_ps2, run_usb
+
+
+class LineParser(argparse.ArgumentParser):
+    """解析单行命令用：出错时抛 ValueError 而不是退出进程。"""
+
+    def error(self, message):
+        raise ValueError(message)
+
+    def exit(self, status=0, message=None):
+        raise ValueError(message or f"exit {status}")
+
+
+def iter_commands(lines):
+    """
+    lines（文件对象或任意可迭代对象）-> (行号, 命令行文本)，跳过空行与注释。
+    分词留给调用方，引号不配对等错误按单行失败处理。
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield lineno, line
+
+
+def run_lines(ctrl, interface, lines, interval=0.0, stop_on_error=False,
+              on_error=None):
+    """
+    在 ctrl 上依次执行 lines 中的命令，返回 (成功数, 失败数)。
+
+    interval  相邻命令的起始间隔（秒），按 perf_counter 截止时刻对齐，不累积漂移
+    stop_on_error  遇到第一个解析或执行错误即停止
+    on_error  回调 on_error(行号, 异常)；默认打印到 stderr
+    """
+    parser = build_parser(LineParser, argv=[interface])
+    runner = run_usb if interface == "usb" else run_ps2
+    if on_error is None:
+        on_error = lambda n, e: print(f"[batch] 第 {n} 行: {e}", file=sys.stderr)
+    ok = failed = 0
+    deadline = time.perf_counter()
+    for lineno, line in iter_commands(lines):
+        if interval and ok + failed:
+            deadline += interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            args = parser.parse_args([interface] + shlex.split(line))
+            if (args.cmd if interface == "usb" else args.action) == "batch":
+                raise ValueError("batch 不能 嵌套")
+            runner(ctrl, args)
+            ok += 1
+        except Exception as e:
+            failed += 1
+            on_error(lineno, e)
+            if stop_on_error:
+                break
+    return ok, failed
+
+
+def run_file(ctrl, interface, path, **kwargs):
+    """path 为 "-" 时读取 stdin；其余参数同 run_lines。"""
+    if path == "-":
+        return run_lines(ctrl, interface, sys.stdin, **kwargs)
+    with open(path, encoding="utf-8") as f:
+        return run_lines(ctrl, interface, f, **kwargs)
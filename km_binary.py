@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_binary.py
+
+紧凑二进制帧：减少每个鼠标 / 键盘报告占用的 UART 字节数。
+
+文本格式的鼠标报告如 "-40,0,0,0,0,0\\r\\n" 最长约 20 字节，115200 波特
+（10 bit/字节）下只能传输几千个报告每秒。二进制帧固定长度：
+
+  鼠标  A5 01 dx:int16 dy:int16 buttons:u8 wheel:int8 sum:u8     9 字节
+  键盘  A5 02 code:u8 action:u8 sum:u8                            5 字节
+
+  多字节字段为小端；sum 为第 2 字节（类型）到 sum 之前所有字节之和的低 8 位。
+  buttons  bit0 左键  bit1 右键  bit2 中键  bit3 带 wheel（否则 wheel 忽略）
+  action   0 按下  1 释放  2 敲击
+
+协商：发送 CMD_BINARY_ON，固件回复 "BIN:1" 后才启用；无回复（旧固件）时
+保持文本格式。是否成帧由发送方决定：只有 move_rel / move_abs / send_mouse
+（kind="mouse"）与 send_keys / send_combo（kind="key"）的数据才编码为帧；
+命令（#0x..）、cmd:param、send_text 文本以及无法表示为单个扫描码的键盘数据
+始终以文本发送，因此两种格式可在同一条链路上混合。
+
+用法示例：
+  api = PS2Controller(port="COM25")
+  if negotiate(api):              # 之后 send_mouse / send_keys 自动使用二进制帧
+      ...
+  blob = encode_mouse_batch(dxs, dys)   # 批量编码，有 numpy 时向量化
+  api.ser.write(blob)
+"""
+
+import re
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:     # numpy 可选，仅用于 encode_mouse_batch 的向量化
+    np = None
+
+from add07 import encode_packet as encode_text
+
+SYNC = 0xA5
+T_MOUSE, T_KEY = 0x01, 0x02
+MOUSE_SIZE, KEY_SIZE = 9, 5
+FRAME_SIZE = {T_MOUSE: MOUSE_SIZE, T_KEY: KEY_SIZE}
+B_LEFT, B_RIGHT, B_MIDDLE, B_WHEEL = 1, 2, 4, 8
+MAKE, BREAK, TAP = 0, 1, 2
+
+CMD_BINARY_ON  = "#0xE7@BIN1"
+CMD_BINARY_OFF = "#0xE7@BIN0"
+
+_MOUSE = struct.Struct("<BBhhBb")
+_KEY = struct.Struct("<BBBB")
+_KEY_RE = re.compile(r"^([0-9A-Fa-f]{2})(?:,([01]))?$")
+
+
+def encode_mouse(dx, dy, left=False, right=False, middle=False, wheel=None):
+    """单个鼠标报告 -> 9 字节帧。"""
+    buttons = (left and B_LEFT) | (right and B_RIGHT) | (middle and B_MIDDLE)
+    if wheel is not None:
+        buttons |= B_WHEEL
+    head = _MOUSE.pack(SYNC, T_MOUSE, dx, dy, buttons, wheel or 0)
+    return head + bytes([sum(head[1:]) & 0xFF])
+
+
+def encode_key(code, action=TAP):
+    """单个扫描码事件 -> 5 字节帧。"""
+    head = _KEY.pack(SYNC, T_KEY, code, action)
+    return head + bytes([sum(head[1:]) & 0xFF])
+
+
+def encode_payload(payload, kind):
+    """
+    kind 为 "mouse" 的 dx,dy,l,r,m[,w] 或 kind 为 "key" 的 "1C" / "12,0" -> 二进制帧；
+    无法表示时返回 None。
+    """
+    if kind == "mouse":
+        parts = payload.split(",")
+        if len(parts) not in (5, 6):
+            return None
+        try:
+            v = [int(p) for p in parts]
+        except ValueError:
+            return None
+        return encode_mouse(v[0], v[1], v[2], v[3], v[4],
+                            v[5] if len(v) == 6 else None)
+    if kind == "key":
+        m = _KEY_RE.match(payload)
+        if m:
+            return encode_key(int(m.group(1), 16),
+                              TAP if m.group(2) is None else int(m.group(2)))
+    return None
+
+
+def encode_packet(cmd=None, param=None, kind=None):
+    """
+    与 add07.encode_packet 签名相同的编码器：发送方标明 kind 的鼠标 / 单个扫描码
+    数据用二进制帧，其余（命令、cmd:param、文本）退回文本格式。
+    negotiate() 把它赋给 ctrl._encode。
+    """
+    if kind is not None and (cmd is None) != (param is None):
+        try:
+            frame = encode_payload(cmd or param, kind)
+        except struct.error:        # 超出 int16 / int8 范围
+            frame = None
+        if frame is not None:
+            return frame
+    return encode_text(cmd, param)
+
+
+def encode_mouse_batch(dx, dy, buttons=0, wheel=None):
+    """
+    批量编码鼠标帧，返回拼接后的 bytes。dx / dy 为等长序列；buttons 为
+    B_LEFT|B_RIGHT|B_MIDDLE 组合（标量或序列）；wheel 为 None 或标量 / 序列。
+    有 numpy 时整批向量化，否则逐个 struct.pack。
+    """
+    if np is None:
+        n = len(dx)
+        btn = buttons if hasattr(buttons, "__len__") else [buttons] * n
+        whl = wheel if hasattr(wheel, "__len__") else [wheel] * n
+        return b"".join(
+            encode_mouse(x, y, b & B_LEFT, b & B_RIGHT, b & B_MIDDLE, w)
+            for x, y, b, w in zip(dx, dy, btn, whl))
+
+    dx = np.asarray(dx, dtype="<i2")
+    frames = np.zeros(len(dx), dtype=[("sync", "u1"), ("type", "u1"),
+                                      ("dx", "<i2"), ("dy", "<i2"),
+                                      ("buttons", "u1"), ("wheel", "i1"),
+                                      ("sum", "u1")])
+    frames["sync"] = SYNC
+    frames["type"] = T_MOUSE
+    frames["dx"] = dx
+    frames["dy"] = np.asarray(dy, dtype="<i2")
+    frames["buttons"] = np.asarray(buttons, dtype="u1") & (B_LEFT | B_RIGHT | B_MIDDLE)
+    if wheel is not None:
+        frames["buttons"] |= B_WHEEL
+        frames["wheel"] = np.asarray(wheel, dtype="i1")
+    raw = frames.view("u1").reshape(-1, MOUSE_SIZE)
+    raw[:, 8] = raw[:, 1:8].sum(axis=1, dtype="u4") & 0xFF
+    return raw.tobytes()
+
+
+def frame_payload(frame):
+    """二进制帧 -> 等价的文本数据（供设备侧分类与记录）。"""
+    if frame[1] == T_MOUSE:
+        _, _, dx, dy, buttons, wheel = _MOUSE.unpack_from(frame)
+        text = (f"{dx},{dy},{buttons & B_LEFT and 1},"
+                f"{buttons & B_RIGHT and 1},{buttons & B_MIDDLE and 1}")
+        return f"{text},{wheel}" if buttons & B_WHEEL else text
+    code, action = frame[2], frame[3]
+    return f"{code:02X}" if action == TAP else f"{code:02X},{action}"
+
+
+def split_frame(buf):
+    """
+    buf 以 SYNC 开头时尝试取出一帧：返回 (帧, 消耗字节数)。
+    数据不足返回 (None, 0)；类型或校验错误返回 (None, 1)，调用方丢弃 1 字节重新同步。
+    """
+    if len(buf) < 2:
+        return None, 0
+    size = FRAME_SIZE.get(buf[1])
+    if size is None:
+        return None, 1
+    if len(buf) < size:
+        return None, 0
+    frame = bytes(buf[:size])
+    if sum(frame[1:-1]) & 0xFF != frame[-1]:
+        return None, 1
+    return frame, size
+
+
+def negotiate(ctrl, timeout=0.5):
+    """
+    请求固件切换到二进制帧。收到 "BIN:1" 时把 ctrl._encode 换成本模块的
+    encode_packet 并返回 True；超时（旧固件）时保持文本格式并返回 False。
+    挂有 km_reader 时经 reader 等待回复，否则直接读串口。
+    """
+    reader = getattr(ctrl, "reader", None)
+    if reader is not None:
+        fut = reader.expect("binmode")
+        ctrl._send(CMD_BINARY_ON)
+        try:
+            ok = fut.result(timeout=timeout).fields[:1] == ["1"]
+        except Exception:
+            ok = False
+    else:
+        ok = False
+        ctrl._send(CMD_BINARY_ON)
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            line = ctrl.ser.readline().decode(errors="ignore").strip()
+            if line.upper().startswith("BIN:"):
+                ok = line[4:].strip() == "1"
+                break
+    if ok:
+        ctrl._encode = encode_packet
+    return ok
+
+
+def disable(ctrl):
+    """恢复文本格式并通知固件。"""
+    ctrl.__dict__.pop("_encode", None)
+    ctrl._send(CMD_BINARY_OFF)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_bulk.py
+
+批量鼠标报告编码：一次把成千上万个位移（如录制的人手轨迹）编码进
+同一个缓冲区，供 PS2Controller.send_mouse_batch 与
+CompositeKMController.move_rel_batch / move_abs_batch 一次写出。
+
+  - 超出位移上限的报告按累计坐标拆分为多个合法报告（总位移不变），
+    或 clamp=True 时直接截断；
+  - 文本格式在有 numpy 时整批向量化：逐列算出十进制数字，拼成字节矩阵后
+    去掉填充字节，Python 层没有逐元素循环；无 numpy 时退回 bytes % 格式化；
+  - 协商了 km_binary 二进制帧时直接用 km_binary.encode_mouse_batch。
+
+buttons 为 LEFT | RIGHT | MIDDLE 的位组合（与 km_binary 的 B_* 相同），
+可为标量或与 dx 等长的序列。wheel 为 None 时报告不含滚轮字段；拆分时
+滚轮只放在第一个子报告上。
+
+encode() 返回 (data, ends)：ends[i] 为第 i 个报告在 data 中的结束偏移，
+用于分块写出与逐包统计。
+"""
+
+try:
+    import numpy as np
+except ImportError:     # numpy 可选，缺失时退回纯 Python 编码
+    np = None
+
+LEFT, RIGHT, MIDDLE = 1, 2, 4
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def split(dx, dy, buttons=0, wheel=None, limit=None, clamp=False):
+    """
+    按 limit 拆分或截断位移，返回 (dx, dy, buttons, wheel)；
+    有 numpy 时为数组，否则为列表。limit 为 None 时不处理。
+    """
+    if np is not None:
+        dx = np.asarray(dx, dtype=np.int64)
+        dy = np.asarray(dy, dtype=np.int64)
+        buttons = np.broadcast_to(np.asarray(buttons, dtype=np.int64), dx.shape)
+        if wheel is not None:
+            wheel = np.broadcast_to(np.asarray(wheel, dtype=np.int64), dx.shape)
+        if limit is None:
+            return dx, dy, buttons, wheel
+        if clamp:
+            return np.clip(dx, -limit, limit), np.clip(dy, -limit, limit), buttons, wheel
+        parts = np.maximum(1, np.maximum(_ceil_div(np.abs(dx), limit),
+                                         _ceil_div(np.abs(dy), limit)))
+        if (parts == 1).all():
+            return dx, dy, buttons, wheel
+        idx = np.repeat(np.arange(len(dx)), parts)
+        k = np.arange(len(idx)) - np.repeat(np.cumsum(parts) - parts, parts)
+        n = parts[idx]
+        x, y = dx[idx], dy[idx]
+        # 累计坐标取整后差分：各子报告之和恰为原位移，且每个都不超过 limit
+        sx = x * (k + 1) // n - x * k // n
+        sy = y * (k + 1) // n - y * k // n
+        if wheel is not None:
+            wheel = np.where(k == 0, wheel[idx], 0)
+        return sx, sy, buttons[idx], wheel
+
+    dx, dy = list(dx), list(dy)
+    n = len(dx)
+    buttons = list(buttons) if hasattr(buttons, "__len__") else [buttons] * n
+    if wheel is not None:
+        wheel = list(wheel) if hasattr(wheel, "__len__") else [wheel] * n
+    if limit is None:
+        return dx, dy, buttons, wheel
+    if clamp:
+        clip = lambda v: -limit if v < -limit else limit if v > limit else v
+        return [clip(v) for v in dx], [clip(v) for v in dy], buttons, wheel
+    ox, oy, ob, ow = [], [], [], []
+    for i in range(n):
+        x, y = dx[i], dy[i]
+        parts = max(1, _ceil_div(abs(x), limit), _ceil_div(abs(y), limit))
+        for k in range(parts):
+            ox.append(x * (k + 1) // parts - x * k // parts)
+            oy.append(y * (k + 1) // parts - y * k // parts)
+            ob.append(buttons[i])
+            if wheel is not None:
+                ow.append(wheel[i] if k == 0 else 0)
+    return ox, oy, ob, ow if wheel is not None else None
+
+
+def _digits(v):
+    """int 数组 -> 右对齐十进制字节矩阵（含负号），填充位为 0。"""
+    if not len(v) or (v.min() >= 0 and v.max() < 10):    # 按键位等单个数字
+        return (v.astype(np.uint8) + 48).reshape(-1, 1)
+    a = np.abs(v).astype(np.int32)
+    width = len(str(int(a.max()))) + 1
+    out = np.zeros((len(v), width), np.uint8)
+    neg = v < 0
+    signed = np.zeros(len(v), bool)
+    for col in range(width - 1, -1, -1):
+        if col == width - 1:
+            out[:, col] = a % 10 + 48
+        else:
+            digit = a > 0
+            out[:, col] = np.where(digit, a % 10 + 48, 0)
+            sign = ~digit & neg & ~signed
+            out[sign, col] = 45
+            signed |= sign
+        a = a // 10
+    return out
+
+
+def encode_text(columns):
+    """
+    columns 为若干等长整数列 -> (data, ends)，每行 "c0,c1,...\\r\\n"。
+    """
+    if np is not None:
+        cols = [np.asarray(c, dtype=np.int64) for c in columns]
+        n = len(cols[0])
+        if not n:
+            return b"", np.zeros(0, np.int64)
+        comma = np.full((n, 1), 44, np.uint8)
+        parts = []
+        for c in cols:
+            parts += [_digits(c), comma]
+        parts[-1] = np.tile(np.frombuffer(b"\r\n", np.uint8), (n, 1))
+        m = np.concatenate(parts, axis=1)
+        keep = m != 0
+        return m[keep].tobytes(), np.cumsum(keep.sum(axis=1))
+
+    fmt = (",".join(["%d"] * len(columns)) + "\r\n").encode()
+    rows = [fmt % row for row in zip(*columns)]
+    ends, total = [], 0
+    for r in rows:
+        total += len(r)
+        ends.append(total)
+    return b"".join(rows), ends
+
+
+def encode(dx, dy, buttons=0, wheel=None, limit=None, clamp=False, binary=False):
+    """拆分 / 截断后整批编码为文本或 km_binary 二进制帧，返回 (data, ends)。"""
+    dx, dy, buttons, wheel = split(dx, dy, buttons, wheel, limit, clamp)
+    if binary:
+        from km_binary import MOUSE_SIZE, encode_mouse_batch
+        data = encode_mouse_batch(dx, dy, buttons, wheel)
+        return data, range(MOUSE_SIZE, len(data) + 1, MOUSE_SIZE)
+    if np is not None:
+        columns = [dx, dy, buttons & LEFT, (buttons >> 1) & 1, (buttons >> 2) & 1]
+    else:
+        columns = [dx, dy, [b & LEFT for b in buttons],
+                   [b >> 1 & 1 for b in buttons], [b >> 2 & 1 for b in buttons]]
+    if wheel is not None:
+        columns.append(wheel)
+    return encode_text(columns)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_capture.py
+
+捕获被测主机的回显并自动校验输入结果。
+
+被测主机把收到的键盘输入回显到串口：控制器自身的链路（EchoCapture.attach），
+或单独的捕获串口（EchoCapture.open）。处理分为两级，互不阻塞：
+
+  读取   串口读取线程（或 km_reader 的 on_data 回调）只把字节写入环形缓冲区
+         RingBuffer，不做解析，跟得上全速输入；缓冲区写满时丢弃最旧的数据
+         并计入 overrun；
+  校验   校验线程从环形缓冲区取数据，增量解码（UTF-8 多字节字符跨 read()
+         边界也能正确拼接），\\r\\n / \\r / \\n 均视为行结束，逐行与期望
+         文本比对，用 difflib 给出逐字符的替换 / 缺失 / 多余。
+
+期望文本由发出的扫描码事件经 km_layout.KeyDecoder 还原（expect_events），
+因此校验的是编译后的按键序列在主机上实际产生的字符。发送端无需等待回显，
+全部发送完后 wait() 等到所有期望行都已比对（或超时）即可。
+
+在控制器链路上捕获时，整行符合固件回复格式（FIRMWARE_LINE：OK、ACK、
+STATUS:..、FW:..、BIN:0/1、[DBG] ..，区分大小写）的行不计为回显；以 "ok"、
+"Version" 等开头的普通回显照常比对。
+
+用法示例：
+  with PS2Session(port="COM25", layout="us") as s:
+      s.capture = EchoCapture.attach(s.api)
+      s.sim_on()
+      s.key_mode()
+      for line in lines:
+          s.type_string(line)
+          s.type_combo("ENTER")
+      s.capture.wait(timeout=5)
+  s.capture.close()
+  print(s.capture.report())
+"""
+
+import codecs
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from difflib import SequenceMatcher
+
+from km_layout import get_layout
+
+Mismatch = namedtuple("Mismatch", "pos op expected got")
+LineResult = namedtuple("LineResult", "index expected got mismatches")
+
+# 固件回复的完整行（见 km_reader.RULES，但只认固件实际发出的大写格式）
+FIRMWARE_LINE = re.compile(
+    r"^(?:OK|ACK|STATUS:[A-Z0-9_]+(?:,[A-Z0-9_]+)*|FW:\S.*|BIN:[01]|\[DBG\] .*)$")
+
+
+class RingBuffer:
+    """单写者 / 单读者的字节环形缓冲区；写满时覆盖最旧的数据。"""
+
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._head = 0          # 已写入的总字节数
+        self._tail = 0          # 已读出的总字节数
+        self.overrun = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def write(self, data):
+        n = len(data)
+        if n > self.size:
+            data, n = data[-self.size:], self.size
+        with self._cond:
+            i = self._head % self.size
+            first = min(n, self.size - i)
+            self._view[i:i + first] = data[:first]
+            self._view[:n - first] = data[first:]
+            self._head += n
+            lost = self._head - self._tail - self.size
+            if lost > 0:
+                self.overrun += lost
+                self._tail += lost
+            self._cond.notify()
+
+    def read(self, timeout=None):
+        """取出全部未读数据；超时或已关闭且无数据时返回 b""。"""
+        with self._cond:
+            if self._head == self._tail and not self._closed:
+                self._cond.wait(timeout)
+            n = self._head - self._tail
+            if not n:
+                return b""
+            i = self._tail % self.size
+            first = min(n, self.size - i)
+            data = bytes(self._view[i:i + first]) + bytes(self._view[:n - first])
+            self._tail += n
+            return data
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def diff_line(expected, got):
+    """逐字符比对一行：返回 Mismatch 列表，pos 为期望文本中的位置。"""
+    if expected == got:
+        return []
+    out = []
+    ops = SequenceMatcher(None, expected, got, autojunk=False).get_opcodes()
+    for op, i1, i2, j1, j2 in ops:
+        if op == "equal":
+            continue
+        if op == "delete":
+            out += [Mismatch(i, "missing", expected[i], "") for i in range(i1, i2)]
+        elif op == "insert":
+            out += [Mismatch(i1, "extra", "", got[j]) for j in range(j1, j2)]
+        else:
+            for k in range(max(i2 - i1, j2 - j1)):
+                e = expected[i1 + k] if i1 + k < i2 else ""
+                g = got[j1 + k] if j1 + k < j2 else ""
+                op_ = "replace" if e and g else "missing" if e else "extra"
+                out.append(Mismatch(min(i1 + k, i2), op_, e, g))
+    return out
+
+
+class EchoCapture:
+    """
+    回显捕获与校验。ser 为捕获用的串口（None 时由外部调用 feed 喂入数据），
+    layout 用于把扫描码事件还原为期望字符，ignore(line) 返回 True 的行不计为回显。
+    """
+
+    def __init__(self, ser=None, layout=None, size=1 << 16, encoding="utf-8",
+                 ignore=None, on_result=None):
+        self.ser = ser
+        self.ring = RingBuffer(size)
+        self.ignore = ignore
+        self.on_result = on_result
+        self.results = []
+        self.unexpected = []    # 没有对应期望行的回显
+        self.ignored = 0
+        self._decoder = get_layout(layout).decoder()
+        self._text = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._expected = deque()
+        self._partial_expected = ""
+        self._received = deque()
+        self._partial = []
+        self._cr = False
+        self._lock = threading.Condition()
+        self._running = True
+        self._owns_ser = False
+        self._detach = None     # attach 时用于解除 on_data 挂接 / 停止读取线程
+        self._threads = [threading.Thread(target=self._verify_loop, daemon=True)]
+        if ser is not None:
+            self._threads.append(threading.Thread(target=self._read_loop, daemon=True))
+        for t in self._threads:
+            t.start()
+
+    @classmethod
+    def open(cls, port, baudrate=115200, **kwargs):
+        """在单独的捕获串口上捕获。"""
+        import serial
+        capture = cls(serial.Serial(port, baudrate, timeout=0.05), **kwargs)
+        capture._owns_ser = True
+        return capture
+
+    @classmethod
+    def attach(cls, ctrl, **kwargs):
+        """
+        在控制器自身的链路上捕获：经 km_reader 取得原始字节，过滤固件回复行。
+        控制器没有 reader 时新建一个，close() 时停止并从控制器上移除。
+        """
+        reader = getattr(ctrl, "reader", None)
+        owned = reader is None
+        if owned:
+            from km_reader import attach
+            reader = attach(ctrl)
+        kwargs.setdefault("ignore", FIRMWARE_LINE.match)
+        capture = cls(**kwargs)
+        previous = reader.on_data
+        if previous is None:
+            reader.on_data = capture.feed
+        else:
+            def on_data(data):
+                previous(data)
+                capture.feed(data)
+            reader.on_data = on_data
+
+        def detach():
+            reader.on_data = previous
+            if owned:
+                reader.stop()
+                if ctrl.reader is reader:
+                    ctrl.reader = None
+        capture._detach = detach
+        return capture
+
+    # —————— 输入 ——————
+    def feed(self, data):
+        """写入捕获到的原始字节（读取线程 / 回调中调用，只做拷贝）。"""
+        self.ring.write(data)
+
+    def expect(self, text):
+        """追加期望在主机上出现的文本；"\\n" 为行结束。应在发送对应按键之前调用。"""
+        with self._lock:
+            lines = (self._partial_expected + text).split("\n")
+            self._partial_expected = lines.pop()
+            self._expected.extend(lines)
+            self._match()
+
+    def expect_events(self, events):
+        """按发出的扫描码事件追加期望文本。"""
+        feed = self._decoder.feed
+        self.expect("".join([feed(ev) for ev in events]))
+
+    # —————— 读取与校验 ——————
+    def _read_loop(self):
+        ser, write = self.ser, self.ring.write
+        while self._running:
+            try:
+                data = ser.read(ser.in_waiting or 1)
+            except Exception:
+                if not self._running:
+                    return
+                time.sleep(0.05)
+                continue
+            if data:
+                write(data)
+
+    def _verify_loop(self):
+        while True:
+            data = self.ring.read(timeout=0.1)
+            if not data:
+                if not self._running:
+                    return
+                continue
+            self._split(self._text.decode(data))
+
+    def _split(self, text):
+        lines = []
+        partial, cr = self._partial, self._cr
+        for ch in text:
+            if ch == "\n" and cr:
+                cr = False
+                continue
+            cr = ch == "\r"
+            if cr or ch == "\n":
+                lines.append("".join(partial))
+                partial.clear()
+            else:
+                partial.append(ch)
+        self._cr = cr
+        if lines:
+            with self._lock:
+                for line in lines:
+                    if self.ignore is not None and self.ignore(line):
+                        self.ignored += 1
+                    else:
+                        self._received.append(line)
+                self._match()
+
+    def _match(self):
+        """持锁调用：比对已完整收到的行。"""
+        while self._expected and self._received:
+            self._record(self._expected.popleft(), self._received.popleft())
+        self._lock.notify_all()
+
+    def _record(self, expected, got):
+        result = LineResult(len(self.results), expected, got,
+                            diff_line(expected, got) if got is not None
+                            else [Mismatch(i, "missing", c, "") for i, c in enumerate(expected)])
+        self.results.append(result)
+        if self.on_result is not None:
+            self.on_result(result)
+
+    # —————— 控制 ——————
+    def wait(self, timeout=None):
+        """等待全部期望行的回显都已比对；超时返回 False。"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._lock:
+            while self._expected:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def close(self, timeout=1.0):
+        """停止捕获；未收到回显的期望行记为整行缺失，未结束的末行照常比对。"""
+        self._running = False
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+        self.ring.close()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        if self._owns_ser:
+            self.ser.close()
+        # 解码器中可能还留着不完整的多字节序列，结束时按 replace 输出
+        self._split(self._text.decode(b"", final=True))
+        with self._lock:
+            if self._partial:
+                self._received.append("".join(self._partial))
+                self._partial.clear()
+            if self._partial_expected:
+                self._expected.append(self._partial_expected)
+                self._partial_expected = ""
+            self._match()
+            while self._expected:
+                self._record(self._expected.popleft(), None)
+            self.unexpected.extend(self._received)
+            self._received.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        """行数、通过 / 失败行数、字符数与逐字符错误数。"""
+        with self._lock:
+            results = list(self.results)
+            unexpected = len(self.unexpected)
+        return {
+            "lines": len(results),
+            "passed": sum(1 for r in results if not r.mismatches),
+            "failed": sum(1 for r in results if r.mismatches),
+            "chars": sum(len(r.expected) for r in results),
+            "char_errors": sum(len(r.mismatches) for r in results),
+            "unexpected_lines": unexpected,
+            "ignored_lines": self.ignored,
+            "overrun_bytes": self.ring.overrun,
+        }
+
+    def report(self):
+        """可读的校验报告：汇总一行，之后每个失败行列出逐字符差异。"""
+        st = self.stats()
+        out = [f"[capture] {st['passed']}/{st['lines']} 行一致，"
+               f"{st['char_errors']} 个字符错误（共 {st['chars']} 个字符）"]
+        for r in self.results:
+            if not r.mismatches:
+                continue
+            got = "<无回显>" if r.got is None else repr(r.got)
+            out.append(f"  第 {r.index + 1} 行 期望 {r.expected!r} 实际 {got}")
+            for m in r.mismatches:
+                out.append(f"    位置 {m.pos}: {m.op} 期望 {m.expected!r} 实际 {m.got!r}")
+        for line in self.unexpected:
+            out.append(f"  多余的回显行 {line!r}")
+        if st["overrun_bytes"]:
+            out.append(f"  环形缓冲区溢出，丢失 {st['overrun_bytes']} 字节")
+        return "\n".join(out)
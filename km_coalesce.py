@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_coalesce.py
+
+高层 API 与 _send 之间的合并层：去掉无效包、合并可合并的包。
+
+规则：
+  - 鼠标：window 秒内按键状态相同、无滚轮的连续相对位移累加为一个包，
+    累加结果不超过位移上限（PS/2 255，USB 127）；USB ABS 模式下同按键的
+    连续绝对定位只保留最后一个；
+  - 按键状态：相对模式下位移为 0、无滚轮且按键与上一次发出的相同的报告
+    是空操作，丢弃；
+  - 模式切换：与当前已知模式相同的模式 / 控制命令（如每次 text 前的
+    set_mode_key()）丢弃。#0xZ26@CMD 使已知模式失效，reboot 清空全部状态。
+  其余命令与键盘数据原样透传，并先发出待合并的鼠标包，保证顺序不变。
+
+待合并的鼠标包最多保留 window 秒，到期由后台线程发出。
+
+用法示例：
+  with Coalescer(api, window=0.005) as co:
+      for _ in range(5):
+          api.send_mouse(0, -10, left=True)   # 合并为一个 0,-50,1,0,0
+      api.send_mouse(0, 0)
+      api.send_mouse(0, 0)                    # 重复的释放，丢弃
+  print(co.stats())
+"""
+
+import threading
+import time
+
+from add07 import PS2Controller
+from km_trajectory import PS2_LIMIT, USB_LIMIT
+
+# 模式 / 控制命令 -> 所属状态组；同组内与当前值相同的命令是冗余的
+MODE_GROUPS = {
+    "#0xA1@USBcmd":   "usb_mode",
+    "#0xA2@USBcmd":   "usb_mode",
+    "#0xB2@USBcmd":   "usb_mode",
+    "#0xC3@USBcmd01": "usb_control",
+    "#0xC3@USBcmd10": "usb_control",
+    "#0xY25@DEG0":    "debug",
+    "#0xY25@DEG1":    "debug",
+    "#0xC3@PS2cmd10": "ps2_sim",
+    "#0xC3@PS2cmd01": "ps2_sim",
+    "#0xA1@PS2cmd":   "ps2_mode",
+    "#0xB2@PS2cmd":   "ps2_mode",
+}
+CMD_IDLE = "#0xZ26@CMD"
+CMD_REBOOT = "#0xZ26@RET"
+CMD_ABS_MODE = "#0xA2@USBcmd"
+
+
+def _parse_mouse(payload):
+    """dx,dy,l,r,m[,w] -> (dx, dy, (l,r,m), wheel 或 None)；不是鼠标数据返回 None。"""
+    parts = payload.split(",")
+    if len(parts) not in (5, 6):
+        return None
+    try:
+        v = [int(p) for p in parts]
+    except ValueError:
+        return None
+    return v[0], v[1], (v[2], v[3], v[4]), v[5] if len(v) == 6 else None
+
+
+class Coalescer:
+    """
+    挂在 ctrl._send 上的合并器。window 为鼠标包最长保留时间（秒），
+    limit 为相对位移上限（默认按控制器类型取 PS/2 或 USB 上限）。
+    """
+
+    def __init__(self, ctrl, window=0.005, limit=None):
+        self.ctrl = ctrl
+        self.window = window
+        self.limit = limit or (PS2_LIMIT if isinstance(ctrl, PS2Controller) else USB_LIMIT)
+        self.received = self.sent = 0
+        self.merged = self.dropped_buttons = self.dropped_modes = 0
+        self._pending = None    # [dx, dy, flags, has_wheel, deadline]
+        self._buttons = None    # 最近一次发出的按键状态
+        self._modes = {}
+        self._lock = threading.Condition()
+        self._running = True
+        self._orig = ctrl._send
+        self._orig_bulk = getattr(ctrl, "_write_bulk", None)
+        ctrl._send = self._send
+        if self._orig_bulk is not None:
+            ctrl._write_bulk = self._write_bulk
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    # —————— 入口 ——————
+    def _send(self, cmd=None, param=None, kind=None):
+        with self._lock:
+            self.received += 1
+            if cmd and param:
+                self._flush()
+                self._forward(cmd, param)
+                return
+            payload = cmd or param
+            if not payload:
+                self.received -= 1
+                return
+            if payload[0] == "#":
+                self._command(payload)
+                return
+            mouse = _parse_mouse(payload) if kind == "mouse" else None
+            if mouse is None:
+                self._flush()
+                self._forward(payload, kind=kind)
+            else:
+                self._mouse(*mouse)
+
+    def _write_bulk(self, *args, **kwargs):
+        """
+        批量写之前先发出待合并的包，保持顺序。批量报告不经过 _send，
+        写出后按键状态未知，清空 _buttons 以免丢掉随后的松开包。
+        """
+        with self._lock:
+            self._flush()
+            try:
+                return self._orig_bulk(*args, **kwargs)
+            finally:
+                self._buttons = None
+
+    # —————— 规则 ——————
+    def _command(self, cmd):
+        group = MODE_GROUPS.get(cmd)
+        if group is not None and self._modes.get(group) == cmd:
+            self.dropped_modes += 1
+            return
+        self._flush()
+        self._forward(cmd)
+        if group is not None:
+            self._modes[group] = cmd
+        elif cmd == CMD_IDLE:
+            self._modes.pop("usb_mode", None)
+            self._modes.pop("ps2_mode", None)
+        elif cmd == CMD_REBOOT:
+            self._modes.clear()
+            self._buttons = None
+
+    def _mouse(self, dx, dy, flags, wheel):
+        has_wheel = wheel is not None
+        absolute = self._modes.get("usb_mode") == CMD_ABS_MODE
+        p = self._pending
+        if not wheel and p is not None and p[2] == flags and time.perf_counter() < p[4]:
+            if absolute:
+                p[0], p[1] = dx, dy             # 新的绝对位置取代旧的
+                self.merged += 1
+                return
+            if abs(p[0] + dx) <= self.limit and abs(p[1] + dy) <= self.limit:
+                p[0] += dx
+                p[1] += dy
+                self.merged += 1
+                return
+        self._flush()
+        if not absolute and not dx and not dy and not wheel and flags == self._buttons:
+            self.dropped_buttons += 1
+            return
+        if wheel or not self.window:
+            self._emit(dx, dy, flags, wheel)
+            return
+        self._pending = [dx, dy, flags, has_wheel, time.perf_counter() + self.window]
+        self._lock.notify()
+
+    # —————— 输出 ——————
+    def _emit(self, dx, dy, flags, wheel):
+        text = f"{dx},{dy},{flags[0]},{flags[1]},{flags[2]}"
+        self._forward(text if wheel is None else f"{text},{wheel}", kind="mouse")
+        self._buttons = flags
+
+    def _flush(self):
+        p, self._pending = self._pending, None
+        if p is not None:
+            self._emit(p[0], p[1], p[2], 0 if p[3] else None)
+
+    def _forward(self, *args, kind=None):
+        self.sent += 1
+        self._orig(*args, kind=kind)
+
+    def _flush_loop(self):
+        with self._lock:
+            while self._running:
+                p = self._pending
+                if p is None:
+                    self._lock.wait()
+                    continue
+                delay = p[4] - time.perf_counter()
+                if delay > 0:
+                    self._lock.wait(delay)
+                else:
+                    self._flush()
+
+    # —————— 控制 ——————
+    def flush(self):
+        """立即发出待合并的包。"""
+        with self._lock:
+            self._flush()
+
+    def stats(self):
+        """收到的包数、实际发出的包数与各规则节省的包数。"""
+        with self._lock:
+            return {
+                "received": self.received,
+                "sent": self.sent,
+                "saved": self.merged + self.dropped_buttons + self.dropped_modes,
+                "merged": self.merged,
+                "dropped_buttons": self.dropped_buttons,
+                "dropped_modes": self.dropped_modes,
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """发出剩余的包，停止后台线程并恢复 ctrl._send。"""
+        with self._lock:
+            self._flush()
+            self._running = False
+            self._lock.notify()
+        self._thread.join(timeout=1)
+        if self.ctrl.__dict__.get("_send") == self._send:
+            del self.ctrl._send
+        if self.ctrl.__dict__.get("_write_bulk") == self._write_bulk:
+            del self.ctrl._write_bulk
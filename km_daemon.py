@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_daemon.py
+
+add07.py daemon / --connect 的实现：常驻进程独占串口，
+多个客户端经 Unix socket 或 localhost TCP 共享同一条链路。
+
+仅在使用 daemon 或 --connect 时由 add07.main() 导入，
+普通单次调用无需加载 socket / socketserver / threading。
+"""
+
+import os
+import queue
+import shlex
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from add07 import (DEFAULT_DAEMON_ADDR, CompositeKMController, PS2Controller,
+                   build_parser, run_ps2, run_usb)
+from km_batch import LineParser
+from km_reader import attach
+
+QUERY_TIMEOUT = 1.0     # 等待 status / fwinfo 回复的秒数，与 CLI 相同
+
+
+def _parse_addr(addr):
+    """解析 daemon 地址：unix:/path、tcp:host:port 或 host:port。"""
+    if addr.startswith("unix:"):
+        return socket.AF_UNIX, addr[5:]
+    if addr.startswith("tcp:"):
+        addr = addr[4:]
+    host, _, port = addr.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class _KMRequestHandler(socketserver.StreamRequestHandler):
+    """
+    每个客户端连接一个线程：逐行读取命令，回复 OK、OK <MCU 回复>（status / fwinfo）
+    或 ERR <原因>。
+    """
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode(errors="ignore").strip()
+            if not line:
+                continue
+            reply = self.server.km_daemon.submit_line(line)
+            self.wfile.write((reply + "\n").encode())
+
+
+if hasattr(socketserver, "UnixStreamServer"):   # Windows 下无 AF_UNIX 服务端
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class KMDaemon:
+    """
+    常驻进程：独占一个串口，USB 与 PS/2 控制器共用同一 serial 对象。
+
+    多个客户端的命令行经各自连接线程解析后进入同一个有序写队列，
+    由唯一的写线程依次执行，保证串口上的命令不会交错。
+    km_reader 读取线程收取 MCU 回复，查询结果随 OK 一起返回给发起查询的客户端。
+    命令语法与 CLI 相同（去掉 -p），例如：
+      ps2 move 5 5 --right
+      usb text "Hello World"
+    """
+
+    def __init__(self, port=None, baudrate=None, ser=None):
+        self.ps2 = PS2Controller(port=port, baudrate=baudrate, ser=ser)
+        self.km = CompositeKMController(ser=self.ps2.ser)
+        self.reader = attach(self.km)
+        self.parser = build_parser(LineParser)
+        self.queue = queue.Queue()
+        self.server = None
+        self.commands = 0
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            args, fut = item
+            try:
+                if args.interface == "usb":
+                    result = run_usb(self.km, args)
+                else:
+                    result = run_ps2(self.ps2, args)
+                self.commands += 1
+                # 查询的回复由调用方线程等待，写线程不因此阻塞
+                fut.set_result(result if isinstance(result, Future) else "OK")
+            except Exception as e:
+                fut.set_result(f"ERR {e}")
+
+    def submit_line(self, line):
+        """解析一行命令并排入写队列，阻塞直到执行完成，返回回复文本。"""
+        try:
+            args = self.parser.parse_args(shlex.split(line))
+        except ValueError as e:
+            return f"ERR {e}"
+        if args.interface not in ("usb", "ps2"):
+            return f"ERR 不支持的接口: {args.interface}"
+        if "batch" in (getattr(args, "cmd", None), getattr(args, "action", None)):
+            return "ERR daemon 不支持 batch"
+        fut = Future()
+        self.queue.put((args, fut))
+        reply = fut.result()
+        if not isinstance(reply, Future):
+            return reply
+        try:
+            return f"OK {reply.result(timeout=QUERY_TIMEOUT).raw}"
+        except FutureTimeout:
+            return "OK"
+
+    def serve(self, addr):
+        """在 addr 上监听（阻塞），直到 shutdown() 被调用。"""
+        family, target = _parse_addr(addr)
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.unlink(target)
+            self.server = _UnixServer(target, _KMRequestHandler)
+        else:
+            self.server = _TCPServer(target, _KMRequestHandler)
+        self.server.km_daemon = self
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.unlink(target)
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+        self.queue.put(None)
+        self._writer.join()
+        self.reader.stop()
+        self.ps2.close()
+
+
+class KMClient:
+    """
+    daemon 的轻量客户端：send("ps2 move 1 0") 返回 "OK" 或 "ERR ..."；
+    send("usb status") 收到回复时返回 "OK <回复>"。
+    """
+
+    def __init__(self, addr=None):
+        family, target = _parse_addr(addr or DEFAULT_DAEMON_ADDR)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(target)
+        self.rfile = self.sock.makefile("rb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, line):
+        self.sock.sendall((line.strip() + "\n").encode())
+        return self.rfile.readline().decode(errors="ignore").strip()
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
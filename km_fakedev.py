@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_fakedev.py
+
+无需硬件的模拟 KM 设备，供基准测试与 CI 使用。
+
+设备在 pty（POSIX）或本地 TCP socket 上监听，PS2Controller /
+CompositeKMController 直接以 port=dev.port 打开：
+  pty     dev.port 为从端设备路径，如 /dev/pts/5
+  socket  dev.port 为 pyserial URL，如 socket://127.0.0.1:40123
+
+设备解析 #0x..@PS2cmd / #0x..@USBcmd 等命令与 dx,dy,l,r,m[,w] 鼠标数据，
+按 UART 波特率（10 bit/字节）与固件处理延迟建模每个包的完成时间，
+记录收到的内容，并对 status / fwinfo 查询回复一行文本。
+echo=True 时设备不解析数据，把收到的字节原样回写（send_to_sender.py 的
+回环基准）。binary=True（默认）时支持 km_binary 的二进制帧协商，协商后解码二进制
+鼠标 / 键盘帧；binary=False 模拟不认识该命令的旧固件。
+throttle=True 时设备按模型速度读取，主机侧会真实感受到背压。
+host_echo 为布局名（如 "us"）时模拟被测主机的回显：PS/2 键盘模式下把收到的
+按键按 km_layout 还原为字符写回（换行为 \r\n），供 km_capture 校验。
+socket 模式下可注入链路故障（供 km_resilient 测试）：disconnect(down) 断开当前
+连接并在 down 秒内拒绝重连；drop_on_reboot 不为 None 时 reboot 命令同样断开
+链路，down 为该值。URL 不变，主机按原 port 重新打开即可。
+
+用法示例：
+  with FakeKMDevice(baudrate=115200, latency=0.0002) as dev:
+      api = PS2Controller(port=dev.port)
+      api.send_mouse(10, 0)
+      dev.wait_idle()
+      print(dev.stats())
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import Counter, namedtuple
+
+from km_binary import CMD_BINARY_OFF, CMD_BINARY_ON, SYNC, frame_payload, split_frame
+from km_scenario import KIND_CMD, KIND_KEY, KIND_MOUSE, classify
+
+Packet = namedtuple("Packet", "t_arrival t_done kind payload")
+
+# 命令 -> 设备状态变化
+_COMMANDS = {
+    "#0xA1@USBcmd":   ("usb_mode", "REL"),
+    "#0xA2@USBcmd":   ("usb_mode", "ABS"),
+    "#0xB2@USBcmd":   ("usb_mode", "KEY"),
+    "#0xC3@USBcmd01": ("control", "LOCAL"),
+    "#0xC3@USBcmd10": ("control", "REMOTE"),
+    "#0xZ26@CMD":     ("usb_mode", "IDLE"),
+    "#0xY25@DEG0":    ("debug", False),
+    "#0xY25@DEG1":    ("debug", True),
+    "#0xC3@PS2cmd10": ("sim", True),
+    "#0xC3@PS2cmd01": ("sim", False),
+    "#0xA1@PS2cmd":   ("ps2_mode", "MOUSE"),
+    "#0xB2@PS2cmd":   ("ps2_mode", "KEY"),
+}
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class FakeKMDevice:
+    """模拟 CH340 + MCU 的 KM 设备。"""
+
+    FW_INFO = "FW:FAKE-KM 1.0"
+    READ_SIZE = 64
+
+    def __init__(self, transport="pty", baudrate=115200, latency=0.0,
+                 throttle=False, ack=None, keep=True, binary=True, echo=False,
+                 host_echo=None, drop_on_reboot=None):
+        self.transport = transport
+        self.baudrate = baudrate
+        self.latency = latency
+        self.throttle = throttle
+        self.ack = ack
+        self.keep = keep
+        self.binary = binary
+        self.echo = echo
+        self.drop_on_reboot = drop_on_reboot
+        self.disconnects = 0
+        self.host_echo = None
+        if host_echo is not None:
+            from km_layout import get_layout
+            self.host_echo = get_layout(host_echo).decoder()
+        self.packets = []
+        self.counts = Counter()
+        self.state = {"usb_mode": "IDLE", "control": "LOCAL", "debug": False,
+                      "sim": False, "ps2_mode": None, "resolution": None,
+                      "binary": False}
+        self.bytes = 0
+        self.errors = 0
+        self._rx_free = 0.0     # UART 空闲时刻
+        self._cpu_free = 0.0    # 固件空闲时刻
+        self._first = None
+        self._last_done = 0.0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._fd = None
+        self._slave = None
+        self._listener = None
+        self._conn = None
+        self.port = None
+
+    # —————— 生命周期 ——————
+    def start(self):
+        if self.transport == "pty":
+            import tty
+            self._fd, self._slave = os.openpty()
+            tty.setraw(self._slave)
+            self.port = os.ttyname(self._slave)
+        elif self.transport == "socket":
+            host, port = self._listen(("127.0.0.1", 0))
+            self.port = f"socket://{host}:{port}"
+        else:
+            raise ValueError(f"未知 transport: {self.transport}")
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for close in (self._close_conn, self._close_listener):
+            close()
+        if self._fd is not None:
+            os.close(self._fd)
+            os.close(self._slave)
+            self._fd = self._slave = None
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _listen(self, addr):
+        self._listener = socket.socket()
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(addr)
+        self._listener.listen(1)
+        return self._listener.getsockname()
+
+    def _close_conn(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)     # 唤醒阻塞在 recv 上的 _pump
+            except OSError:
+                pass
+            conn.close()
+
+    def _close_listener(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                listener.shutdown(socket.SHUT_RDWR)  # 唤醒阻塞在 accept 上的 _serve
+            except OSError:
+                pass
+            listener.close()
+
+    def disconnect(self, down=0.0):
+        """
+        模拟链路断开（如 CH340 重新枚举）：关闭当前连接，设备状态复位，
+        down 秒内拒绝新的连接。仅 socket transport。
+        """
+        if self.transport != "socket":
+            raise ValueError("disconnect 仅支持 socket transport")
+        self.disconnects += 1
+        self.state.update(usb_mode="IDLE", sim=False, ps2_mode=None, binary=False)
+        if down <= 0:
+            self._close_conn()
+            return
+        addr = self._listener.getsockname()
+        self._close_listener()
+        self._close_conn()
+
+        def relisten():
+            time.sleep(down)
+            self._thread.join(timeout=1)
+            if not self._running:
+                return
+            self._listen(addr)
+            self._thread = threading.Thread(target=self._serve, daemon=True)
+            self._thread.start()
+        threading.Thread(target=relisten, daemon=True).start()
+
+    # —————— I/O ——————
+    def _serve(self):
+        if self.transport == "pty":
+            self._pump(lambda n: os.read(self._fd, n),
+                       lambda b: os.write(self._fd, b))
+            return
+        listener = self._listener
+        while self._running:
+            try:
+                self._conn, _ = listener.accept()
+            except OSError:
+                return
+            self._pump(self._conn.recv, self._conn.sendall)
+            self._close_conn()
+
+    def _pump(self, read, write):
+        self._write = write
+        buf = bytearray()
+        while self._running:
+            try:
+                data = read(self.READ_SIZE)
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.perf_counter()
+            self.on_bytes(data, now)
+            if self.echo:
+                self._rx_free = max(now, self._rx_free) + len(data) * 10 / self.baudrate
+            else:
+                buf += data
+            while buf:
+                if buf[0] == SYNC and self.state["binary"]:
+                    frame, used = split_frame(buf)
+                    if not used:
+                        break
+                    del buf[:used]
+                    if frame is None:
+                        self.errors += 1
+                    else:
+                        self._handle(frame, now, frame_payload(frame))
+                    continue
+                i = buf.find(b"\n")
+                if i < 0:
+                    break
+                line = bytes(buf[:i + 1])
+                del buf[:i + 1]
+                self._handle(line, now)
+            if self.throttle:
+                delay = self._rx_free - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def on_bytes(self, data, now):
+        """收到原始字节时调用；子类可覆盖。echo 模式下原样回写。"""
+        self.bytes += len(data)
+        if self.echo:
+            try:
+                self._write(data)
+            except OSError:
+                pass
+
+    def reply(self, text):
+        try:
+            self._write(text.encode() + b"\r\n")
+        except OSError:
+            pass
+
+    def type_back(self, text):
+        """被测主机回显 text；子类可覆盖以模拟丢字、错字。"""
+        if text:
+            try:
+                self._write(text.replace("\n", "\r\n").encode())
+            except OSError:
+                pass
+
+    # —————— 解析与建模 ——————
+    def _handle(self, raw, now, payload=None):
+        if self._first is None:
+            self._first = now
+        wire = self._rx_free = max(now, self._rx_free) + len(raw) * 10 / self.baudrate
+        done = self._cpu_free = max(wire, self._cpu_free) + self.latency
+        if payload is None:
+            payload = raw.rstrip(b"\r\n").decode(errors="replace")
+        kind = classify(payload)
+        with self._lock:
+            self.counts[kind] += 1
+            self._last_done = done
+            if self.keep:
+                self.packets.append(Packet(now, done, kind, payload))
+        if kind == KIND_CMD:
+            self._command(payload)
+        elif kind == KIND_MOUSE and len(payload.split(",")) not in (5, 6):
+            self.errors += 1
+        elif kind == KIND_KEY and self.host_echo and self.state["ps2_mode"] == "KEY":
+            self.type_back(self.host_echo.feed(payload))
+        if self.ack:
+            self.reply(self.ack)
+
+    def _command(self, payload):
+        cmd, _, param = payload.partition(":")
+        if cmd in _COMMANDS:
+            key, value = _COMMANDS[cmd]
+            self.state[key] = value
+        elif cmd == "#0xD5@USBcmd":
+            self.state["resolution"] = param
+        elif cmd == "#0xX24@GET":
+            self.reply(f"STATUS:{self.state['usb_mode']},{self.state['control']}")
+        elif cmd == "#0xW23@FH":
+            self.reply(self.FW_INFO)
+        elif cmd in (CMD_BINARY_ON, CMD_BINARY_OFF) and self.binary:
+            self.state["binary"] = cmd == CMD_BINARY_ON
+            self.reply(f"BIN:{int(self.state['binary'])}")
+        elif cmd == "#0xZ26@RET":
+            self.state.update(usb_mode="IDLE", sim=False, ps2_mode=None,
+                              binary=False)
+            if self.drop_on_reboot is not None and self.transport == "socket":
+                self.disconnect(self.drop_on_reboot)
+        else:
+            self.errors += 1
+
+    # —————— 统计 ——————
+    def wait_idle(self, quiet=0.05, timeout=5.0):
+        """等待 quiet 秒内不再收到新数据（用于发送结束后统计）。"""
+        deadline = time.perf_counter() + timeout
+        last = -1
+        while time.perf_counter() < deadline:
+            if self.bytes == last:
+                return True
+            last = self.bytes
+            time.sleep(quiet)
+        return False
+
+    def stats(self):
+        """建模结果：包数、字节、设备侧 events/s 与处理延迟分位数（秒）。"""
+        with self._lock:
+            packets = list(self.packets)
+            n = sum(self.counts.values())
+            span = (self._last_done - self._first) if self._first else 0.0
+        lat = [p.t_done - p.t_arrival for p in packets]
+        return {
+            "packets": n,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "by_kind": dict(self.counts),
+            "span_s": span,
+            "events_per_s": n / span if span > 0 else 0.0,
+            "latency_p50_s": _percentile(lat, 50),
+            "latency_p99_s": _percentile(lat, 99),
+        }
+
+    def reset(self):
+        with self._lock:
+            self.packets.clear()
+            self.counts.clear()
+            self.bytes = self.errors = 0
+            self._first = None
+            self._rx_free = self._cpu_free = self._last_done = 0.0
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_keycompiler.py
+
+把文本一次性编译为 PS/2 键盘事件序列，直接交给 PS2Controller.send_keys。
+
+与逐字符查表相比：
+  - 连续的大写 / 上档字符共用一次 Shift 按下与释放，
+    "HELLO" 由 15 个事件减为 7 个（12,0  33 24 4B 4B 44  12,1）；
+    AltGr 字符（如 DE 布局的 @ { }）同理；
+  - 编译结果按文本做 LRU 缓存，重复字符串不再重新计算；
+  - 编译前先检查整段文本，未映射字符一次性报告，不会发送到一半才出错。
+
+字符表默认取自 km_layout 的布局（layout="us" / "uk" / "de"）；
+仍可传入旧式 scan_codes 字典（字符 -> 扫描码，上档字符由 shifted 给出）。
+
+事件格式：
+  "<code>"     敲击（按下并释放）
+  "<code>,0"   按下（make）
+  "<code>,1"   释放（break）
+"""
+
+from collections import OrderedDict
+
+from km_layout import KEYS, UnmappedCharError, get_layout
+
+SHIFT = KEYS["LSHIFT"].code
+SHIFTED_CHARS = frozenset('~!@#$%^&*()_+{}|:"<>?')
+
+# US 布局的字符 -> 扫描码（大写字母与上档符号共用小写 / 下档键位）
+SCAN_CODES_US = {ch: codes[0] for ch, (codes, _) in get_layout("us").strokes.items()
+                 if not ch.isupper()}
+
+
+class KeyCompiler:
+    """
+    文本 -> PS/2 事件序列编译器。
+
+    strict=True  遇到未映射字符抛出 UnmappedCharError；
+    strict=False 跳过未映射字符（记录在 self.last_missing）。
+    """
+
+    def __init__(self, scan_codes=None, shifted=SHIFTED_CHARS,
+                 cache_size=1024, strict=True, layout=None):
+        self.cache_size = cache_size
+        self.strict = strict
+        self.last_missing = []
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if scan_codes is None:
+            # 布局表已按字符给出 (敲击的扫描码, 需按住的修饰键)
+            self.layout = get_layout(layout)
+            self._table = self.layout.strokes
+            return
+        self.layout = None
+        self._table = {}
+        for ch, code in scan_codes.items():
+            self._table[ch] = ((code,), (SHIFT,) if ch in shifted else ())
+            up = ch.upper()
+            if up != ch and up not in scan_codes:
+                self._table[up] = ((code,), (SHIFT,))
+
+    def missing(self, text):
+        """返回 text 中没有映射的字符（去重，保持出现顺序）。"""
+        table = self._table
+        return list(dict.fromkeys(c for c in text if c not in table))
+
+    def compile(self, text):
+        """返回事件元组；结果按 text 缓存。"""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            self.last_missing = []
+            return cached
+        self.misses += 1
+
+        missing = self.missing(text)
+        if missing and self.strict:
+            raise UnmappedCharError(missing)
+        self.last_missing = missing
+
+        table = self._table
+        events = []
+        held = ()
+        for ch in text:
+            entry = table.get(ch)
+            if entry is None:
+                continue
+            codes, mods = entry
+            if mods != held:
+                events += [f"{m},1" for m in reversed(held) if m not in mods]
+                events += [f"{m},0" for m in mods if m not in held]
+                held = mods
+            events += codes
+        events += [f"{m},1" for m in reversed(held)]
+
+        events = tuple(events)
+        if not missing:
+            self._cache[text] = events
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return events
+
+    def send(self, api, text):
+        """编译 text 并逐个事件交给 api.send_keys，返回事件数。"""
+        events = self.compile(text)
+        send_keys = api.send_keys
+        for ev in events:
+            send_keys(ev)
+        return len(events)
+
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_layout.py
+
+PS/2 扫描码 set 2 按键表与键盘布局（US / UK / DE）。
+
+KEYS：按键名 -> Key(name, code, make, brk)
+  code   发给固件的扫描码事件，即 make 序列的十六进制：普通键 "1C"，
+         E0 扩展键 "E075"（方向键、右 Ctrl/Alt、Insert/Delete、小键盘 Enter 等）
+  make   按下时键盘发出的字节，如 b"\\x1c"、b"\\xe0\\x75"
+  brk    释放时的字节，如 b"\\xf0\\x1c"、b"\\xe0\\xf0\\x75"
+  PrintScreen / Pause 为 set 2 的多字节序列，Pause 没有释放码。
+
+Layout：字符 -> (敲击的扫描码, 需按住的修饰键)，以及每个字符完整的
+make/break 字节序列。DE 布局的 ^ ´ ` 为死键，敲击后自动补一个空格。
+反方向由 KeyDecoder 把扫描码事件还原为主机上应出现的字符。
+
+所有表在导入时一次建好（约 1 ms），之后查表均为字典访问。设置环境变量
+KM_LAYOUT_CACHE=<path> 时建好的表以 pickle 存入该文件，下次导入直接加载；
+本模块文件变化后缓存自动失效。
+
+用法示例：
+  us = get_layout("us")
+  us.strokes["A"]              # (("1C",), ("12",))
+  us.encode("Hi")              # 整段文本的 make/break 字节
+  us.combo("CTRL+ALT+DEL")     # ("14,0", "11,0", "E071", "11,1", "14,1")
+  get_layout("de").combo("ALTGR+Q")   # 德语布局的 @
+  us.decode(("12,0", "33", "12,1", "43"))   # "Hi"
+"""
+
+import os
+from collections import namedtuple
+
+Key = namedtuple("Key", "name code make brk")
+
+# 按键名 -> set 2 make 码（E0 扩展键写两个字节）
+_SCAN_SET2 = {
+    "ESC": "76", "F1": "05", "F2": "06", "F3": "04", "F4": "0C", "F5": "03",
+    "F6": "0B", "F7": "83", "F8": "0A", "F9": "01", "F10": "09", "F11": "78",
+    "F12": "07",
+    "GRAVE": "0E", "1": "16", "2": "1E", "3": "26", "4": "25", "5": "2E",
+    "6": "36", "7": "3D", "8": "3E", "9": "46", "0": "45", "MINUS": "4E",
+    "EQUAL": "55", "BACKSPACE": "66",
+    "TAB": "0D", "Q": "15", "W": "1D", "E": "24", "R": "2D", "T": "2C",
+    "Y": "35", "U": "3C", "I": "43", "O": "44", "P": "4D", "LBRACKET": "54",
+    "RBRACKET": "5B", "BACKSLASH": "5D",
+    "CAPSLOCK": "58", "A": "1C", "S": "1B", "D": "23", "F": "2B", "G": "34",
+    "H": "33", "J": "3B", "K": "42", "L": "4B", "SEMICOLON": "4C",
+    "QUOTE": "52", "NONUS_HASH": "5D", "ENTER": "5A",
+    "LSHIFT": "12", "NONUS_BACKSLASH": "61", "Z": "1A", "X": "22", "C": "21",
+    "V": "2A", "B": "32", "N": "31", "M": "3A", "COMMA": "41", "PERIOD": "49",
+    "SLASH": "4A", "RSHIFT": "59",
+    "LCTRL": "14", "LGUI": "E01F", "LALT": "11", "SPACE": "29", "RALT": "E011",
+    "RGUI": "E027", "APPS": "E02F", "RCTRL": "E014",
+    "SCROLLLOCK": "7E",
+    "INSERT": "E070", "HOME": "E06C", "PAGEUP": "E07D", "DELETE": "E071",
+    "END": "E069", "PAGEDOWN": "E07A",
+    "UP": "E075", "LEFT": "E06B", "DOWN": "E072", "RIGHT": "E074",
+    "NUMLOCK": "77", "KP_SLASH": "E04A", "KP_STAR": "7C", "KP_MINUS": "7B",
+    "KP_PLUS": "79", "KP_ENTER": "E05A", "KP_DOT": "71", "KP0": "70",
+    "KP1": "69", "KP2": "72", "KP3": "7A", "KP4": "6B", "KP5": "73",
+    "KP6": "74", "KP7": "6C", "KP8": "75", "KP9": "7D",
+}
+
+# 不遵循 "[E0] code / [E0] F0 code" 规则的按键：(make, break)
+_SPECIAL = {
+    "PRINTSCREEN": (b"\xe0\x12\xe0\x7c", b"\xe0\xf0\x7c\xe0\xf0\x12"),
+    "PAUSE":       (b"\xe1\x14\x77\xe1\xf0\x14\xf0\x77", b""),
+}
+
+ALIASES = {
+    "CTRL": "LCTRL", "SHIFT": "LSHIFT", "ALT": "LALT", "ALTGR": "RALT",
+    "WIN": "LGUI", "GUI": "LGUI", "META": "LGUI", "MENU": "APPS",
+    "ESCAPE": "ESC", "RETURN": "ENTER", "BKSP": "BACKSPACE", "DEL": "DELETE",
+    "INS": "INSERT", "PGUP": "PAGEUP", "PGDN": "PAGEDOWN", "CAPS": "CAPSLOCK",
+    "PRTSC": "PRINTSCREEN", "BREAK": "PAUSE", "SPACEBAR": "SPACE",
+}
+
+# 布局：按键名 -> 该键的字符（下档、上档[, AltGr]）；字母键未列出时
+# 自动补为 (小写, 大写)。所有布局都有空格、回车与 Tab。
+_COMMON = {"SPACE": " ", "ENTER": "\n", "TAB": "\t"}
+
+_US = {
+    "GRAVE": "`~", "1": "1!", "2": "2@", "3": "3#", "4": "4$", "5": "5%",
+    "6": "6^", "7": "7&", "8": "8*", "9": "9(", "0": "0)", "MINUS": "-_",
+    "EQUAL": "=+", "LBRACKET": "[{", "RBRACKET": "]}", "BACKSLASH": "\\|",
+    "SEMICOLON": ";:", "QUOTE": "'\"", "COMMA": ",<", "PERIOD": ".>",
+    "SLASH": "/?",
+}
+
+_UK = dict(_US, **{
+    "GRAVE": "`¬¦", "2": "2\"", "3": "3£", "4": "4$€", "QUOTE": "'@",
+    "NONUS_HASH": "#~", "NONUS_BACKSLASH": "\\|",
+})
+del _UK["BACKSLASH"]            # UK 键盘上该位置为 NONUS_HASH
+
+_DE = {
+    "GRAVE": "^°", "1": "1!", "2": "2\"²", "3": "3§³", "4": "4$", "5": "5%",
+    "6": "6&", "7": "7/{", "8": "8([", "9": "9)]", "0": "0=}", "MINUS": "ß?\\",
+    "EQUAL": "´`", "Q": "qQ@", "E": "eE€", "LBRACKET": "üÜ", "RBRACKET": "+*~",
+    "NONUS_HASH": "#'", "SEMICOLON": "öÖ", "QUOTE": "äÄ",
+    "NONUS_BACKSLASH": "<>|", "Y": "zZ", "Z": "yY", "M": "mMµ",
+    "COMMA": ",;", "PERIOD": ".:", "SLASH": "-_",
+}
+
+_SPECS = {
+    "us": (_US, ""),
+    "uk": (_UK, ""),
+    "de": (_DE, "^´`"),
+}
+
+# 决定输入哪个字符的修饰键；按住其余修饰键（Ctrl / Alt / GUI）时不产生字符
+_SHIFTS = frozenset(["12", "59"])
+_ALTGR = "E011"
+_MODIFIERS = frozenset(["12", "59", "14", "E014", "11", "E011", "E01F", "E027"])
+
+VERSION = 2
+
+
+class UnmappedCharError(ValueError):
+    """文本中存在没有扫描码映射的字符。"""
+
+    def __init__(self, chars):
+        self.chars = chars
+        super().__init__("以下字符没有扫描码映射: " + " ".join(repr(c) for c in chars))
+
+
+def _key(name, code):
+    if name in _SPECIAL:
+        make, brk = _SPECIAL[name]
+        return Key(name, make.hex().upper(), make, brk)
+    make = bytes.fromhex(code)
+    return Key(name, code, make, make[:-1] + b"\xf0" + make[-1:])
+
+
+def _build_keys():
+    keys = {name: _key(name, code) for name, code in _SCAN_SET2.items()}
+    for name in _SPECIAL:
+        keys[name] = _key(name, None)
+    for alias, name in ALIASES.items():
+        keys[alias] = keys[name]
+    return keys
+
+
+class Layout:
+    """
+    一个键盘布局的全部查找表：
+      strokes[ch]    (codes, mods)  codes 为依次敲击的扫描码，mods 为需按住的修饰键码
+      sequences[ch]  单独输入 ch 时键盘发出的完整 make/break 字节
+    """
+
+    def __init__(self, name, spec, dead, keys):
+        self.name = name
+        self.keys = keys
+        self.dead = frozenset(dead)
+        shift, altgr = keys["LSHIFT"], keys["RALT"]
+        space = keys["SPACE"]
+        chars = {n: n.lower() + n for n in _SCAN_SET2 if n.isalpha() and len(n) == 1}
+        chars.update(_COMMON)
+        chars.update(spec)
+
+        self.strokes = {}
+        self.sequences = {}
+        for name_, chs in chars.items():
+            key = keys[name_]
+            for level, ch in enumerate(chs):
+                if ch in self.strokes:
+                    continue
+                mods = ((), (shift,), (altgr,))[level]
+                taps = (key, space) if ch in dead else (key,)
+                self.strokes[ch] = (tuple(k.code for k in taps),
+                                    tuple(m.code for m in mods))
+                self.sequences[ch] = (
+                    b"".join(m.make for m in mods)
+                    + b"".join(k.make + k.brk for k in taps)
+                    + b"".join(m.brk for m in reversed(mods)))
+        self.chars = {(codes[0], mods): ch for ch, (codes, mods) in self.strokes.items()}
+        self._combos = {}
+
+    def __repr__(self):
+        return f"<Layout {self.name}: {len(self.strokes)} chars>"
+
+    def key(self, name):
+        """按键名或本布局中的单个字符（按布局找到所在的键）-> Key。"""
+        stroke = self.strokes.get(name) if len(name) == 1 else None
+        if stroke is not None:
+            return self.keys[_BY_CODE[stroke[0][0]]]
+        key = self.keys.get(name.upper())
+        if key is None:
+            raise ValueError(f"未知按键: {name}")
+        return key
+
+    def _combo_keys(self, spec):
+        names = spec.split("+")
+        if "" in names:                     # "CTRL++" 中的 "+" 键
+            names = [n for n in names if n] + ["+"]
+        return [self.key(n) for n in names]
+
+    def missing(self, text):
+        """返回 text 中本布局无法输入的字符（去重，保持出现顺序）。"""
+        strokes = self.strokes
+        return list(dict.fromkeys(c for c in text if c not in strokes))
+
+    def encode(self, text):
+        """text -> 键盘发出的完整 make/break 字节序列。"""
+        missing = self.missing(text)
+        if missing:
+            raise UnmappedCharError(missing)
+        seq = self.sequences
+        return b"".join([seq[c] for c in text])
+
+    def combo(self, spec):
+        """
+        "CTRL+ALT+DEL" -> 扫描码事件元组：依次按下前面的键、敲击最后一个键，
+        再逆序释放。单个键名（如 "F5"、"UP"）即一次敲击。结果按 spec 缓存。
+        """
+        events = self._combos.get(spec)
+        if events is None:
+            *mods, last = self._combo_keys(spec)
+            events = tuple([f"{m.code},0" for m in mods] + [last.code]
+                           + [f"{m.code},1" for m in reversed(mods)])
+            self._combos[spec] = events
+        return events
+
+    def decoder(self):
+        """新建一个逐事件还原字符的 KeyDecoder。"""
+        return KeyDecoder(self)
+
+    def decode(self, events):
+        """扫描码事件序列 -> 主机上应出现的文本（功能键与组合键不产生字符）。"""
+        feed = KeyDecoder(self).feed
+        return "".join([feed(ev) for ev in events])
+
+    def combo_bytes(self, spec):
+        """组合键对应的键盘字节序列。"""
+        *mods, last = self._combo_keys(spec)
+        return (b"".join(m.make for m in mods) + last.make + last.brk
+                + b"".join(m.brk for m in reversed(mods)))
+
+
+class KeyDecoder:
+    """
+    按发送顺序喂入扫描码事件（"1C" / "12,0" / "E075,1"），返回该事件在主机上
+    产生的字符（多数为空串）。跟踪修饰键的按住状态与死键。
+    """
+
+    def __init__(self, layout):
+        self.chars = layout.chars
+        self.dead = layout.dead
+        self.space = layout.keys["SPACE"].code
+        self.held = set()
+        self._dead = False
+
+    def feed(self, event):
+        code, _, action = event.partition(",")
+        if code in _MODIFIERS:
+            if action == "0":
+                self.held.add(code)
+            elif action == "1":
+                self.held.discard(code)
+            return ""
+        if action == "1":
+            return ""
+        held = self.held
+        if held - _SHIFTS - {_ALTGR}:
+            return ""
+        mods = (("12",) if held & _SHIFTS else ()) + ((_ALTGR,) if _ALTGR in held else ())
+        ch = self.chars.get((code, mods), "")
+        if self._dead:
+            self._dead = False
+            if code == self.space:
+                return ""
+        if ch in self.dead:
+            self._dead = True
+        return ch
+
+
+def _build():
+    keys = _build_keys()
+    return keys, {name: Layout(name, spec, dead, keys)
+                  for name, (spec, dead) in _SPECS.items()}
+
+
+def _load():
+    """建表；设置了 KM_LAYOUT_CACHE 时优先从 pickle 缓存加载。"""
+    path = os.environ.get("KM_LAYOUT_CACHE")
+    if not path:
+        return _build()
+    import pickle
+    st = os.stat(__file__)
+    stamp = (VERSION, st.st_mtime_ns, st.st_size)
+    try:
+        with open(path, "rb") as f:
+            cached_stamp, tables = pickle.load(f)
+        if cached_stamp == stamp:
+            return tables
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+        pass
+    tables = _build()
+    try:
+        with open(path, "wb") as f:
+            pickle.dump((stamp, tables), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    return tables
+
+
+KEYS, LAYOUTS = _load()
+_BY_CODE = {k.code: k.name for k in KEYS.values()}
+
+
+def get_layout(layout=None):
+    """布局名（"us" / "uk" / "de"，默认 "us"）或 Layout 实例 -> Layout。"""
+    if isinstance(layout, Layout):
+        return layout
+    try:
+        return LAYOUTS[(layout or "us").lower()]
+    except KeyError:
+        raise ValueError(f"未知键盘布局: {layout}（可选 {', '.join(LAYOUTS)}）") from None
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_metrics.py
+
+发送路径的延迟 / 吞吐统计。
+
+把 SendMetrics 实例赋给控制器的 metrics 属性即开启记录：
+  api = PS2Controller(port="COM25")
+  api.metrics = SendMetrics()
+  ...
+  print(api.metrics.summary())
+  open("km.prom", "w").write(api.metrics.to_prometheus())
+
+每个包记录 (入队时刻, 写完成时刻, 字节数, 类型) 到预分配的环形缓冲区，
+超过容量后覆盖最旧的记录；累计包数、字节数以及延迟直方图的桶计数与
+总和不受容量限制（to_prometheus 输出的计数器单调递增），分位数只按
+环形缓冲区内的记录计算。
+metrics 为 None（默认）时 _send 中只多一次属性判断。
+
+类型：cmd（#0x.. 命令）、mouse（dx,dy,l,r,m[,w] 或二进制鼠标帧）、key（其余）。
+"""
+
+import json
+import time
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+KINDS = ("cmd", "mouse", "key")
+_CMD, _MOUSE, _KEY = range(3)
+QUANTILES = (0.5, 0.9, 0.99)
+# 延迟直方图桶上界（秒）
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _kind(pkt):
+    if pkt[:1] == b"#":
+        return _CMD
+    if pkt[:1] == b"\xa5":                   # km_binary 帧：A5 01 鼠标 / A5 02 键盘
+        return _MOUSE if pkt[1:2] == b"\x01" else _KEY
+    if pkt.count(b",") in (4, 5) and pkt[:1] in b"-0123456789":
+        return _MOUSE
+    return _KEY
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class SendMetrics:
+    """环形缓冲区形式的发送记录。"""
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.t_enqueue = array("d", bytes(8 * capacity))
+        self.t_done = array("d", bytes(8 * capacity))
+        self.nbytes = array("I", bytes(4 * capacity))
+        self.kind = array("B", bytes(capacity))
+        self.index = 0
+        self.total_packets = [0, 0, 0]
+        self.total_bytes = [0, 0, 0]
+        self._reset_buckets()
+        self.started = time.perf_counter()
+
+    def _reset_buckets(self):
+        # 每类型各桶（最后一个为 +Inf）的非累积计数与延迟总和，导出时再累加
+        self.bucket_counts = [[0] * (len(BUCKETS) + 1) for _ in KINDS]
+        self.latency_sum = [0.0, 0.0, 0.0]
+
+    def record(self, t_enqueue, t_done, pkt):
+        i = self.index % self.capacity
+        k = _kind(pkt)
+        n = len(pkt)
+        self.t_enqueue[i] = t_enqueue
+        self.t_done[i] = t_done
+        self.nbytes[i] = n
+        self.kind[i] = k
+        self.index += 1
+        self.total_packets[k] += 1
+        self.total_bytes[k] += n
+        lat = t_done - t_enqueue
+        self.bucket_counts[k][bisect_left(BUCKETS, lat)] += 1
+        self.latency_sum[k] += lat
+
+    def reset(self):
+        self.index = 0
+        self.total_packets = [0, 0, 0]
+        self.total_bytes = [0, 0, 0]
+        self._reset_buckets()
+        self.started = time.perf_counter()
+
+    def _latencies(self):
+        """按类型分组的延迟（秒），仅覆盖环形缓冲区内的记录。"""
+        n = min(self.index, self.capacity)
+        out = ([], [], [])
+        te, td, kd = self.t_enqueue, self.t_done, self.kind
+        for i in range(n):
+            out[kd[i]].append(td[i] - te[i])
+        return out
+
+    def summary(self):
+        """各类型及全部包的 count / bytes / 速率 / 延迟分位数与直方图。"""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        groups = self._latencies()
+        result = {}
+        for k, name in enumerate(KINDS + ("all",)):
+            if name == "all":
+                lat = sorted(groups[0] + groups[1] + groups[2])
+                packets, nbytes = sum(self.total_packets), sum(self.total_bytes)
+            else:
+                lat = sorted(groups[k])
+                packets, nbytes = self.total_packets[k], self.total_bytes[k]
+            if not packets:
+                continue
+            hist, j = [], 0
+            for upper in BUCKETS:
+                while j < len(lat) and lat[j] <= upper:
+                    j += 1
+                hist.append(j)
+            result[name] = {
+                "packets": packets,
+                "bytes": nbytes,
+                "packets_per_s": packets / elapsed,
+                "bytes_per_s": nbytes / elapsed,
+                "latency_s": {f"p{int(q * 100)}": _quantile(lat, q) for q in QUANTILES},
+                "latency_max_s": lat[-1] if lat else 0.0,
+                "latency_sum_s": sum(lat),
+                "samples": len(lat),
+                "histogram": dict(zip(map(str, BUCKETS), hist)),
+            }
+        return result
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.summary(), **kwargs)
+
+    def to_prometheus(self, prefix="km_send"):
+        """
+        Prometheus 文本格式：延迟 histogram + 包数 / 字节计数器。
+        全部取自 record() 累计的计数，不受环形缓冲区覆盖影响。
+        """
+        lines = [
+            f"# HELP {prefix}_latency_seconds 入队到写完成的耗时",
+            f"# TYPE {prefix}_latency_seconds histogram",
+        ]
+        kinds = [(k, name) for k, name in enumerate(KINDS) if self.total_packets[k]]
+        for k, name in kinds:
+            counts = list(accumulate(self.bucket_counts[k]))
+            for upper, count in zip(BUCKETS, counts):
+                lines.append(f'{prefix}_latency_seconds_bucket{{kind="{name}",le="{upper}"}} {count}')
+            lines.append(f'{prefix}_latency_seconds_bucket{{kind="{name}",le="+Inf"}} {counts[-1]}')
+            lines.append(f'{prefix}_latency_seconds_sum{{kind="{name}"}} {self.latency_sum[k]:.9f}')
+            lines.append(f'{prefix}_latency_seconds_count{{kind="{name}"}} {counts[-1]}')
+        for metric, totals, help_text in (("packets_total", self.total_packets, "已发送包数"),
+                                          ("bytes_total", self.total_bytes, "已发送字节数")):
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for k, name in kinds:
+                lines.append(f'{prefix}_{metric}{{kind="{name}"}} {totals[k]}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_pacer.py
+
+高精度发送节奏控制，取代逐包 time.sleep。
+
+Pacer 按目标速率（或时间戳事件）在 perf_counter 单调时钟上排出绝对发送
+时刻：第 i 个包的截止时刻为 t0 + i / rate，而不是"上次发送后再睡 1/rate"，
+因此写串口本身的耗时与单次睡眠误差不会累积成漂移。等待先 time.sleep
+到截止前 spin 秒，再自旋到截止时刻，得到亚毫秒精度。
+
+落后超过 max_lag（如脚本中途 sleep 了几秒）时重新锚定，不会为了
+"追进度"把积压的包一次性突发出去。每次发送的迟到量记录下来，
+stats() 给出抖动统计。
+
+两种控制器都可以把一批发送交给它：
+  with api.paced(rate=500) as pacer:
+      for dx, dy in path:
+          api.send_mouse(dx, dy)
+  print(pacer.stats())
+
+时间戳事件：
+  pacer = Pacer()
+  pacer.run(api._send, [(0.000, "10,0,0,0,0"), (0.010, "10,0,0,0,0")])
+"""
+
+import time
+
+# 剩余时间小于此值时改为自旋等待
+SPIN_THRESHOLD = 0.002
+
+
+def wait_until(deadline, spin=SPIN_THRESHOLD):
+    """睡眠到接近 deadline，最后一小段自旋，获得亚毫秒精度。"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > spin:
+            time.sleep(remaining - spin)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class Pacer:
+    """
+    发送节奏控制器。
+
+    rate     目标速率（包/秒）；period 与其二选一，都不指定时 wait() 立即返回
+             （时间戳模式，用 at() / run()）
+    spin     自旋段长度（秒），0 表示只用 sleep
+    max_lag  落后超过此值时重新锚定（默认一个周期）
+    """
+
+    def __init__(self, rate=None, period=None, spin=SPIN_THRESHOLD, max_lag=None):
+        if rate:
+            period = 1.0 / rate
+        self.period = period or 0.0
+        self.spin = spin
+        self.max_lag = self.period if max_lag is None else max_lag
+        self.lateness = []
+        self.resyncs = 0
+        self.start()
+
+    def start(self, t0=None):
+        """重新开始计时与统计；t0 为时间戳模式的零点（默认当前时刻）。"""
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self._next = self.t0
+        self._first = self._last = None
+        self.lateness.clear()
+        self.resyncs = 0
+        return self
+
+    def _record(self, deadline):
+        now = time.perf_counter()
+        self.lateness.append(now - deadline)
+        if self._first is None:
+            self._first = now
+        self._last = now
+
+    def wait(self):
+        """等到下一个速率时隙。"""
+        if not self.period:
+            return
+        deadline = self._next
+        if time.perf_counter() - deadline > self.max_lag:
+            deadline = time.perf_counter()
+            self.resyncs += 1
+        else:
+            wait_until(deadline, self.spin)
+        self._record(deadline)
+        self._next = deadline + self.period
+
+    def at(self, t):
+        """等到相对零点 t 秒的时刻（时间戳事件）。"""
+        deadline = self.t0 + t
+        wait_until(deadline, self.spin)
+        self._record(deadline)
+
+    def run(self, send, events):
+        """
+        逐个发送 events：元素为 (t, payload) 时按时间戳，否则按速率时隙。
+        send(payload) 通常为 ctrl._send。返回发送数。
+        """
+        count = 0
+        for ev in events:
+            if isinstance(ev, tuple):
+                self.at(ev[0])
+                send(ev[1])
+            else:
+                self.wait()
+                send(ev)
+            count += 1
+        return count
+
+    def stats(self):
+        """迟到量（秒）的分位数、平均与最大值，以及实际速率。"""
+        late = sorted(self.lateness)
+        n = len(late)
+        span = (self._last - self._first) if n > 1 else 0.0
+        return {
+            "events": n,
+            "rate": (n - 1) / span if span > 0 else 0.0,
+            "target_rate": 1.0 / self.period if self.period else None,
+            "late_mean_s": sum(late) / n if n else 0.0,
+            "late_p50_s": _percentile(late, 50),
+            "late_p99_s": _percentile(late, 99),
+            "late_max_s": late[-1] if late else 0.0,
+            "resyncs": self.resyncs,
+        }
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_pool.py
+
+多台 KM 控制器并行编排。
+
+enumerate_devices() 一次性枚举所有 CH340/WCH 串口，并为每台设备生成
+稳定标识（优先 USB 序列号，其次 USB 位置，最后设备名），
+这样同一台模拟器换了 COM 号也能对应到同一份配置。
+DevicePool 用线程池在所有设备上同时运行相同或不同的场景，汇总
+通过 / 失败与耗时。
+
+场景可以是：
+  - 可调用对象 fn(ctrl, device)，返回值记录在结果中；
+  - km_scenario 场景文件路径（.kms / .kmsb），按时间戳回放。
+
+用法示例：
+  pool = DevicePool()                       # 自动枚举
+  pool = DevicePool(["/dev/pts/3", "/dev/pts/4"])
+  report = pool.run(lambda ctrl, dev: ctrl.send_mouse(10, 0))
+  print(report.summary())
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from add07 import PS2Controller, list_km_ports
+
+Device = namedtuple("Device", "id port description")
+Result = namedtuple("Result", "device ok elapsed value error")
+
+
+def device_id(info):
+    """ListPortInfo -> 稳定标识。"""
+    if info.serial_number:
+        return f"sn:{info.serial_number}"
+    if info.location:
+        return f"loc:{info.location}"
+    return f"dev:{info.device}"
+
+
+def enumerate_devices():
+    """枚举所有匹配的串口，按标识排序。"""
+    devices = [Device(device_id(p), p.device, p.description) for p in list_km_ports()]
+    return sorted(devices, key=lambda d: d.id)
+
+
+class PoolReport:
+    """并行运行结果汇总。"""
+
+    def __init__(self, results, wall):
+        self.results = results
+        self.wall = wall
+
+    @property
+    def passed(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    def summary(self):
+        times = sorted(r.elapsed for r in self.results)
+        return {
+            "devices": len(self.results),
+            "passed": len(self.passed),
+            "failed": len(self.failed),
+            "wall_s": self.wall,
+            "device_s_min": times[0] if times else 0.0,
+            "device_s_max": times[-1] if times else 0.0,
+            "device_s_sum": sum(times),
+            "errors": {r.device.id: r.error for r in self.failed},
+        }
+
+
+class DevicePool:
+    """
+    设备池。devices 可为 Device 列表、端口字符串列表，或 None（自动枚举）。
+    controller 为每台设备使用的控制器类（PS2Controller 或 CompositeKMController）。
+    """
+
+    def __init__(self, devices=None, controller=PS2Controller, max_workers=None,
+                 **ctrl_kwargs):
+        if devices is None:
+            devices = enumerate_devices()
+        self.devices = [d if isinstance(d, Device) else Device(f"dev:{d}", d, "")
+                        for d in devices]
+        self.controller = controller
+        self.ctrl_kwargs = ctrl_kwargs
+        self.max_workers = max_workers or max(1, len(self.devices))
+
+    def __len__(self):
+        return len(self.devices)
+
+    def get(self, ident):
+        for d in self.devices:
+            if d.id == ident or d.port == ident:
+                return d
+        raise KeyError(ident)
+
+    def _run_one(self, device, scenario):
+        t0 = time.perf_counter()
+        ctrl = None
+        try:
+            ctrl = self.controller(port=device.port, **self.ctrl_kwargs)
+            if isinstance(scenario, str):
+                from km_scenario import play
+                value = play(scenario, ctrl)
+            else:
+                value = scenario(ctrl, device)
+            return Result(device, True, time.perf_counter() - t0, value, None)
+        except Exception as e:
+            return Result(device, False, time.perf_counter() - t0, None,
+                          f"{type(e).__name__}: {e}")
+        finally:
+            if ctrl is not None:
+                ctrl.close()
+
+    def run(self, scenario, per_device=None):
+        """
+        在所有设备上并行运行 scenario；per_device 为 {设备标识或端口: 场景}，
+        用于给个别设备指定不同场景。返回 PoolReport。
+        """
+        per_device = per_device or {}
+        jobs = [(d, per_device.get(d.id, per_device.get(d.port, scenario)))
+                for d in self.devices]
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(self.max_workers) as ex:
+            results = list(ex.map(lambda job: self._run_one(*job), jobs))
+        return PoolReport(results, time.perf_counter() - t0)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_reader.py
+
+后台读取 MCU 回复，并与发出的查询 / 命令对应起来。
+
+读取线程把串口上的数据切成行并分类：
+  status   状态查询回复     STATUS:REL,REMOTE
+  fwinfo   固件信息回复     FW:...
+  ack      命令确认         OK / ACK
+  debug    调试输出         [DBG] ... / DEBUG ...
+  binmode  二进制帧协商回复 BIN:1 / BIN:0（见 km_binary）
+  echo     单字节回显       如 send_to_sender.py 中的 0xEE
+  other    其余内容
+分类规则在 RULES 中，可按固件版本覆盖。
+
+每类回复按先进先出对应到 expect(kind) 返回的 Future；没有等待者的行
+进入 unsolicited 队列并回调 on_line。window 不为 None 时启用基于 ACK
+的流控：最多 window 个包未确认，取代固定的 WAIT 等待。
+
+用法示例：
+  km = CompositeKMController(port="COM25")
+  reader = attach(km)
+  print(km.get_status().result(timeout=1))
+  reader.stop()
+"""
+
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+
+Reply = namedtuple("Reply", "kind raw fields t")
+
+RULES = (
+    ("status", re.compile(r"^STATUS[:=]\s*(.*)$", re.I)),
+    ("fwinfo", re.compile(r"^(?:FW|FWINFO|VER(?:SION)?)[:=\s]\s*(.*)$", re.I)),
+    ("ack",    re.compile(r"^(?:OK|ACK)\b\s*(.*)$", re.I)),
+    ("debug",  re.compile(r"^(?:\[DBG\]|DEBUG[:\s])\s*(.*)$", re.I)),
+    ("binmode", re.compile(r"^BIN[:=]\s*(.*)$", re.I)),
+)
+ECHO_BYTES = frozenset([0xEE])
+
+
+class ResponseReader:
+    """串口回复读取线程。"""
+
+    def __init__(self, ser, window=None, on_line=None, on_data=None,
+                 rules=RULES, echo_bytes=ECHO_BYTES, keep=1024):
+        self.ser = ser
+        self.window = window
+        self.on_line = on_line
+        self.on_data = on_data
+        self.rules = rules
+        self.echo_bytes = echo_bytes
+        self.unsolicited = deque(maxlen=keep)
+        self.debug = deque(maxlen=keep)
+        self.counts = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._credits = threading.BoundedSemaphore(window) if window else None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for futs in pending.values():
+            for fut in futs:
+                fut.cancel()
+
+    # —————— 对应关系 ——————
+    def expect(self, kind):
+        """登记一个等待 kind 类回复的 Future；应在发出命令之前调用。"""
+        fut = Future()
+        with self._lock:
+            self._pending.setdefault(kind, deque()).append(fut)
+        return fut
+
+    def discard(self, kind, futs):
+        """
+        撤销仍在等待的 expect(kind) Future（如等待超时后），返回撤销的个数；
+        否则它们会继续按先进先出领走之后的回复。
+        """
+        futs = set(futs)
+        with self._lock:
+            pending = self._pending.get(kind)
+            if not pending:
+                return 0
+            keep = deque(f for f in pending if f not in futs)
+            removed = len(pending) - len(keep)
+            self._pending[kind] = keep
+        for fut in futs:
+            fut.cancel()
+        return removed
+
+    def acquire(self, timeout=None):
+        """流控：取得一个发送额度（窗口未启用时立即返回 True）。"""
+        if self._credits is None:
+            return True
+        return self._credits.acquire(timeout=timeout)
+
+    def reset_credits(self):
+        """链路重建后恢复全部发送额度：旧链路上未确认的包不会再有 ACK。"""
+        if self._credits is None:
+            return
+        for _ in range(self.window):
+            try:
+                self._credits.release()     # 同时唤醒阻塞在 acquire 上的发送方
+            except ValueError:
+                return
+
+    # —————— 读取与分类 ——————
+    def _run(self):
+        buf = bytearray()
+        while self._running:
+            try:
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except Exception:
+                if not self._running:
+                    return
+                time.sleep(0.05)
+                continue
+            if not data:
+                continue
+            if self.on_data is not None:
+                self.on_data(data)
+            for b in data:
+                if not buf and b in self.echo_bytes:
+                    self._dispatch(Reply("echo", bytes([b]), [b], time.perf_counter()))
+                elif b == 0x0A:
+                    line = buf.decode(errors="replace").strip()
+                    buf.clear()
+                    if line:
+                        self._dispatch(self.parse(line))
+                else:
+                    buf.append(b)
+
+    def parse(self, line):
+        for kind, pattern in self.rules:
+            m = pattern.match(line)
+            if m:
+                rest = m.group(1).strip()
+                fields = [f.strip() for f in re.split(r"[,;\s]+", rest) if f.strip()]
+                return Reply(kind, line, fields, time.perf_counter())
+        return Reply("other", line, [], time.perf_counter())
+
+    def _dispatch(self, reply):
+        self.counts[reply.kind] = self.counts.get(reply.kind, 0) + 1
+        if reply.kind == "ack" and self._credits is not None:
+            try:
+                self._credits.release()
+            except ValueError:      # 批量模式的 ACK 不占用额度
+                pass
+        if reply.kind == "debug":
+            self.debug.append(reply)
+        with self._lock:
+            futs = self._pending.get(reply.kind)
+            fut = futs.popleft() if futs else None
+        if fut is not None:
+            fut.set_result(reply)
+            return
+        if reply.kind != "ack":
+            self.unsolicited.append(reply)
+            if self.on_line is not None:
+                self.on_line(reply)
+
+
+def attach(ctrl, window=None, **kwargs):
+    """为控制器创建并启动 ResponseReader，赋给 ctrl.reader。"""
+    reader = ResponseReader(ctrl.ser, window=window, **kwargs).start()
+    ctrl.reader = reader
+    return reader
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_resilient.py
+
+串口断线重连与写重试：CH340 重新枚举、写超时或 reboot 断开链路时不中断运行。
+
+ResilientSerial 包装控制器的 ser（protect(ctrl) 同时替换 ctrl.ser 与 reader.ser），
+控制器、PacketBatch 与 km_reader 照常经它读写：
+
+  检测   write / read / in_waiting / flush 抛出 SerialException（OSError 的子类，
+         含写超时 SerialTimeoutException）或其他 OSError 视为断线；
+  重连   关闭旧端口，经控制器的 _find_port 重新解析端口（自动匹配时 COM 号 /
+         ttyUSB 编号可能已变化），按指数退避重试打开，max_wait 秒内仍失败则
+         抛出 SerialException；
+  恢复   新链路上先按固定顺序重发最近的模式命令（USB 控制 / 调试 / REL·ABS·KEY、
+         PS/2 sim-on / 鼠标·键盘模式、二进制帧），再重放未确认的包，最后重试
+         失败的那次写；
+  重放   启用 km_reader ACK 流控（reader.window）时重放尚未收到 ACK 的包
+         （“至少一次”：ACK 丢失的包可能重复一次）；
+         没有 ACK 时无法判断哪些包已到达，只重放重复也无害的包：按 UART
+         波特率模型估计断线时还没发完的包，再加上断线前 replay_window 秒内
+         写出的包，从中挑出 USB 绝对定位（ABS 模式下的鼠标报告）与 PS/2
+         按键释放；相对位移、按下 / 敲击与文本丢失而不重复，模式命令由恢复
+         步骤重发。
+
+reboot（#0xZ26@RET）后 MCU 丢失全部模式：之后的第一次写先等到 reboot_delay 秒，
+再恢复 reboot 前的模式（链路随 reboot 断开时由重连流程恢复）。
+
+每次重连的耗时记入 stats()，并回调 on_reconnect(info)。
+
+用法示例：
+  api = PS2Controller()
+  link = protect(api, on_reconnect=print)
+  api.enter_sim_mode()
+  api.set_mode_mouse()
+  for _ in range(100000):
+      api.send_mouse(1, 0)        # 期间拔插 USB 也会继续
+  print(link.stats())
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from time import perf_counter
+
+from serial import SerialException
+
+from add07 import PS2Controller, _open_serial, encode_packet
+from km_binary import BREAK, CMD_BINARY_OFF, CMD_BINARY_ON, FRAME_SIZE, SYNC, T_KEY
+from km_coalesce import CMD_ABS_MODE, CMD_IDLE, CMD_REBOOT, MODE_GROUPS
+
+MODE_GROUPS = dict(MODE_GROUPS, **{CMD_BINARY_ON: "binary", CMD_BINARY_OFF: "binary"})
+# 恢复顺序：先控制权与调试，再模式；PS/2 先 sim-on 再选鼠标 / 键盘；最后协商二进制帧
+RESTORE_ORDER = ("usb_control", "debug", "usb_mode", "ps2_sim", "ps2_mode", "binary")
+# PS/2 按键释放："14,1"（km_layout 的 码,动作）或 F0 断码 "F01C" / "E0,F0,75"
+_KEY_RELEASE = re.compile(rb"^(?:(?:E0,?)?[0-9A-F]{2},1|(?:E0,?)?F0,?[0-9A-F]{2})\r?\n$", re.I)
+
+
+def _close_quietly(ser):
+    try:
+        ser.close()
+    except Exception:
+        pass
+
+
+class ResilientSerial:
+    """
+    可替换 ctrl.ser 的串口包装。reopen() 返回新打开的串口；
+    ctrl 用于取得当前的 km_reader（ACK 计数与流控额度），可为 None。
+    """
+
+    def __init__(self, ser, reopen, ctrl=None, backoff=0.05, max_backoff=2.0,
+                 max_wait=60.0, replay_window=0.05, keep=256, reboot_delay=0.5,
+                 write_timeout=None, on_reconnect=None):
+        self._ser = ser
+        self._reopen = reopen
+        self.ctrl = ctrl
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.replay_window = replay_window
+        self.reboot_delay = reboot_delay
+        self.write_timeout = write_timeout
+        self.on_reconnect = on_reconnect
+        if write_timeout is not None:
+            ser.write_timeout = write_timeout
+        self.faults = self.restores = self.reboots = 0
+        self.replayed_packets = self.replayed_bytes = 0
+        self.reconnects = []            # 每次重连耗时（秒）
+        self._history = deque(maxlen=keep)  # (模型发完时刻, 包数, 数据)
+        self._modes = {}
+        self._out = 0                   # 自上次重连以来写出的包数
+        self._ack_base = 0
+        self._tx_free = 0.0
+        self._byte_time = 10 / (getattr(ser, "baudrate", None) or 115200)
+        self._restore_at = None
+        self._gen = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # —————— 串口接口 ——————
+    def write(self, data):
+        if self._restore_at is not None:
+            self._after_reboot()
+        ser, gen = self._ser, self._gen
+        try:
+            n = ser.write(data)
+        except OSError as exc:
+            return self._retry(data, gen, exc)
+        self._record(data)
+        return n
+
+    def read(self, size=1):
+        ser, gen = self._ser, self._gen
+        try:
+            return ser.read(size)
+        except OSError as exc:
+            self._reconnect(gen, exc)
+            return b""
+
+    @property
+    def in_waiting(self):
+        ser, gen = self._ser, self._gen
+        try:
+            return ser.in_waiting
+        except OSError as exc:
+            self._reconnect(gen, exc)
+            return 0
+
+    def flush(self):
+        ser, gen = self._ser, self._gen
+        try:
+            ser.flush()
+        except OSError as exc:
+            self._reconnect(gen, exc)
+
+    def close(self):
+        self._closed = True
+        self._ser.close()
+
+    def __getattr__(self, name):
+        # port / baudrate / is_open / reset_input_buffer 等直接取当前串口
+        return getattr(self._ser, name)
+
+    # —————— 记录 ——————
+    def _record(self, data):
+        if type(data) is not bytes:
+            data = bytes(data)          # PacketBatch 写出后会清空并复用缓冲
+        n = data.count(b"\n")
+        now, t = perf_counter(), self._tx_free
+        t = self._tx_free = (t if t > now else now) + len(data) * self._byte_time
+        self._history.append((t, n, data))
+        self._out += n
+        if b"#" in data:
+            self._track(data)
+
+    def _track(self, data):
+        """跟踪模式命令，供重连 / reboot 后恢复。"""
+        for line in data.split(b"\n"):
+            cmd = line.strip().decode(errors="replace")
+            group = MODE_GROUPS.get(cmd)
+            if group is not None:
+                self._modes[group] = cmd
+            elif cmd == CMD_IDLE:
+                self._modes.pop("usb_mode", None)
+                self._modes.pop("ps2_mode", None)
+            elif cmd == CMD_REBOOT:
+                # MCU 复位后之前的包已无意义，也不能把 reboot 本身重放出去
+                self.reboots += 1
+                self._forget()
+                self._restore_at = time.perf_counter() + self.reboot_delay
+
+    def _forget(self):
+        """清空重放记录与 ACK 计数基准。"""
+        self._history.clear()
+        self._out = 0
+        self._tx_free = 0.0
+        reader = self._reader()
+        if reader is not None:
+            self._ack_base = reader.counts.get("ack", 0)
+
+    def _reader(self):
+        return getattr(self.ctrl, "reader", None)
+
+    def _tail(self, now):
+        """断线时未确认的包（按写出顺序）。"""
+        history = list(self._history)
+        reader = self._reader()
+        if reader is not None and reader.window:
+            unacked = self._out - (reader.counts.get("ack", 0) - self._ack_base)
+            tail, n = [], 0
+            for entry in reversed(history):
+                if n >= unacked:
+                    break
+                tail.append(entry)
+                n += entry[1]
+            tail.reverse()
+            return tail
+        cutoff = now - self.replay_window
+        tail = []
+        for t, _, data in history:
+            if t > cutoff:
+                n, data = self._idempotent(data)
+                if n:
+                    tail.append((t, n, data))
+        return tail
+
+    def _idempotent(self, data):
+        """data 中重复执行无害的包 -> (包数, 数据)：USB 绝对定位与 PS/2 按键释放。"""
+        ps2 = isinstance(self.ctrl, PS2Controller)
+        absolute = not ps2 and self._modes.get("usb_mode") == CMD_ABS_MODE
+        keep, i, end = [], 0, len(data)
+        while i < end:
+            size = FRAME_SIZE.get(data[i + 1]) if data[i] == SYNC and i + 1 < end else None
+            if size is not None:
+                pkt = data[i:i + size]
+                ok = (data[i + 1] == T_KEY and pkt[3] == BREAK) if ps2 else absolute
+            else:
+                size = data.find(b"\n", i) + 1 - i
+                if size <= 0:
+                    size = end - i
+                pkt = data[i:i + size]
+                if pkt.startswith(b"#"):
+                    ok = False          # 模式命令由 _restore 重发，查询 / reboot 不重放
+                elif ps2:
+                    ok = _KEY_RELEASE.match(pkt) is not None
+                else:
+                    ok = absolute
+            if ok:
+                keep.append(pkt)
+            i += size
+        return len(keep), b"".join(keep)
+
+    # —————— 恢复 ——————
+    def _restore(self, ser):
+        """在 ser 上按 RESTORE_ORDER 重发已知模式。"""
+        cmds = [self._modes[g] for g in RESTORE_ORDER if g in self._modes]
+        for cmd in cmds:
+            pkt = encode_packet(cmd)
+            ser.write(pkt)
+            self._record(pkt)
+        if cmds:
+            self.restores += 1
+
+    def _after_reboot(self):
+        delay = self._restore_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self._restore_at = None
+        ser, gen = self._ser, self._gen
+        try:
+            self._restore(ser)
+        except OSError as exc:
+            self._reconnect(gen, exc)
+
+    def _retry(self, data, gen, exc):
+        while True:
+            self._reconnect(gen, exc)
+            ser, gen = self._ser, self._gen
+            try:
+                n = ser.write(data)
+            except OSError as e:
+                exc = e
+                continue
+            self._record(data)
+            return n
+
+    def _reconnect(self, gen, exc):
+        """gen 为出错时的链路代数；其他线程已完成重连时直接返回。"""
+        with self._lock:
+            if self._closed:
+                raise exc
+            if gen != self._gen:
+                return
+            t0 = time.perf_counter()
+            self.faults += 1
+            tail = self._tail(t0)
+            # 设备已消失时 close 可能阻塞（socket:// 固定等待 0.3 秒），放到后台
+            threading.Thread(target=_close_quietly, args=(self._ser,), daemon=True).start()
+            delay, attempts = self.backoff, 0
+            while True:
+                attempts += 1
+                ser = None
+                try:
+                    ser = self._reopen()
+                    if self.write_timeout is not None:
+                        ser.write_timeout = self.write_timeout
+                    self._resume(ser, tail)
+                    break
+                except (OSError, RuntimeError) as e:      # _find_port 找不到设备时为 RuntimeError
+                    last = e
+                    if ser is not None:
+                        _close_quietly(ser)
+                if time.perf_counter() - t0 + delay > self.max_wait:
+                    raise SerialException(
+                        f"重连失败：{attempts} 次尝试，{time.perf_counter() - t0:.1f} 秒，"
+                        f"最后错误 {last}") from exc
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+            self._ser = ser
+            self._gen += 1
+            dt = time.perf_counter() - t0
+            self.reconnects.append(dt)
+            info = {
+                "error": str(exc),
+                "attempts": attempts,
+                "seconds": dt,
+                "port": getattr(ser, "port", None),
+                "replayed_packets": sum(entry[1] for entry in tail),
+                "replayed_bytes": sum(len(entry[2]) for entry in tail),
+            }
+        if self.on_reconnect is not None:
+            self.on_reconnect(info)
+
+    def _resume(self, ser, tail):
+        """新链路上：重置流控与模型，恢复模式，重放 tail。"""
+        self._forget()
+        self._restore_at = None
+        reader = self._reader()
+        if reader is not None:
+            reader.reset_credits()
+        self._restore(ser)
+        for _, n, data in tail:
+            ser.write(data)
+            self._record(data)
+            self.replayed_packets += n
+            self.replayed_bytes += len(data)
+
+    # —————— 统计 ——————
+    def stats(self):
+        """故障次数、重连耗时（秒）、重放的包 / 字节数与模式恢复次数。"""
+        r = list(self.reconnects)
+        return {
+            "faults": self.faults,
+            "reconnects": len(r),
+            "reconnect_last_s": r[-1] if r else 0.0,
+            "reconnect_max_s": max(r, default=0.0),
+            "reconnect_total_s": sum(r),
+            "replayed_packets": self.replayed_packets,
+            "replayed_bytes": self.replayed_bytes,
+            "restores": self.restores,
+            "reboots": self.reboots,
+        }
+
+
+def protect(ctrl, port=None, baudrate=None, **kwargs):
+    """
+    为已打开的控制器装上 ResilientSerial，赋给 ctrl.ser（及 ctrl.reader.ser）。
+    port / baudrate 同打开控制器时的参数；port 为 None 时重连前重新自动匹配。
+    """
+    ser = ctrl.ser
+    if isinstance(ser, ResilientSerial):
+        return ser
+    baudrate = baudrate or getattr(ser, "baudrate", None) or ctrl.DEFAULT_BAUDRATE
+    timeout = getattr(ser, "timeout", 0.5)
+
+    def reopen():
+        return _open_serial(ctrl._find_port, port, baudrate, timeout)
+
+    link = ResilientSerial(ser, reopen, ctrl=ctrl, **kwargs)
+    ctrl.ser = link
+    reader = getattr(ctrl, "reader", None)
+    if reader is not None:
+        reader.ser = link
+    return link
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_scenario.py
+
+场景录制与回放。场景是一串带时间戳的事件，每个事件对应一个发往
+MCU 的数据包（不含 \\r\\n）：
+
+  C  模式 / 控制命令   如 #0xC3@PS2cmd10、#0xA1@USBcmd
+  M  鼠标数据          如 10,0,1,0,0
+  K  键盘数据 / 文本   如 1C、12,0、Hello World
+
+两种文件格式：
+  文本（.kms）  每行 "<秒> <类型> <数据>"，# 开头为注释，便于 diff
+                  0.000000 C #0xC3@PS2cmd10
+                  0.010000 M 10,0,0,0,0
+  二进制（.kmsb）文件头 b"KMSC" + 版本字节，每条记录为
+                  <Q 微秒> <B 类型> <H 长度> + 数据
+
+回放时按 mmap 逐条解析，不把整个文件读入内存，并由 km_pacer 按时间戳
+在单调时钟上精确发送；
+Recorder 挂在控制器的 _send 与 _write_bulk 上，记录所有经过的包。
+
+命令行：
+  python km_scenario.py play  scenario.kms -p COM25 --ps2
+  python km_scenario.py convert scenario.kms scenario.kmsb
+  python km_scenario.py cat scenario.kmsb
+"""
+
+import argparse
+import mmap
+import re
+import struct
+import time
+
+from add07 import CompositeKMController, PS2Controller, encode_packet
+from km_binary import SYNC, frame_payload
+
+MAGIC = b"KMSC"
+VERSION = 1
+_HEADER = MAGIC + bytes([VERSION])
+_RECORD = struct.Struct("<QBH")
+
+KIND_CMD, KIND_MOUSE, KIND_KEY = "C", "M", "K"
+_MOUSE_RE = re.compile(r"^-?\d+,-?\d+,[01],[01],[01](,-?\d+)?$")
+
+
+def classify(payload):
+    """根据数据包内容判断事件类型。"""
+    if payload.startswith("#"):
+        return KIND_CMD
+    if _MOUSE_RE.match(payload):
+        return KIND_MOUSE
+    return KIND_KEY
+
+
+def is_binary(path):
+    return str(path).endswith(".kmsb")
+
+
+class ScenarioWriter:
+    """按文件扩展名写文本或二进制场景；事件时间单位为秒。"""
+
+    def __init__(self, path, binary=None):
+        self.binary = is_binary(path) if binary is None else binary
+        self.f = open(path, "wb")
+        if self.binary:
+            self.f.write(_HEADER)
+        else:
+            self.f.write(f"# km scenario v{VERSION}\n".encode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, t, kind, payload):
+        data = payload.encode()
+        if self.binary:
+            self.f.write(_RECORD.pack(round(t * 1e6), ord(kind), len(data)))
+            self.f.write(data)
+        else:
+            self.f.write(b"%.6f %s %s\n" % (t, kind.encode(), data))
+
+    def close(self):
+        self.f.close()
+
+
+def iter_events(path):
+    """流式读取场景文件，逐条产生 (t, kind, payload)。"""
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:      # 空文件无法映射
+            return
+        with mm:
+            if mm[:len(MAGIC)] == MAGIC:
+                yield from _iter_binary(mm)
+            else:
+                yield from _iter_text(mm)
+
+
+def _iter_binary(mm):
+    if mm[len(MAGIC)] != VERSION:
+        raise ValueError(f"不支持的场景版本: {mm[len(MAGIC)]}")
+    off, end, size = len(_HEADER), len(mm), _RECORD.size
+    unpack_from = _RECORD.unpack_from
+    while off + size <= end:
+        us, kind, n = unpack_from(mm, off)
+        off += size
+        yield us / 1e6, chr(kind), mm[off:off + n].decode()
+        off += n
+
+
+def _iter_text(mm):
+    for raw in iter(mm.readline, b""):
+        line = raw.decode().rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+        t, kind, payload = line.split(" ", 2)
+        yield float(t), kind, payload
+
+
+def play(path, ctrl, speed=1.0, kinds=None):
+    """
+    按时间戳把场景事件经 ctrl._send 发出；speed>1 加速回放。
+    kinds 可限定只回放某些类型（如 {"M"}）。返回 (事件数, 最大迟到秒数)。
+    """
+    count = 0
+    # K 在 PS/2 上是扫描码，在 USB 上是 send_text 文本（始终为文本格式）
+    kinds_of = {KIND_MOUSE: "mouse",
+                KIND_KEY: "key" if isinstance(ctrl, PS2Controller) else None}
+    with ctrl.paced() as pacer:     # 时间戳决定节奏，取代控制器的固定 WAIT
+        for t, kind, payload in iter_events(path):
+            if kinds and kind not in kinds:
+                continue
+            pacer.at(t / speed)
+            ctrl._send(payload, kind=kinds_of.get(kind))
+            count += 1
+    return count, pacer.stats()["late_max_s"]
+
+
+class Recorder:
+    """
+    录制器：替换 ctrl._send 与 ctrl._write_bulk（*_batch 批量方法），
+    所有经过的包连同相对时间写入场景文件。
+
+      with Recorder(api, "example.kms"):
+          api.send_mouse(10, 0)
+    """
+
+    def __init__(self, ctrl, path, binary=None):
+        self.ctrl = ctrl
+        self.writer = ScenarioWriter(path, binary)
+        self.count = 0
+        self._orig = ctrl._send
+        self._orig_bulk = getattr(ctrl, "_write_bulk", None)
+        self._t0 = time.perf_counter()
+        ctrl._send = self._send
+        if self._orig_bulk is not None:
+            ctrl._write_bulk = self._write_bulk
+
+    def _send(self, *args, **kwargs):
+        pkt = encode_packet(*args, **kwargs)
+        if pkt is not None:
+            payload = pkt[:-2].decode()
+            self.writer.write(time.perf_counter() - self._t0,
+                              classify(payload), payload)
+            self.count += 1
+        return self._orig(*args, **kwargs)
+
+    def _write_bulk(self, data, ends, chunk=None):
+        """批量报告按 ends 切分后逐个记录为鼠标事件（时间戳相同）。"""
+        t = time.perf_counter() - self._t0
+        start = 0
+        for end in ends:
+            pkt = data[start:end]
+            start = end
+            payload = frame_payload(pkt) if pkt[0] == SYNC else bytes(pkt[:-2]).decode()
+            self.writer.write(t, KIND_MOUSE, payload)
+            self.count += 1
+        return self._orig_bulk(data, ends, chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.ctrl.__dict__.get("_send") == self._send:
+            del self.ctrl._send
+        if self.ctrl.__dict__.get("_write_bulk") == self._write_bulk:
+            del self.ctrl._write_bulk
+        self.writer.close()
+
+
+def convert(src, dst):
+    """文本 <-> 二进制转换（按 dst 扩展名决定格式），返回事件数。"""
+    n = 0
+    with ScenarioWriter(dst) as w:
+        for t, kind, payload in iter_events(src):
+            w.write(t, kind, payload)
+            n += 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KM 场景 录制 文件 工具")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("play", help="回放 场景")
+    p.add_argument("file")
+    p.add_argument("-p", "--port", help="串口号，不指定时自动匹配 CH340/WCH")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--ps2", action="store_true", help="使用 PS/2 控制器（默认）")
+    g.add_argument("--usb", action="store_true", help="使用 USB Composite 控制器")
+    p.add_argument("--speed", type=float, default=1.0, help="回放 速度 倍数")
+
+    c = sub.add_parser("convert", help="文本 / 二进制 互转")
+    c.add_argument("src")
+    c.add_argument("dst")
+
+    k = sub.add_parser("cat", help="以 文本 形式 打印 场景")
+    k.add_argument("file")
+
+    args = parser.parse_args()
+    if args.cmd == "play":
+        ctrl = (CompositeKMController if args.usb else PS2Controller)(port=args.port)
+        try:
+            n, late = play(args.file, ctrl, speed=args.speed)
+        finally:
+            ctrl.close()
+        print(f"回放 {n} 个 事件，最大 迟到 {late * 1e3:.3f} ms")
+    elif args.cmd == "convert":
+        print(f"转换 {convert(args.src, args.dst)} 个 事件")
+    else:
+        for t, kind, payload in iter_events(args.file):
+            print(f"{t:.6f} {kind} {payload}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_screen.py
+
+ABS 模式的主机侧屏幕模型。
+
+固件在 set_resolution(w,h) 后把像素坐标映射为 HID 逻辑坐标（0..32767），
+主机原先不保存这一状态。ScreenModel 记住分辨率并预先算好两张映射表：
+
+  x_logical[px] / y_logical[py]   像素 -> 逻辑坐标
+  x_pixel[lx]   / y_pixel[ly]     逻辑坐标 -> 像素
+
+表按分辨率缓存，重复 set_resolution 不会重新计算；逻辑 -> 像素表较大，
+首次用到时才计算。
+
+坐标可以是：
+  像素       move_to(960, 540)
+  归一化     move_to(0.5, 0.5, normalized=True)          0..1，相对整个桌面
+  多显示器   move_to(100, 100, monitor=1)                 相对第 1 块屏左上角
+             move_to(0.5, 0.5, normalized=True, monitor=1)
+
+多显示器布局用 ScreenModel.from_monitors([Monitor(x, y, w, h), ...]) 描述，
+桌面为所有显示器的外接矩形（允许负坐标原点）。
+
+映射到与上一次相同的逻辑位置且按键不变的包是冗余的（拖拽轨迹很密集时
+很常见），move_to / move_to_batch 会跳过它们。
+"""
+
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+LOGICAL_MAX = 32767
+
+Monitor = namedtuple("Monitor", "x y width height")
+
+_np = None
+
+
+def _numpy():
+    """按需导入 numpy（可选，仅批量接口使用；CLI 的 res 命令不必为它付启动时间）。"""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _np = numpy
+    return _np or None
+
+
+@lru_cache(maxsize=16)
+def _logical_table(size):
+    """一个轴的像素 -> 逻辑坐标表。"""
+    last = max(size - 1, 1)
+    return array("H", ((px * LOGICAL_MAX + last // 2) // last for px in range(size)))
+
+
+@lru_cache(maxsize=16)
+def _pixel_table(size):
+    """一个轴的逻辑坐标 -> 像素表（32768 项，首次使用时计算）。"""
+    last = max(size - 1, 1)
+    return array("H", ((lx * last + LOGICAL_MAX // 2) // LOGICAL_MAX
+                       for lx in range(LOGICAL_MAX + 1)))
+
+
+class ScreenModel:
+    """分辨率与映射表；monitors 为 Monitor 列表（坐标相对桌面左上角）。"""
+
+    def __init__(self, width, height, monitors=None):
+        if width < 1 or height < 1:
+            raise ValueError(f"无效分辨率: {width}x{height}")
+        self.width = width
+        self.height = height
+        self.monitors = list(monitors or [Monitor(0, 0, width, height)])
+        self.x_logical = _logical_table(width)
+        self.y_logical = _logical_table(height)
+        self.last = None
+        self.skipped = 0
+
+    @classmethod
+    def from_monitors(cls, monitors):
+        """按系统报告的显示器位置（可含负坐标）建立桌面模型。"""
+        monitors = [Monitor(*m) for m in monitors]
+        x0 = min(m.x for m in monitors)
+        y0 = min(m.y for m in monitors)
+        x1 = max(m.x + m.width for m in monitors)
+        y1 = max(m.y + m.height for m in monitors)
+        return cls(x1 - x0, y1 - y0,
+                   [Monitor(m.x - x0, m.y - y0, m.width, m.height) for m in monitors])
+
+    @property
+    def x_pixel(self):
+        return _pixel_table(self.width)
+
+    @property
+    def y_pixel(self):
+        return _pixel_table(self.height)
+
+    # —————— 映射 ——————
+    def to_logical(self, px, py):
+        return self.x_logical[px], self.y_logical[py]
+
+    def to_pixel(self, lx, ly):
+        return self.x_pixel[lx], self.y_pixel[ly]
+
+    def resolve(self, x, y, normalized=False, monitor=None):
+        """像素 / 归一化 / 多显示器坐标 -> 桌面像素坐标（截断到桌面内）。"""
+        if monitor is None:
+            ox, oy, w, h = 0, 0, self.width, self.height
+        else:
+            ox, oy, w, h = self.monitors[monitor]
+        if normalized:
+            x, y = round(x * (w - 1)), round(y * (h - 1))
+        x = min(max(int(x) + ox, 0), self.width - 1)
+        y = min(max(int(y) + oy, 0), self.height - 1)
+        return x, y
+
+    def resolve_batch(self, xs, ys, normalized=False, monitor=None):
+        """resolve 的批量版本；有 numpy 时向量化，返回 (xs, ys)。"""
+        np = _numpy()
+        if np is None:
+            pts = [self.resolve(x, y, normalized, monitor) for x, y in zip(xs, ys)]
+            return [p[0] for p in pts], [p[1] for p in pts]
+        if monitor is None:
+            ox, oy, w, h = 0, 0, self.width, self.height
+        else:
+            ox, oy, w, h = self.monitors[monitor]
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        if normalized:
+            xs, ys = np.rint(xs * (w - 1)), np.rint(ys * (h - 1))
+        xs = np.clip(xs.astype(np.int64) + ox, 0, self.width - 1)
+        ys = np.clip(ys.astype(np.int64) + oy, 0, self.height - 1)
+        return xs, ys
+
+    # —————— 冗余包过滤 ——————
+    def redundant(self, px, py, buttons=0):
+        """与上一次发送的逻辑位置和按键都相同则返回 True；否则记录为新的上一次。"""
+        state = (self.x_logical[px], self.y_logical[py], buttons)
+        if state == self.last:
+            self.skipped += 1
+            return True
+        self.last = state
+        return False
+
+    def dedupe_batch(self, xs, ys, buttons=0):
+        """
+        去掉批量坐标中的冗余点（含与上一次发送相同的第一个点），
+        返回 (xs, ys, buttons)，并把最后一点记为上一次。
+        """
+        np = _numpy()
+        if np is None:
+            n = len(xs)
+            bs = list(buttons) if hasattr(buttons, "__len__") else [buttons] * n
+            out = ([], [], [])
+            for x, y, b in zip(xs, ys, bs):
+                if not self.redundant(x, y, b):
+                    out[0].append(x)
+                    out[1].append(y)
+                    out[2].append(b)
+            return out
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        if not len(xs):
+            return xs, ys, np.zeros(0, np.int64)
+        bs = np.broadcast_to(np.asarray(buttons, dtype=np.int64), xs.shape)
+        lx = np.frombuffer(self.x_logical, np.uint16)[xs]
+        ly = np.frombuffer(self.y_logical, np.uint16)[ys]
+        keep = np.empty(len(xs), bool)
+        keep[1:] = (lx[1:] != lx[:-1]) | (ly[1:] != ly[:-1]) | (bs[1:] != bs[:-1])
+        keep[0] = (int(lx[0]), int(ly[0]), int(bs[0])) != self.last
+        self.skipped += int(len(keep) - keep.sum())
+        self.last = (int(lx[-1]), int(ly[-1]), int(bs[-1]))
+        return xs[keep], ys[keep], bs[keep]
+
+    def reset(self):
+        """忘记上一次位置（如模式切换或重连后）。"""
+        self.last = None
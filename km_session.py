@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_session.py
+
+在 PS2Controller / CompositeKMController 之上的常驻会话层。
+
+测试脚本原先对每个扫描码、每次 Shift、每步鼠标移动都启动一次
+`python add07.py ...`，每次都要重新导入 pyserial、匹配串口、打开串口并
+等待 0.1 s。会话对象在整个脚本生命周期内只打开一次串口，脚本直接调用：
+
+  type_string(text)   发送字符串
+  move(dx, dy, ...)   鼠标相对移动
+  glide(dx, dy, t)    鼠标按轨迹移动，自动拆分为合法位移包
+  click(button, n)    鼠标单击 / 多击
+  combo(...)          组合键（扫描码）
+  type_combo(spec)    组合键（按键名，如 "CTRL+ALT+DEL"）
+
+用法示例：
+  with PS2Session(port="COM25", layout="us") as s:
+      s.sim_on()
+      s.key_mode()
+      s.type_string("Hello World")
+      s.sim_off()
+"""
+
+from add07 import CompositeKMController, PS2Controller
+from km_coalesce import Coalescer
+from km_keycompiler import SHIFT, SHIFTED_CHARS, KeyCompiler
+from km_layout import get_layout
+from km_pacer import Pacer
+from km_resilient import protect
+from km_trajectory import PS2_LIMIT, USB_LIMIT, line, play
+
+
+class PS2Session:
+    """
+    PS/2 模拟会话：持有一个已打开的 PS2Controller。
+
+    键盘扫描码以 "1C" 形式发送（按下并释放），
+    修饰键按下为 "<code>,0"，释放为 "<code>,1"。
+    文本经 KeyCompiler 按 km_layout 布局（layout，默认 US）编译，
+    连续上档字符共用一次 Shift；也可传入旧式 scan_codes 字典。
+    rate 不为 None 时所有包按 km_pacer.Pacer(rate) 的时隙发送；
+    coalesce 不为 None 时经 km_coalesce.Coalescer(window=coalesce) 合并冗余包。
+    capture 为 km_capture.EchoCapture 时，每次发送按键前登记期望的回显。
+    reconnect=True 时经 km_resilient 在断线 / reboot 后自动重连并恢复模式，
+    统计见 self.link.stats()。
+    """
+    SHIFT = SHIFT
+    SHIFTED_CHARS = SHIFTED_CHARS
+    BUTTONS = ("left", "right", "middle")
+
+    def __init__(self, port=None, baudrate=None, scan_codes=None,
+                 controller=None, verbose=False, rate=None, coalesce=None,
+                 layout=None, capture=None, reconnect=False):
+        self.api = controller or PS2Controller(port=port, baudrate=baudrate)
+        self.link = protect(self.api, port=port, baudrate=baudrate) if reconnect else None
+        if rate:
+            self.api.pacer = Pacer(rate)
+        self.coalescer = Coalescer(self.api, coalesce) if coalesce is not None else None
+        self.compiler = KeyCompiler(scan_codes, strict=False, layout=layout)
+        self.layout = get_layout(layout)
+        self.capture = capture
+        self.verbose = verbose
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _log(self, msg):
+        if self.verbose:
+            print(">>", msg)
+
+    # —————— 模式 ——————
+    def sim_on(self):     self._log("sim-on");  self.api.enter_sim_mode()
+    def sim_off(self):    self._log("sim-off"); self.api.exit_sim_mode()
+    def mouse_mode(self): self._log("mouse");   self.api.set_mode_mouse()
+    def key_mode(self):   self._log("key");     self.api.set_mode_keyboard()
+    def exit_mode(self):  self._log("exit");    self.api.exit_mode()
+
+    # —————— 键盘 ——————
+    def _keys(self, events):
+        if self.capture is not None:
+            self.capture.expect_events(events)
+        send_keys = self.api.send_keys
+        for ev in events:
+            send_keys(ev)
+
+    def press(self, code):   self._keys((f"{code},0",))
+    def release(self, code): self._keys((f"{code},1",))
+
+    def type_key(self, code):
+        self._log(f"type {code}")
+        self._keys((code,))
+
+    def type_string(self, text):
+        """编译并发送 text，大写及上档符号自动加 Shift。返回未映射字符列表。"""
+        events = self.compiler.compile(text)
+        missing = self.compiler.last_missing
+        for char in missing:
+            print(f"[WARN] No mapping for '{char}'")
+        self._log(f"type {text!r} ({len(events)} events)")
+        self._keys(events)
+        return missing
+
+    def combo(self, *codes):
+        """依次按下 codes[:-1]，敲击 codes[-1]，再逆序释放，如 combo("14", "11", "71")。"""
+        *mods, key = codes
+        for code in mods:
+            self.press(code)
+        self.type_key(key)
+        for code in reversed(mods):
+            self.release(code)
+
+    def type_combo(self, spec):
+        """按布局的扫描码表发送组合键，如 type_combo("CTRL+ALT+DEL")、type_combo("ENTER")。"""
+        self._log(f"combo {spec}")
+        self._keys(self.layout.combo(spec))
+
+    # —————— 鼠标 ——————
+    def move(self, dx, dy, left=False, right=False, middle=False, wheel=None):
+        self._log(f"move {dx} {dy}")
+        self.api.send_mouse(dx, dy, left=left, right=right,
+                            middle=middle, wheel=wheel)
+
+    def glide(self, dx, dy, duration=0.0, left=False, right=False, middle=False):
+        """在 duration 秒内移动 (dx,dy)，用满足 PS/2 位移范围的最少包。"""
+        self._log(f"glide {dx} {dy} {duration}s")
+        play(self.api, line(dx, dy, duration, limit=PS2_LIMIT),
+             left=left, right=right, middle=middle)
+
+    def click(self, button="left", count=1):
+        if button not in self.BUTTONS:
+            raise ValueError(f"未知按键: {button}")
+        for _ in range(count):
+            self.move(0, 0, **{button: True})
+            self.move(0, 0)
+
+    def close(self):
+        if self.coalescer is not None:
+            self.coalescer.close()
+        self.api.close()
+
+
+class USBSession:
+    """
+    USB Composite KM 会话：持有一个已打开的 CompositeKMController。
+
+    文本与组合键由固件解析，move/click 需要 REL 模式，
+    type_string/combo 需要 KEY 模式；会话记录当前模式以避免重复切换。
+    rate 不为 None 时按 km_pacer.Pacer(rate) 的时隙发送，取代固定 WAIT；
+    coalesce、reconnect 同 PS2Session。
+    """
+    BUTTONS = ("left", "right", "middle")
+
+    def __init__(self, port=None, baudrate=None, controller=None,
+                 verbose=False, rate=None, coalesce=None, reconnect=False):
+        self.km = controller or CompositeKMController(port=port, baudrate=baudrate)
+        self.link = protect(self.km, port=port, baudrate=baudrate) if reconnect else None
+        if rate:
+            self.km.pacer = Pacer(rate)
+        self.coalescer = Coalescer(self.km, coalesce) if coalesce is not None else None
+        self.verbose = verbose
+        self.mode = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _log(self, msg):
+        if self.verbose:
+            print(">>", msg)
+
+    def _ensure(self, mode):
+        if self.mode == mode:
+            return
+        if mode == "rel":
+            self.km.set_mode_rel()
+        elif mode == "abs":
+            self.km.set_mode_abs()
+        elif mode == "key":
+            self.km.set_mode_key()
+        self.mode = mode
+
+    def type_string(self, text):
+        self._log(f"text {text}")
+        self._ensure("key")
+        self.km.send_text(text)
+
+    def combo(self, combo):
+        self._log(f"combo {combo}")
+        self._ensure("key")
+        self.km.send_combo(combo)
+
+    def move(self, dx, dy, left=False, right=False, middle=False, wheel=0):
+        self._log(f"move {dx} {dy}")
+        self._ensure("rel")
+        self.km.move_rel(dx, dy, left=left, right=right,
+                         middle=middle, wheel=wheel)
+
+    def glide(self, dx, dy, duration=0.0, left=False, right=False, middle=False):
+        """在 duration 秒内移动 (dx,dy)，用满足 USB REL 位移范围的最少包。"""
+        self._log(f"glide {dx} {dy} {duration}s")
+        self._ensure("rel")
+        play(self.km, line(dx, dy, duration, limit=USB_LIMIT),
+             left=left, right=right, middle=middle)
+
+    def move_to(self, x, y, left=False, right=False, middle=False, wheel=0):
+        self._log(f"abs-move {x} {y}")
+        self._ensure("abs")
+        self.km.move_abs(x, y, left=left, right=right,
+                         middle=middle, wheel=wheel)
+
+    def click(self, button="left", count=1):
+        if button not in self.BUTTONS:
+            raise ValueError(f"未知按键: {button}")
+        for _ in range(count):
+            self.move(0, 0, **{button: True})
+            self.move(0, 0)
+
+    def close(self):
+        if self.coalescer is not None:
+            self.coalescer.close()
+        self.km.close()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_stress.py
+
+随机压力测试：按种子生成大规模键盘 / 鼠标负载，逐级提高发送速率直到出现
+错误，给出可持续的最大 events/s；可在多个工作进程中同时压测多台设备并
+合并结果。
+
+负载由 generate(seed) 随机生成，同一种子总是得到相同的负载。片段类型：
+  text     各字符类的混合：小写、大写、数字、符号、空格以及全部混合
+  long     长字符串（默认 200..2000 字符）
+  burst    快速连击：左 / 右 / 中键连续按下释放
+  extreme  极端位移：±上限、±1、0 以及远超上限的位移（经 km_bulk.split 拆分）
+每个片段预先编译为线上事件（扫描码 / 鼠标报告 / 模式命令），键盘片段以回车
+结束并记下期望的回显文本。
+
+爬坡（ramp）：从 start 速率开始，每级发送约 stage_events 个事件，之后速率乘以
+factor，直到 max_rate 或某一级出现错误。一级的错误包括：
+  late     发送落后：Pacer 迟到 p99 超过 late_tolerance 秒（链路 / 固件背压）
+  backlog  积压：级末等待发出的数据排空（默认 ser.flush，模拟设备为设备读完
+           全部字节），计入排空时间的实测速率低于目标的 1 - rate_tolerance
+           （数据只是堆在驱动缓冲区里）
+  write    写串口异常
+  echo     回显不一致或超时（传入 km_capture.EchoCapture 时）
+  device   check(ctrl) 返回的错误数（如模拟设备统计的解析错误）
+最后一个无错误的级即为可持续速率。
+
+run_parallel() 为每个端口起一个 multiprocessing 工作进程（种子为 seed + 序号），
+合并为 StressReport。
+
+用法示例：
+  python km_stress.py --ports COM25 COM26 --seed 7 --start 200 --factor 1.5
+  python km_stress.py --fake 4 --max-rate 20000      # 无硬件：4 台模拟设备
+"""
+
+import argparse
+import random
+import string
+import time
+from collections import namedtuple
+
+from add07 import CompositeKMController, PS2Controller, mouse_payload
+from km_keycompiler import KeyCompiler
+from km_pacer import Pacer
+from km_trajectory import PS2_LIMIT, USB_LIMIT
+
+Segment = namedtuple("Segment", "kind events expect")
+Stage = namedtuple("Stage", "rate achieved events late_p99 errors reasons")
+
+CHAR_CLASSES = {
+    "lower": string.ascii_lowercase,
+    "upper": string.ascii_uppercase,
+    "digits": string.digits,
+    "symbols": string.punctuation,
+    "space": " ",
+}
+WEIGHTS = {"text": 4, "long": 1, "burst": 2, "extreme": 2}
+
+
+# —————— 负载生成 ——————
+class _Compiler:
+    """把片段编译为某一接口的线上事件，并插入必要的模式切换命令。"""
+
+    def __init__(self, interface, layout):
+        self.usb = interface == "usb"
+        self.limit = USB_LIMIT if self.usb else PS2_LIMIT
+        ctrl = CompositeKMController if self.usb else PS2Controller
+        self.key_mode = ctrl.CMD_KEY_MODE
+        self.mouse_mode = ctrl.CMD_REL_MODE if self.usb else ctrl.CMD_MOUSE_MODE
+        self.keys = KeyCompiler(layout=layout)
+        self.mode = None
+
+    def _switch(self, mode):
+        if mode == self.mode:
+            return []
+        self.mode = mode
+        return [mode]
+
+    def text(self, kind, text):
+        text = "".join(c for c in text if c in self.keys.layout.strokes)
+        if self.usb:
+            # 文本由固件解析；开头的 # 会被当作命令，去掉。主机侧不校验回显
+            return Segment(kind, self._switch(self.key_mode) + [text.lstrip("#") or " "], "")
+        events = list(self.keys.compile(text + "\n"))
+        return Segment(kind, self._switch(self.key_mode) + events, text + "\n")
+
+    def mouse(self, kind, reports):
+        wheel = 0 if self.usb else None
+        events = [mouse_payload(dx, dy, b & 1, b & 2, b & 4, wheel)
+                  for dx, dy, b in reports]
+        return Segment(kind, self._switch(self.mouse_mode) + events, "")
+
+
+def generate(seed=0, segments=200, interface="ps2", layout="us",
+             long_len=(200, 2000), burst_len=(2, 20), weights=WEIGHTS):
+    """按种子生成 segments 个片段的负载，返回 Segment 列表。"""
+    from km_bulk import split
+    rnd = random.Random(seed)
+    comp = _Compiler(interface, layout)
+    limit = comp.limit
+    kinds, w = zip(*weights.items())
+    classes = list(CHAR_CLASSES)
+    out = []
+    for _ in range(segments):
+        kind = rnd.choices(kinds, w)[0]
+        if kind == "text":
+            mix = rnd.sample(classes, rnd.randint(1, len(classes)))
+            alphabet = "".join(CHAR_CLASSES[c] for c in mix)
+            out.append(comp.text(kind, "".join(rnd.choice(alphabet)
+                                               for _ in range(rnd.randint(1, 80)))))
+        elif kind == "long":
+            alphabet = "".join(CHAR_CLASSES.values())
+            out.append(comp.text(kind, "".join(rnd.choice(alphabet)
+                                               for _ in range(rnd.randint(*long_len)))))
+        elif kind == "burst":
+            button = rnd.choice((1, 2, 4))
+            n = rnd.randint(*burst_len)
+            out.append(comp.mouse(kind, [(0, 0, button), (0, 0, 0)] * n))
+        else:
+            picks = (limit, -limit, limit - 1, 1, -1, 0, limit * 8, -limit * 40)
+            dx = [rnd.choice(picks) for _ in range(rnd.randint(1, 16))]
+            dy = [rnd.choice(picks) for _ in dx]
+            sx, sy, sb, _ = split(dx, dy, 0, None, limit)
+            out.append(comp.mouse(kind, zip(map(int, sx), map(int, sy), map(int, sb))))
+    return out
+
+
+def count_events(corpus):
+    return sum(len(s.events) for s in corpus)
+
+
+# —————— 爬坡 ——————
+def run_stage(ctrl, corpus, start, rate, stage_events, late_tolerance=0.005,
+              rate_tolerance=0.05, capture=None, check=None, drain=None,
+              echo_timeout=2.0):
+    """
+    以 rate 发送从 corpus[start] 起的完整片段，至少 stage_events 个事件。
+    返回 (Stage, 下一级的起始片段序号)。
+    """
+    send = ctrl._send
+    pacer = Pacer(rate, max_lag=float("inf"))
+    reasons = {}
+    sent = 0
+    checked = len(capture.results) if capture is not None else 0
+    i = start
+    try:
+        while sent < stage_events:
+            seg = corpus[i % len(corpus)]
+            i += 1
+            if capture is not None and seg.expect:
+                capture.expect(seg.expect)
+            for ev in seg.events:
+                pacer.wait()
+                send(ev)
+            sent += len(seg.events)
+        (drain or ctrl.ser.flush)()
+    except Exception as e:
+        reasons["write"] = f"{type(e).__name__}: {e}"
+    achieved = sent / (time.perf_counter() - pacer.t0)
+    st = pacer.stats()
+    if st["late_p99_s"] > late_tolerance:
+        reasons["late"] = f"迟到 p99 {st['late_p99_s'] * 1e3:.2f} ms"
+    if achieved < rate * (1 - rate_tolerance):
+        reasons["backlog"] = f"排空后实测 {achieved:.0f} events/s"
+    if capture is not None:
+        if not capture.wait(echo_timeout):
+            reasons["echo"] = "回显超时"
+        bad = [r for r in capture.results[checked:] if r.mismatches]
+        if bad:
+            reasons["echo"] = f"{len(bad)} 行回显不一致"
+    if check is not None:
+        n = check(ctrl)
+        if n:
+            reasons["device"] = f"设备报告 {n} 个错误"
+    errors = len(reasons)
+    return Stage(rate, achieved, sent, st["late_p99_s"], errors, reasons), i
+
+
+def ramp(ctrl, corpus, start=100.0, factor=1.5, max_rate=50000.0,
+         stage_events=1000, **kwargs):
+    """
+    逐级提速直到出错或超过 max_rate。返回 (各级 Stage 列表, 可持续速率)；
+    可持续速率为最后一个无错误级的实测 events/s（含缓冲区排空时间；
+    第一级就出错时为 0）。
+    """
+    stages, sustainable = [], 0.0
+    rate, pos = start, 0
+    while rate <= max_rate:
+        stage, pos = run_stage(ctrl, corpus, pos, rate, stage_events, **kwargs)
+        stages.append(stage)
+        if stage.errors:
+            break
+        sustainable = stage.achieved
+        rate *= factor
+    return stages, sustainable
+
+
+# —————— 单台 / 多台 ——————
+def run_rig(port=None, seed=0, interface="ps2", layout="us", fake=False,
+            echo=False, segments=200, baudrate=115200, **ramp_kwargs):
+    """
+    在一台设备上生成负载并爬坡（工作进程入口），返回可 pickle 的结果字典。
+    fake=True 时在进程内启动 km_fakedev.FakeKMDevice（按波特率限速）代替硬件；
+    echo=True 时经 km_capture 在控制器链路上校验回显。
+    """
+    t0 = time.perf_counter()
+    result = {"port": port, "seed": seed, "stages": [], "sustainable": 0.0,
+              "error": None}
+    dev = capture = ctrl = None
+    check = drain = None
+    try:
+        if fake:
+            from km_fakedev import FakeKMDevice
+            dev = FakeKMDevice(baudrate=baudrate, throttle=True, keep=False,
+                               host_echo=layout if echo else None).start()
+            port = result["port"] = dev.port
+            seen = [0]
+
+            def check(_ctrl):
+                n, seen[0] = dev.errors - seen[0], dev.errors
+                return n
+        cls = CompositeKMController if interface == "usb" else PS2Controller
+        ctrl = cls(port=port, baudrate=baudrate)
+        if fake:
+            # pty 的 tcdrain 不等对端读取；改为等模拟设备读完主机写出的全部字节
+            written = [0]
+            write = ctrl.ser.write
+
+            def counted(data):
+                written[0] += len(data)
+                return write(data)
+            ctrl.ser.write = counted
+
+            def drain(timeout=30.0):
+                deadline = time.perf_counter() + timeout
+                while dev.bytes < written[0] and time.perf_counter() < deadline:
+                    time.sleep(0.0005)
+        if interface == "usb":
+            ctrl.WAIT = 0
+        else:
+            ctrl.enter_sim_mode()
+        if echo:
+            from km_capture import EchoCapture
+            capture = EchoCapture.attach(ctrl, layout=layout)
+        corpus = generate(seed, segments, interface, layout)
+        result["events"] = count_events(corpus)
+        stages, result["sustainable"] = ramp(ctrl, corpus, capture=capture,
+                                             check=check, drain=drain, **ramp_kwargs)
+        result["stages"] = [s._asdict() for s in stages]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if capture is not None:
+            capture.close()
+        if ctrl is not None:
+            if interface == "ps2":
+                ctrl.exit_sim_mode()
+            ctrl.close()
+        if dev is not None:
+            dev.stop()
+    result["elapsed_s"] = time.perf_counter() - t0
+    return result
+
+
+def _run_rig(job):
+    port, seed, kwargs = job
+    return run_rig(port, seed, **kwargs)
+
+
+class StressReport:
+    """多台设备压测结果汇总。"""
+
+    def __init__(self, results, wall):
+        self.results = results
+        self.wall = wall
+
+    def summary(self):
+        ok = [r for r in self.results if r["error"] is None]
+        rates = [r["sustainable"] for r in ok]
+        return {
+            "rigs": len(self.results),
+            "failed": len(self.results) - len(ok),
+            "wall_s": self.wall,
+            "sustainable_min": min(rates) if rates else 0.0,
+            "sustainable_max": max(rates) if rates else 0.0,
+            "sustainable_total": sum(rates),
+            "errors": {r["port"]: r["error"] for r in self.results if r["error"]},
+        }
+
+    def format(self):
+        lines = []
+        for r in self.results:
+            head = f"{r['port']} (seed {r['seed']})"
+            if r["error"]:
+                lines.append(f"{head}: 失败 {r['error']}")
+                continue
+            lines.append(f"{head}: 可持续 {r['sustainable']:.0f} events/s")
+            for s in r["stages"]:
+                mark = "; ".join(s["reasons"].values()) if s["errors"] else "ok"
+                lines.append(f"  目标 {s['rate']:8.0f}  实测 {s['achieved']:8.0f} events/s  "
+                             f"{s['events']:6d} 事件  迟到 p99 {s['late_p99'] * 1e3:7.2f} ms  {mark}")
+        s = self.summary()
+        lines.append(f"合计 {s['rigs']} 台（失败 {s['failed']}）：可持续 "
+                     f"{s['sustainable_min']:.0f}..{s['sustainable_max']:.0f} events/s，"
+                     f"总计 {s['sustainable_total']:.0f} events/s，用时 {s['wall_s']:.1f} s")
+        return "\n".join(lines)
+
+
+def run_parallel(ports, seed=0, processes=None, **kwargs):
+    """每个端口一个工作进程（ports 为 None 的项配合 fake=True 使用），返回 StressReport。"""
+    import multiprocessing
+    jobs = [(port, seed + i, kwargs) for i, port in enumerate(ports)]
+    t0 = time.perf_counter()
+    if len(jobs) == 1:
+        results = [_run_rig(jobs[0])]
+    else:
+        with multiprocessing.Pool(processes or len(jobs)) as pool:
+            results = pool.map(_run_rig, jobs)
+    return StressReport(results, time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KM 随机 压力 测试")
+    g = parser.add_mutually_exclusive_group(required=True)
+    g.add_argument("--ports", nargs="+", help="被测 设备 串口，每个 一个 工作 进程")
+    g.add_argument("--fake", type=int, metavar="N", help="使用 N 台 模拟 设备（无需 硬件）")
+    parser.add_argument("--interface", choices=("ps2", "usb"), default="ps2")
+    parser.add_argument("--layout", default="us", help="键盘 布局（us / uk / de）")
+    parser.add_argument("--seed", type=int, default=0, help="随机 种子（第 i 台 用 seed+i）")
+    parser.add_argument("--segments", type=int, default=200, help="负载 片段 数")
+    parser.add_argument("--start", type=float, default=100.0, help="起始 速率 events/s")
+    parser.add_argument("--factor", type=float, default=1.5, help="每级 速率 倍数")
+    parser.add_argument("--max-rate", type=float, default=50000.0, help="速率 上限")
+    parser.add_argument("--stage-events", type=int, default=1000, help="每级 事件 数")
+    parser.add_argument("--late-tolerance", type=float, default=0.005,
+                        help="允许 的 迟到 p99 秒数")
+    parser.add_argument("--echo", action="store_true",
+                        help="经 km_capture 校验 被测 主机 回显")
+    parser.add_argument("--baud", type=int, default=115200)
+    args = parser.parse_args()
+
+    ports = args.ports or [None] * args.fake
+    report = run_parallel(ports, seed=args.seed, interface=args.interface,
+                          layout=args.layout, fake=bool(args.fake), echo=args.echo,
+                          segments=args.segments, baudrate=args.baud,
+                          start=args.start, factor=args.factor,
+                          max_rate=args.max_rate, stage_events=args.stage_events,
+                          late_tolerance=args.late_tolerance)
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+km_trajectory.py
+
+鼠标轨迹引擎：把目标位移或路径（直线、折线、三次贝塞尔）拆成
+满足 PS/2 9 位位移范围（-256..255）的相对位移包，并按报告率分配时间。
+
+  line(dx, dy, duration, rate)          直线
+  polyline(points, duration, rate)      折线，points 为相对起点的路点
+  bezier(c1, c2, end, duration, rate)   三次贝塞尔，起点为 (0,0)
+  play(ctrl, steps, ...)                按时间戳发送到 PS2Controller
+                                        或 CompositeKMController
+
+轨迹以 (t, dx, dy) 列表表示。每段位移按累计坐标取整后差分，
+整段一次算出，总位移与目标完全一致、不会累积舍入误差。
+有 numpy 时所有段的增量、去零与时间戳在一次数组运算中完成（贝塞尔采样同样），
+Python 层只按段循环；无 numpy 时逐步计算，结果相同（均为四舍六入五成双）。
+默认只发出满足位移上限所需的最少包；smooth=True 时用满报告率。
+"""
+
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:     # numpy 可选，缺失时逐步计算
+    np = None
+
+from km_pacer import Pacer
+
+PS2_LIMIT = 255     # 9 位有符号：-256..255，对称取 255
+USB_LIMIT = 127     # USB HID REL 报告为 8 位有符号
+DEFAULT_RATE = 100  # PS/2 鼠标默认采样率（报告/秒）
+
+
+def _split(x0, y0, x1, y1, n):
+    """把 (x0,y0)->(x1,y1) 均分为 n 段，返回整数增量列表。"""
+    dx, dy = x1 - x0, y1 - y0
+    xs = [round(x0 + dx * i / n) for i in range(n + 1)]
+    ys = [round(y0 + dy * i / n) for i in range(n + 1)]
+    return [(xs[i + 1] - xs[i], ys[i + 1] - ys[i]) for i in range(n)]
+
+
+def _timestamps(deltas, duration, rate):
+    """为增量序列分配时间戳：在 duration 内均匀分布，但间隔不小于 1/rate。"""
+    n = len(deltas)
+    if not n:
+        return []
+    period = max(duration / n if duration else 0.0, 1.0 / rate)
+    return [(i * period, dx, dy) for i, (dx, dy) in enumerate(deltas)]
+
+
+def _count(points, duration, rate, limit, smooth):
+    """整条路径所需的包数。"""
+    peak = max((max(abs(x1 - x0), abs(y1 - y0))
+                for (x0, y0), (x1, y1) in zip(points, points[1:])), default=0)
+    n = max(1, math.ceil(peak / limit))
+    if smooth and duration:
+        n = max(n, int(duration * rate))
+    return n
+
+
+def line(dx, dy, duration=0.0, rate=DEFAULT_RATE, limit=PS2_LIMIT, smooth=False):
+    """直线位移 (dx,dy)。"""
+    return polyline([(dx, dy)], duration, rate, limit, smooth)
+
+
+def polyline(points, duration=0.0, rate=DEFAULT_RATE, limit=PS2_LIMIT,
+             smooth=False):
+    """
+    依次经过 points（相对起点的坐标）。每段拆成满足 limit 的最少包数
+    （smooth=True 时按该段所占时长用满报告率），总时长在各包间均匀分配。
+    """
+    path = [(0, 0)] + [tuple(p) for p in points]
+    lengths = [math.hypot(x1 - x0, y1 - y0)
+               for (x0, y0), (x1, y1) in zip(path, path[1:])]
+    total = sum(lengths) or 1.0
+    counts = [_count([p0, p1], duration * seg_len / total, rate, limit, smooth)
+              for (p0, p1), seg_len in zip(zip(path, path[1:]), lengths)]
+    if np is not None:
+        return _polyline_np(path, counts, duration, rate)
+    deltas = []
+    for p0, p1, n in zip(path, path[1:], counts):
+        deltas += _split(*p0, *p1, n)
+    # 取整后为 0 的增量不必发送
+    deltas = [d for d in deltas if d != (0, 0)]
+    return _timestamps(deltas, duration, rate)
+
+
+def _polyline_np(path, counts, duration, rate):
+    """polyline 的数组版本：各段按 counts 均分、取整差分、去零并分配时间戳。"""
+    ns = np.asarray(counts, dtype=np.int64)
+    pts = np.asarray(path, dtype=np.float64)
+    seg = np.repeat(np.arange(len(ns)), ns)             # 每一步所属的段
+    starts = np.cumsum(ns) - ns
+    i = np.arange(int(ns.sum())) - starts[seg] + 1      # 段内步号 1..n
+    n = ns[seg]
+    x0, y0 = pts[:-1, 0][seg], pts[:-1, 1][seg]
+    dx, dy = pts[1:, 0][seg] - x0, pts[1:, 1][seg] - y0
+    ddx = np.rint(x0 + dx * i / n) - np.rint(x0 + dx * (i - 1) / n)
+    ddy = np.rint(y0 + dy * i / n) - np.rint(y0 + dy * (i - 1) / n)
+    keep = (ddx != 0) | (ddy != 0)
+    ddx, ddy = ddx[keep].astype(np.int64), ddy[keep].astype(np.int64)
+    if not len(ddx):
+        return []
+    period = max(duration / len(ddx) if duration else 0.0, 1.0 / rate)
+    ts = np.arange(len(ddx)) * period
+    return list(zip(ts.tolist(), ddx.tolist(), ddy.tolist()))
+
+
+def bezier(c1, c2, end, duration=0.0, rate=DEFAULT_RATE, limit=PS2_LIMIT,
+           samples=None, smooth=False):
+    """
+    三次贝塞尔曲线 (0,0) -> end，控制点 c1、c2。
+    采样数默认取控制多边形长度 / limit 与 duration*rate 中的较大者（至少 8），
+    采样点取整后按折线处理。
+    """
+    (x1, y1), (x2, y2), (x3, y3) = c1, c2, end
+    if samples is None:
+        hull = (math.hypot(x1, y1) + math.hypot(x2 - x1, y2 - y1)
+                + math.hypot(x3 - x2, y3 - y2))
+        samples = max(8, math.ceil(hull / limit),
+                      int(duration * rate) if smooth and duration else 0)
+    if np is not None:
+        t = np.arange(1, samples + 1) / samples
+        u = 1 - t
+        a, b, c = 3 * u * u * t, 3 * u * t * t, t * t * t
+        pts = list(zip(np.rint(a * x1 + b * x2 + c * x3).astype(np.int64).tolist(),
+                       np.rint(a * y1 + b * y2 + c * y3).astype(np.int64).tolist()))
+        return polyline(pts, duration, rate, limit, smooth=False)
+    pts = []
+    for i in range(1, samples + 1):
+        t = i / samples
+        u = 1 - t
+        a, b, c = 3 * u * u * t, 3 * u * t * t, t * t * t
+        pts.append((round(a * x1 + b * x2 + c * x3),
+                    round(a * y1 + b * y2 + c * y3)))
+    return polyline(pts, duration, rate, limit, smooth=False)
+
+
+def play(ctrl, steps, left=False, right=False, middle=False, start=None):
+    """
+    按时间戳把 steps 发送到控制器（PS2Controller.send_mouse 或
+    CompositeKMController.move_rel），按键状态在整条轨迹中保持。
+    返回实际耗时（秒）。
+    """
+    send = getattr(ctrl, "send_mouse", None) or ctrl.move_rel
+    pacer = Pacer().start(start)
+    for t, dx, dy in steps:
+        pacer.at(t)
+        send(dx, dy, left=left, right=right, middle=middle)
+    return time.perf_counter() - pacer.t0
@@ -1,47 +1,166 @@
+"""
+UART echo-loop benchmark.
 
-import serial
-import time
-MESSAGE_BYTES = bytes([0xEE])
-
-def open_serial_port(port_name, baud_rate):
-    try:
-    # Configure and open the serial port with a timeout
-    # Using a 'with' statement ensures the port is closed automatically
-        with serial.Serial(port=port_name, baudrate=baud_rate, timeout=1) as ser:
-            time.sleep(2) # Wait for the connection to establish (especially for Arduino/microcontrollers)
-            print(f"Connected to port {ser.name}")
-
+Keeps one connection open, sends `--count` messages of `--size` bytes
+(filled with 0xEE by default), and times each echo's round trip with a
+concurrent reader thread. Echoes are matched to messages by byte offset,
+so any device that echoes its input verbatim works. Reports throughput,
+loss, corrupted bytes and RTT percentiles.
 
-    except serial.SerialException as e:
-        print(f"Error opening serial port: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    python send_to_sender.py --port COM12 -n 1000
+    python send_to_sender.py --port COM12 --size 16 --pipeline 8
+    python send_to_sender.py --fake --rate 500 --pipeline 4
 
+--pipeline N keeps up to N messages in flight; --rate caps the send rate
+(messages/s, 0 = as fast as the pipeline allows). --fake runs against
+km_fakedev.FakeKMDevice in echo mode, throttled to the modelled baud rate.
+"""
+import argparse
+import threading
+import time
 
-def send_uart_message(port_name, baud_rate, message):
-    try:
-        # Configure and open the serial port with a timeout
-        # Using a 'with' statement ensures the port is closed automatically
-        with serial.Serial(port=port_name, baudrate=baud_rate, timeout=1) as ser:
+import serial
 
-            # Send the data
-            print(f"Sending: {message}")
-            ser.write(message)
+from km_pacer import Pacer
 
-    except serial.SerialException as e:
-        print(f"Error opening serial port: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+MESSAGE_BYTES = bytes([0xEE])
 
-# --- Example Usage ---
 # On Windows, port is typically 'COMX' (e.g., 'COM3')
 # On Linux/macOS, port is typically '/dev/ttyUSBX' or '/dev/ttyACMX'
 SERIAL_PORT = 'COM12' # !! REPLACE WITH YOUR ACTUAL PORT NAME !!
 BAUD_RATE = 115200  # !! REPLACE WITH YOUR DEVICE'S BAUD RATE !!
 
-if __name__ == "__main__":
 
-    open_serial_port(SERIAL_PORT, BAUD_RATE)
-    while True:
-        send_uart_message(SERIAL_PORT, BAUD_RATE, MESSAGE_BYTES)
-        time.sleep(1)
\ No newline at end of file
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+class EchoBench:
+    """One writer (the caller) and one reader thread on a single open port."""
+
+    def __init__(self, ser, size=1, count=1000, pipeline=1, rate=0,
+                 timeout=1.0, fill=MESSAGE_BYTES[0]):
+        self.ser = ser
+        self.size = size
+        self.count = count
+        self.pipeline = pipeline
+        self.rate = rate
+        self.timeout = timeout
+        self.fill = fill
+        self.sent_at = [0.0] * count
+        self.rtt = []
+        self.received = 0
+        self.corrupt = 0
+        self.sent = 0
+        self._credits = threading.Semaphore(pipeline)
+        self._running = False
+
+    def _read_loop(self):
+        size, fill = self.size, self.fill
+        while self._running:
+            data = self.ser.read(self.ser.in_waiting or 1)
+            if not data:
+                continue
+            now = time.perf_counter()
+            self.corrupt += len(data) - data.count(fill)
+            self.received += len(data)
+            # every `size` bytes echoed completes the next outstanding message
+            while len(self.rtt) < self.sent and self.received >= (len(self.rtt) + 1) * size:
+                self.rtt.append(now - self.sent_at[len(self.rtt)])
+                self._credits.release()
+
+    def run(self):
+        message = bytes([self.fill]) * self.size
+        self.ser.reset_input_buffer()
+        self._running = True
+        reader = threading.Thread(target=self._read_loop, daemon=True)
+        reader.start()
+        pacer = Pacer(self.rate) if self.rate else None
+        t0 = time.perf_counter()
+        for i in range(self.count):
+            if not self._credits.acquire(timeout=self.timeout):
+                break               # an echo went missing; the rest is loss
+            if pacer is not None:
+                pacer.wait()
+            self.sent_at[i] = time.perf_counter()
+            self.sent = i + 1
+            self.ser.write(message)
+        # wait for the tail of the pipeline
+        last, deadline = -1, time.perf_counter() + self.timeout
+        while len(self.rtt) < self.sent and time.perf_counter() < deadline:
+            if len(self.rtt) != last:
+                last, deadline = len(self.rtt), time.perf_counter() + self.timeout
+            time.sleep(0.001)
+        wall = time.perf_counter() - t0
+        self._running = False
+        reader.join(timeout=2)
+        return self.report(wall)
+
+    def report(self, wall):
+        rtt = sorted(self.rtt)
+        echoed = len(rtt)
+        return {
+            "sent": self.sent,
+            "echoed": echoed,
+            "lost": self.count - echoed,
+            "loss_pct": 100.0 * (self.count - echoed) / self.count,
+            "corrupt_bytes": self.corrupt,
+            "wall_s": wall,
+            "msgs_per_s": echoed / wall,
+            "bytes_per_s": echoed * self.size / wall,
+            "rtt_mean_s": sum(rtt) / echoed if echoed else 0.0,
+            "rtt_p50_s": percentile(rtt, 50),
+            "rtt_p90_s": percentile(rtt, 90),
+            "rtt_p99_s": percentile(rtt, 99),
+            "rtt_max_s": rtt[-1] if rtt else 0.0,
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="UART echo-loop benchmark")
+    ap.add_argument("-p", "--port", default=SERIAL_PORT)
+    ap.add_argument("-b", "--baud", type=int, default=BAUD_RATE)
+    ap.add_argument("-n", "--count", type=int, default=1000, help="messages to send")
+    ap.add_argument("-s", "--size", type=int, default=1, help="bytes per message")
+    ap.add_argument("-r", "--rate", type=float, default=0,
+                    help="messages per second, 0 = unlimited")
+    ap.add_argument("--pipeline", type=int, default=1, metavar="N",
+                    help="messages kept in flight")
+    ap.add_argument("--timeout", type=float, default=1.0,
+                    help="seconds without an echo before the rest counts as lost")
+    ap.add_argument("--settle", type=float, default=0.0,
+                    help="wait after opening (some boards reset on open)")
+    ap.add_argument("--fake", action="store_true",
+                    help="use a simulated echo device instead of --port")
+    args = ap.parse_args()
+
+    fake = None
+    if args.fake:
+        from km_fakedev import FakeKMDevice
+        fake = FakeKMDevice(baudrate=args.baud, throttle=True, keep=False,
+                            echo=True).start()
+        args.port = fake.port
+    try:
+        with serial.serial_for_url(args.port, args.baud, timeout=0.05) as ser:
+            if args.settle:
+                time.sleep(args.settle)
+            print(f"Connected to port {ser.name}")
+            r = EchoBench(ser, args.size, args.count, args.pipeline, args.rate,
+                          args.timeout).run()
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    print(f"sent {r['sent']}/{args.count}, echoed {r['echoed']}, "
+          f"lost {r['lost']} ({r['loss_pct']:.2f}%), corrupt bytes {r['corrupt_bytes']}")
+    print(f"throughput {r['msgs_per_s']:.1f} msg/s, {r['bytes_per_s']:.0f} B/s "
+          f"(size {args.size}, pipeline {args.pipeline}, wall {r['wall_s']:.3f} s)")
+    print("rtt ms: " + ", ".join(f"{k[4:-2]} {r[k] * 1e3:.3f}" for k in
+                                 ("rtt_mean_s", "rtt_p50_s", "rtt_p90_s",
+                                  "rtt_p99_s", "rtt_max_s")))
+
+
+if __name__ == "__main__":
+    main()